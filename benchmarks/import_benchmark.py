@@ -0,0 +1,70 @@
+# File name: import_benchmark.py
+# Author: Jordan Juravsky
+# Date created: 18-10-2026
+
+"""Measures how long buf takes to start up, by running a buf command in fresh Python processes with '-X importtime'.
+Reports the time spent importing buf's modules (and everything they import), the slowest imports, and the wall clock
+time of the whole command. When measuring 'buf --version', exits with an error if the wall clock time exceeds the target.
+
+Usage (from the root of the repository): python -m benchmarks.import_benchmark [<buf_arguments>...]
+By default, 'buf --version' is measured."""
+
+import os
+import sys
+import time
+import tempfile
+import subprocess
+
+# Target wall clock time for running 'buf --version', in milliseconds.
+target_milliseconds = 40
+
+number_of_runs = 10
+
+bytecode_cache_dir = os.path.join(tempfile.gettempdir(), "buf-import-benchmark")
+
+def run_command(arguments):
+    """Runs buf with the given arguments in a fresh process, returning the wall clock time taken in milliseconds and
+    the output of '-X importtime' as a list of (self_microseconds, cumulative_microseconds, module_name) tuples."""
+    code = "import sys; sys.argv = ['buf'] + sys.argv[1:]; from buf.main import main; main()"
+
+    # Bytecode caches are always used (and kept out of the repository), as they would be in an installed copy of buf.
+    environment = dict(os.environ, PYTHONPYCACHEPREFIX=bytecode_cache_dir)
+    environment.pop("PYTHONDONTWRITEBYTECODE", None)
+
+    start = time.perf_counter()
+    process = subprocess.run([sys.executable, "-X", "importtime", "-c", code] + arguments, capture_output=True, text=True,
+                             env=environment)
+    wall_milliseconds = (time.perf_counter() - start) * 1000
+
+    imports = []
+    for line in process.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line and "self [us]" not in line:
+            self_time, cumulative_time, module_name = line[len("import time:"):].split("|")
+            imports.append((int(self_time), int(cumulative_time), module_name.strip()))
+
+    return wall_milliseconds, imports
+
+def main():
+    arguments = sys.argv[1:] or ["--version"]
+
+    # The first run also writes any missing bytecode caches, so isn't counted.
+    run_command(arguments)
+
+    runs = [run_command(arguments) for _ in range(number_of_runs)]
+    best_wall_milliseconds, best_imports = min(runs, key=lambda run: run[0])
+
+    buf_import_microseconds = sum(cumulative_time for self_time, cumulative_time, module_name in best_imports
+                                  if module_name == "buf.main")
+
+    print("buf " + " ".join(arguments) + " (best of " + str(number_of_runs) + " runs):")
+    print("  Wall clock time: " + format(best_wall_milliseconds, ".1f") + " ms")
+    print("  Importing buf.main: " + format(buf_import_microseconds / 1000, ".1f") + " ms")
+    print("  Slowest imports (self time):")
+    for self_time, cumulative_time, module_name in sorted(best_imports, reverse=True)[:10]:
+        print("    " + format(self_time / 1000, "6.1f") + " ms  " + module_name)
+
+    if arguments == ["--version"] and best_wall_milliseconds > target_milliseconds:
+        sys.exit("Startup time exceeds the target of " + str(target_milliseconds) + " ms.")
+
+if __name__ == "__main__":
+    main()
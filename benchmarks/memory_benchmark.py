@@ -0,0 +1,76 @@
+# File name: memory_benchmark.py
+# Author: Jordan Juravsky
+# Date created: 18-10-2026
+
+"""Measures the memory taken up by large chemical and recipe libraries, comparing buf's slotted Chemical and Recipe
+records against the plain, dict-backed records they replaced.
+
+Usage (from the root of the repository): python -m benchmarks.memory_benchmark [<number_of_entries>]"""
+
+import sys
+import gc
+import tracemalloc
+from buf.commands.chemical import Chemical
+from buf.commands.recipe import Recipe
+
+class DictChemical:
+    """The dict-backed Chemical record, as it was before it was slotted."""
+    def __init__(self, molar_mass, names):
+        self.molar_mass = molar_mass
+        self.names = names
+
+class DictRecipe:
+    """The dict-backed Recipe record, as it was before it was slotted."""
+    def __init__(self, name, concentrations, chemical_names):
+        self.name = name
+        self.concentrations = concentrations
+        self.chemical_names = chemical_names
+
+def make_chemical_library(chemical_class, number_of_entries: int):
+    """Builds a chemical library in the shape load_chemicals returns, with two names per chemical. Names are built
+    from scratch for every entry, as they are when read from a library file."""
+    library = {}
+    for index in range(number_of_entries):
+        names = ["chemical_" + str(index), "nickname_" + str(index)]
+        chemical = chemical_class(float(index % 500) + 0.5, names)
+        for name in names:
+            library[name] = chemical
+    return library
+
+def make_recipe_library(recipe_class, number_of_entries: int):
+    """Builds a recipe library in the shape load_recipes returns, with four ingredients per recipe drawn from a small
+    set of common chemicals and concentrations."""
+    library = {}
+    for index in range(number_of_entries):
+        concentrations = [str((index + offset) % 20 * 50) + "mM" for offset in range(4)]
+        chemical_names = ["chemical_" + str((index + offset) % 100) for offset in range(4)]
+        name = "recipe_" + str(index)
+        library[name] = recipe_class(name, concentrations, chemical_names)
+    return library
+
+def measure(function, *arguments):
+    """Returns the number of bytes still allocated once function(*arguments) has returned its result."""
+    gc.collect()
+    tracemalloc.start()
+    result = function(*arguments)
+    gc.collect()
+    size, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return size
+
+def main():
+    number_of_entries = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+    print("Memory used by libraries of", number_of_entries, "entries:")
+
+    for description, builder, old_class, new_class in [("Chemical library", make_chemical_library, DictChemical, Chemical),
+                                                       ("Recipe library", make_recipe_library, DictRecipe, Recipe)]:
+        old_size = measure(builder, old_class, number_of_entries)
+        new_size = measure(builder, new_class, number_of_entries)
+        print("  " + description + ": " + format(old_size / 2**20, ".1f") + " MiB dict-backed, "
+              + format(new_size / 2**20, ".1f") + " MiB slotted (" + format(100 * (1 - new_size / old_size), ".0f")
+              + "% smaller)")
+
+if __name__ == "__main__":
+    main()
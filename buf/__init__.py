@@ -2,4 +2,4 @@
 # Author: Jordan Juravsky
 # Date created: 27-07-2018
 
-from . import unit, user_input, commands, error_messages
\ No newline at end of file
+# Submodules are not imported here, so that importing buf (for example, to run 'buf --version') only loads what is needed.
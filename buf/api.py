@@ -0,0 +1,64 @@
+# File name: api.py
+# Author: Jordan Juravsky
+# Date created: 18-10-2026
+
+"""Python API for using buf from within other programs, without going through the command line. For example:
+
+    from buf import api
+
+    for step in api.make("2L", "wash"):
+        print(step.name, step.concentration, step.amount_to_add)
+
+Each function reads one's libraries afresh, unless given a Library (see buf.session), in which case the chemicals and
+recipes it has already read are reused. For example, to make many buffers while reading each recipe only once:
+
+    library = api.Library()
+    for volume in ["1L", "2L", "5L"]:
+        steps = api.make(volume, "wash", library=library)
+
+Rather than printing an error message and exiting, each function raises an exception from buf.exceptions when given
+invalid input (for example, api.get_recipe raises a RecipeNotFoundError if no recipe has the given name). Every such
+exception is a subclass of BufError, whose message is the one buf would show on the command line."""
+
+from buf.exceptions import BufError
+from buf.session import Library
+from buf.commands import make as make_command
+from buf import error_messages
+
+def load_chemicals(library: Library = None):
+    """Returns the chemical library, as a dictionary mapping each chemical name to its Chemical object (so a chemical
+    appears once for each of its names)."""
+    if library == None:
+        library = Library()
+
+    return dict(library.load_chemicals())
+
+def load_recipes(library: Library = None):
+    """Returns the recipe library, as a dictionary mapping each recipe name to its Recipe object."""
+    if library == None:
+        library = Library()
+
+    return dict(library.load_recipes())
+
+def get_chemical(chemical_name: str, library: Library = None):
+    """Returns the Chemical object with the given name, raising a ChemicalNotFoundError if there isn't one."""
+    if library == None:
+        library = Library()
+
+    chemical_library = library.fetch_chemicals([chemical_name])
+
+    if chemical_name not in chemical_library:
+        error_messages.chemical_not_found(chemical_name)
+
+    return chemical_library[chemical_name]
+
+def get_recipe(recipe_name: str, library: Library = None):
+    """Returns the Recipe object with the given name, raising a RecipeNotFoundError if there isn't one."""
+    return make_command.get_recipe(recipe_name, library)
+
+def make(volume: str, recipe_name: str = None, concentrations: list = None, chemical_names: list = None, library: Library = None):
+    """Returns the list of Steps (each giving the name of an ingredient, its concentration, and the amount of it to add)
+    required to make the given volume (e.g. '2L') of a buffer/solution. The buffer is either a recipe in the recipe
+    library, given by recipe_name, or defined on the spot from lists of concentrations and chemical names, as with
+    'buf make' (see 'buf help make'). As with 'buf make', buffers made recently are taken from the results cache."""
+    return make_command.get_buffer_steps(volume, recipe_name, concentrations, chemical_names, library)
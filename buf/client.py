@@ -0,0 +1,85 @@
+# File name: client.py
+# Author: Jordan Juravsky
+# Date created: 18-10-2026
+
+"""Forwards commands to a running buf daemon (see 'buf help serve'), which answers them from the libraries it keeps in
+memory rather than reading them from disk on every command."""
+
+import os
+import sys
+from buf import libraries
+
+socket_file = os.path.join(libraries.library_dir, "buf.sock")
+
+# Only commands that don't modify one's libraries, or ask for confirmation, are answered by the daemon.
+forwardable_subcommands = ["make", "chemical", "recipe"]
+forwardable_options = ["--orders", "--format", "--limit", "--offset", "--plain"]
+
+def is_forwardable(arguments):
+    """Checks whether the command given by a list of command line arguments (excluding the leading 'buf') can be answered
+    by the daemon."""
+    if len(arguments) == 0 or arguments[0] not in forwardable_subcommands:
+        return False
+
+    # Options with values may be given as '--limit=20' or '--limit 20'.
+    return all(argument.split("=")[0] in forwardable_options for argument in arguments[1:] if argument.startswith("-"))
+
+def send_request(request: dict):
+    """Sends a request to the daemon, returning its response, or None if the daemon isn't running."""
+    if os.path.exists(socket_file) == False:
+        return None
+
+    # Imported here, so that commands run without a daemon don't pay for importing them.
+    import json
+    import socket
+
+    if hasattr(socket, "AF_UNIX") == False:
+        return None
+
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+            connection.connect(socket_file)
+            connection.sendall(json.dumps(request).encode("utf-8") + b"\n")
+            connection.shutdown(socket.SHUT_WR)
+
+            response = b""
+            while True:
+                data = connection.recv(65536)
+                if not data:
+                    break
+                response += data
+    except OSError:
+        # The socket file is left behind if the daemon didn't shut down cleanly, in which case nothing is listening on it.
+        return None
+
+    if len(response) == 0:
+        return None
+
+    return json.loads(response.decode("utf-8"))
+
+def forward_command(arguments):
+    """Forwards the command given by a list of command line arguments (excluding the leading 'buf') to the daemon,
+    writing its output and exiting as the command would have. Returns False if the command wasn't answered by the daemon
+    (in which case it should be run as normal), and True otherwise."""
+    if is_forwardable(arguments) == False:
+        return False
+
+    arguments = list(arguments)
+
+    # The daemon may be running in a different directory, so file names are made absolute.
+    for index, argument in enumerate(arguments[:-1]):
+        if argument == "--orders":
+            arguments[index + 1] = os.path.abspath(arguments[index + 1])
+
+    response = send_request({"arguments": arguments})
+
+    if response == None or response["handled"] == False:
+        return False
+
+    sys.stdout.write(response["output"])
+    sys.stdout.flush()
+
+    if response["exit_code"] != None:
+        sys.exit(response["exit_code"])
+
+    return True
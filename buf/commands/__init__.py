@@ -2,5 +2,19 @@
 # Author: Jordan Juravsky
 # Date created: 27-07-2018
 
-# TODO: should I import the entire module, or just the relevant functions?
-from . import chemical, recipe, make, help
\ No newline at end of file
+"""Each subcommand of buf has a module in this package, containing an instructions docstring and a function sharing the
+module's name, which is called with the dictionary of command line options and a buf.session.Library (or None).
+Subcommand modules are only imported when they are first accessed (e.g. 'buf.commands.chemical'), so that running one
+subcommand doesn't import the others."""
+
+from importlib import import_module
+
+subcommand_names = ["chemical", "recipe", "make", "help", "migrate", "compact", "serve", "http", "shell", "completion"]
+
+def __getattr__(name: str):
+    if name in subcommand_names:
+        return import_module("." + name, __name__)
+    raise AttributeError("module '" + __name__ + "' has no attribute '" + name + "'")
+
+def __dir__():
+    return sorted(list(globals().keys()) + subcommand_names)
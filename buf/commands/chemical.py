@@ -6,8 +6,8 @@
 
 
 import os
-import tabulate
-from buf import user_input, error_messages, libraries
+from buf import user_input, error_messages, libraries, database, completion, tables
+from buf.session import Library
 from typing import Sequence
 
 instructions = """buf chemical:
@@ -39,7 +39,14 @@ separate each item on a line. For example, if a file 'chemicals.txt' contains th
 68.08 Imidazole imi
 74.55 KCl
 
-Using 'buf chemical -a chemicals.txt' would add these three chemicals to your library. 
+Using 'buf chemical -a chemicals.txt' would add these three chemicals to your library. Several files can be added at once \
+(e.g. 'buf chemical -a chemicals.txt more_chemicals.txt', or 'buf chemical -a lists/*.txt'), in which case they are checked \
+in parallel. If any line of any file is invalid, or the same name is used twice, none of the chemicals are added.
+
+By default, buf stops at the first invalid line it finds. To check every line of the files and list every error at once, \
+use the '--report-all' option (e.g. 'buf chemical -a chemicals.txt --report-all'). Each error is printed on its own line \
+as a JSON object giving the file, line and column of the error, along with the reason for it. As before, nothing is added \
+to your library unless every line is valid.
 
 To delete a chemical, use 'buf chemical -d <chemical_name>'. By default, chemical deletion is shallow/incomplete; the same chemical \
 can still be accessed through its other names after one name has been deleted. For example, if 'buf chemical -a 58.44 NaCl salt' was used to \
@@ -50,35 +57,73 @@ asking you to confirm your decision, use the '--confirm' option.
 
 To view information about a specific chemical (its molar mass and additional names), use 'buf chemical <chemical_name>'. To view your entire \
 chemical library, use 'buf chemical'.
+
+Large libraries can be viewed a page at a time with the '--limit' and '--offset' options. For example, \
+'buf chemical --limit=20 --offset=40' shows the 41st to the 60th chemicals (in alphabetical order). To show the library \
+as plain columns rather than a grid, use the '--plain' option, which is quicker for very large libraries and is easier \
+to pass to other programs (e.g. 'buf chemical --plain | grep NaCl'). Chemicals are shown as soon as they are ready, so \
+piping the output into 'head' or 'less' shows the start of your library straight away.
+
+For use by other programs, 'buf chemical' and 'buf chemical <chemical_name>' can print chemicals in a machine-readable \
+format with the '--format' option, which is one of 'json', 'csv' or 'ndjson' (one JSON object per line). For example, \
+'buf chemical NaCl --format=json' prints:
+
+{"name": "NaCl", "other_names": ["salt"], "molar_mass": 58.44}
 """
 
-chemical_library_file = libraries.fetch_library_file_path("chemicals.txt")
+chemical_library_file = os.path.join(libraries.library_dir, "chemicals.txt")
+
+def chemical(options : dict, library: Library = None):
+    """Parses dictionary of command line options and calls appropriate functions. Chemicals are looked up in library
+    (see buf.session), which is updated if the command changes the chemical library."""
+    if library == None:
+        library = Library()
 
-def chemical(options : dict):
-    """Parses dictionary of command line options and calls appropriate functions."""
     if options["-a"]:
-        if options["<file_name>"]:
-            add_chemicals_from_file(options["<file_name>"])
+        if options["<file_names>"]:
+            add_chemicals_from_files(options["<file_names>"], report_all=options["--report-all"])
+            library.clear()
+            completion.rebuild_index(library)
+        elif is_number(options["<molar_mass>"]) == False and libraries.is_file_name(options["<molar_mass>"]):
+            # Several file names match the usage for adding a single chemical, but a molar mass is always a number.
+            add_chemicals_from_files([options["<molar_mass>"]] + options["<chemical_names>"])
+            library.clear()
+            completion.rebuild_index(library)
         else:
-            add_single_chemical(options["<molar_mass>"], options["<chemical_names>"])
+            with library.changing_chemicals(options["<chemical_names>"]):
+                add_single_chemical(options["<molar_mass>"], options["<chemical_names>"])
     elif options["-d"]:
-        delete_chemical(options["<chemical_name>"], complete_deletion=options["--complete"], prompt_for_confirmation= not options["--confirm"])
+        with library.changing_chemicals([options["<chemical_name>"]]):
+            delete_chemical(options["<chemical_name>"], complete_deletion=options["--complete"], prompt_for_confirmation= not options["--confirm"])
     elif options["-n"]:
-        nickname_chemical(options["<existing_chemical_name>"], options["<nicknames>"])
+        with library.changing_chemicals([options["<existing_chemical_name>"]] + options["<nicknames>"]):
+            nickname_chemical(options["<existing_chemical_name>"], options["<nicknames>"])
     elif options["<chemical_name>"]:
-        display_chemical_information(options["<chemical_name>"])
+        format_name = tables.get_format_option(options["--format"])
+        display_chemical_information(options["<chemical_name>"], library, format_name=format_name)
     else:
-        display_chemical_library()
+        limit = tables.get_page_option("--limit", options["--limit"])
+        offset = tables.get_page_option("--offset", options["--offset"])
+        format_name = tables.get_format_option(options["--format"])
+        display_chemical_library(library, limit=limit, offset=offset, plain=options["--plain"], format_name=format_name)
 
 # --------------------------------------------------------------------------------
 # --------------------------CHEMICAL DEFINITION AND CREATION----------------------
 # --------------------------------------------------------------------------------
 
 class Chemical:
-    """A record that maps chemical names to a molar mass."""
+    """An immutable record that maps chemical names to a molar mass."""
+    __slots__ = ("molar_mass", "names")
+
     def __init__(self, molar_mass: float, names: Sequence[str]):
-        self.molar_mass = molar_mass
-        self.names = names
+        object.__setattr__(self, "molar_mass", molar_mass)
+        object.__setattr__(self, "names", tuple(names))
+
+    def __setattr__(self, attribute, value):
+        raise AttributeError("Chemical objects are immutable.")
+
+    def __reduce__(self):
+        return (Chemical, (self.molar_mass, self.names))
 
     def __repr__(self):
         string = str(self.molar_mass)
@@ -89,11 +134,22 @@ class Chemical:
     def __eq__(self, other):
         return self.molar_mass == other.molar_mass and set(self.names) == set(other.names)
 
+    def __hash__(self):
+        return hash((self.molar_mass, frozenset(self.names)))
+
+
+def is_number(string: str):
+    """Checks whether a string can be read as a number."""
+    try:
+        float(string)
+        return True
+    except ValueError:
+        return False
 
 def make_safe_chemical(molar_mass : str, names : list, chemical_library: dict = None):
     """Type checks user input, safely making a Chemical if input is valid."""
     if chemical_library == None:
-        chemical_library = load_chemicals()
+        chemical_library = fetch_chemicals(names)
 
     for name in names:
         if name in chemical_library:
@@ -119,61 +175,169 @@ def make_safe_chemical(molar_mass : str, names : list, chemical_library: dict =
 
 def add_single_chemical(molar_mass: str, names: Sequence[str]):    
     """Adds single chemical to library."""
-    new_chemical = make_safe_chemical(molar_mass, names)
-    with open(chemical_library_file, "a") as file:
-        file.write(str(new_chemical) + "\n")
+    with libraries.lock_library(chemical_library_file, exclusive=True):
+        new_chemical = make_safe_chemical(molar_mass, names)
+        append_chemicals([new_chemical])
 
-def add_chemicals_from_file(filename : str):
-    """Parses specified file, adding a chemical to the library for each line in the file.
-    Each line in the file should first contain the chemicals's molar mass, followed by a list of its names.
+def add_chemicals_from_files(file_names: Sequence[str], report_all: bool = False):
+    """Parses the specified files, adding a chemical to the library for each line in the files.
+    Each line in a file should first contain the chemicals's molar mass, followed by a list of its names.
     All words should be separated by spaces. Example file:
 
     58.44 NaCl table_salt sodium_chloride
     74.55 KCl potassium_chloride
+
+    Each file is first checked on its own (in parallel, when there are several; see libraries.stage_files). The chemicals
+    are then checked against the library and against each other, and only once every line of every file is valid are they
+    appended to the library, in a single write. Normally, buf exits at the first invalid line; if report_all is True,
+    every file is checked in full, and every error found is reported (see libraries.report_import_errors).
     """
-    if os.path.isfile(filename) == False:
-        error_messages.file_not_found(filename)
+    file_names = libraries.expand_file_names(file_names)
+    errors = [] if report_all else None
 
-    try:
-        with open(filename, "r") as file:
-            lines = file.readlines()
-    except:
-        error_messages.file_read_error(filename)
+    with libraries.lock_library(chemical_library_file, exclusive=True):
+        for file_name in file_names:
+            if os.path.isfile(file_name) == False:
+                error_messages.file_not_found(file_name)
 
-    existing_chemical_library = load_chemicals()
+        # Imported here, as it is only needed when adding chemicals from files.
+        import tempfile
 
-    new_chemical_names = []
-    new_chemical_objects = []
+        with libraries.stage_files(check_chemical_file, file_names, errors) as staged_file_paths, \
+                tempfile.TemporaryFile(mode="w+") as staged_file:
+            # Maps each name seen so far to the index of the file it was first seen in.
+            files_by_name = {}
+            listed_names = []
+            number_of_chemicals = 0
+            number_of_lines = 0
 
-    for line_number, line in enumerate(lines):
+            for file_index, staged_file_path in enumerate(staged_file_paths):
+                # Errors name the file they occurred in when there are several.
+                file_name = file_names[file_index] if len(file_names) > 1 else None
 
-        try:
-            words = line.split()
-            if len(words) == 0:
-                continue
-            elif len(words) < 2:
-                error_messages.line_too_short_in_chemical_file(line_number)
+                with open(staged_file_path, "r") as staged_input:
+                    for staged_batch in libraries.read_line_batches(staged_input, staged_file_path):
+                        batch = [libraries.unstage_line(staged_line) for staged_line_number, staged_line in staged_batch]
+                        existing_chemical_library = fetch_chemicals([name for line_number, line in batch for name in line.split()[1:]])
 
-            molar_mass = words[0]
-            names = words[1:]
+                        for line_number, line in batch:
+                            words = line.split()
+                            names = words[1:]
 
-            new_chemical = make_safe_chemical(molar_mass, names, chemical_library=existing_chemical_library)
+                            checks = [(index, check_new_chemical_name, (name, existing_chemical_library, files_by_name, file_index, file_names))
+                                      for index, name in enumerate(names, 1)]
 
-            for name in names:
-                if name in new_chemical_names:
-                    error_messages.duplicate_file_entry(name)
-                new_chemical_names.append(name)
+                            try:
+                                if libraries.run_line_checks(checks, file_names[file_index], line_number, line, errors) == False:
+                                    continue
+                            except Exception as error:
+                                error_messages.add_from_file_termination(line_number, erroneous_line=line, upper_case_data_type="Chemicals",
+                                                                         file_name=file_name, cause=error)
 
-            new_chemical_objects.append(new_chemical)
+                            staged_file.write(str(Chemical(float(words[0]), names)) + "\n")
 
-        except:
-            error_messages.add_from_file_termination(line_number, erroneous_line=line.strip("\n"), upper_case_data_type="Chemicals")
+                            number_of_chemicals += 1
+                            if len(listed_names) + len(names) <= libraries.max_listed_names:
+                                listed_names += names
+
+                        number_of_lines += len(batch)
+                        libraries.report_import_progress(number_of_lines)
 
-    with open(chemical_library_file, "a") as file:
-        for new_chemical in new_chemical_objects:
-            file.write(str(new_chemical) + "\n")
+            libraries.report_import_progress(number_of_lines, finished=True)
 
-    print("Added the following chemicals to your library:", *new_chemical_names)
+            if report_all and len(errors) > 0:
+                libraries.report_import_errors(errors, file_names, upper_case_data_type="Chemicals")
+
+            staged_file.seek(0)
+            append_staged_chemicals(staged_file)
+
+        if len(files_by_name) == len(listed_names):
+            print("Added the following chemicals to your library:", *listed_names)
+        else:
+            print("Added " + str(number_of_chemicals) + " chemicals (" + str(len(files_by_name)) + " names) to your library.")
+
+def check_chemical_file(file_name: str, staged_file_path: str, errors: list = None):
+    """Checks each line of a chemical file on its own (i.e. without looking at the library or the rest of the file),
+    writing the valid lines to a staged file (see libraries.stage_files). If errors is a list, every invalid line is
+    added to it, rather than exiting at the first one."""
+    try:
+        input_file = open(file_name, "r")
+    except:
+        error_messages.file_read_error(file_name)
+
+    with input_file as file, open(staged_file_path, "w") as staged_file:
+        for batch in libraries.read_line_batches(file, file_name):
+            for line_number, line in batch:
+                words = line.split()
+                if len(words) == 0:
+                    continue
+
+                checks = [(None, check_chemical_line_length, (words, line_number)),
+                          (0, make_safe_chemical, (words[0], [], {}))]
+
+                try:
+                    if libraries.run_line_checks(checks, file_name, line_number, line, errors) == False:
+                        continue
+                except Exception as error:
+                    error_messages.add_from_file_termination(line_number, erroneous_line=line.strip("\n"), upper_case_data_type="Chemicals",
+                                                             cause=error)
+
+                staged_file.write(libraries.stage_line(line_number, line))
+
+def check_chemical_line_length(words: Sequence[str], line_number: int):
+    """Checks that a line of a chemical file has at least one name after its molar mass."""
+    if len(words) < 2:
+        error_messages.line_too_short_in_chemical_file(line_number)
+
+def check_new_chemical_name(name: str, chemical_library: dict, files_by_name: dict, file_index: int, file_names: Sequence[str]):
+    """Checks that a name being added from a file isn't already in the library, and hasn't already been used in the files
+    being added (files_by_name maps each name used so far to the index of its file in file_names), then records its use."""
+    if name in chemical_library:
+        error_messages.chemical_already_exists(name)
+
+    if name in files_by_name:
+        if files_by_name[name] == file_index:
+            error_messages.duplicate_file_entry(name)
+        error_messages.duplicate_entry_across_files(name, file_names[files_by_name[name]])
+
+    files_by_name[name] = file_index
+
+def append_staged_chemicals(staged_file):
+    """Appends the chemicals in a staged file (an open file in the chemical library file's format) to the library, without
+    reading them all into memory at once."""
+    if database.is_active():
+        database.add_chemicals((float(words[0]), words[1:]) for words in (line.split() for line in staged_file))
+        return
+
+    # Within a group commit, the chemicals are added to the buffered journal, so that they are only written if the whole
+    # group succeeds (see libraries.group_commit).
+    if libraries.in_group_commit(chemical_library_file):
+        write_journal_records(["add " + line.rstrip("\n") for line in staged_file])
+        return
+
+    # Rather than adding every chemical to the journal, any pending changes are folded into the library file first,
+    # so that the chemicals can be appended to the end of the library file.
+    if libraries.journal_is_empty(chemical_library_file) == False:
+        compact_chemical_library()
+
+    libraries.append_staged_file(chemical_library_file, staged_file, chemical_line_names)
+
+def append_chemicals(new_chemicals: Sequence[Chemical]):
+    """Appends new chemicals to the library. They are written to the end of the library file, unless the library has a
+    journal of changes that haven't been compacted yet, in which case they are added to the journal so that all changes
+    are replayed in the order they were made."""
+    if database.is_active():
+        database.add_chemicals([(new_chemical.molar_mass, new_chemical.names) for new_chemical in new_chemicals])
+    elif libraries.journal_is_empty(chemical_library_file):
+        signature = libraries.get_file_signature(chemical_library_file)
+
+        with open(chemical_library_file, "a") as file:
+            for new_chemical in new_chemicals:
+                file.write(str(new_chemical) + "\n")
+
+        libraries.index_appended_lines(chemical_library_file, signature, chemical_line_names)
+    else:
+        write_journal_records(["add " + str(new_chemical) for new_chemical in new_chemicals])
 
 # --------------------------------------------------------------------------------
 # -------------------------NICKNAMING/DELETING CHEMICALS--------------------------
@@ -181,27 +345,27 @@ def add_chemicals_from_file(filename : str):
 
 def nickname_chemical(existing_chemical_name: str, new_names: Sequence[str]):
     """Adds additional names to an existing chemical in the library."""
-    chemical_library = load_chemicals()
-
-    if existing_chemical_name not in chemical_library:
-        error_messages.chemical_not_found(existing_chemical_name)
-
-    for new_name in new_names:
-        if new_name in chemical_library:
-            error_messages.chemical_already_exists(new_name)
-        if " " in new_name:
-            error_messages.spaces_in_chemical_name(new_name)
+    with libraries.lock_library(chemical_library_file, exclusive=True):
+        chemical_library = fetch_chemicals([existing_chemical_name] + list(new_names))
 
-    chemical_object = chemical_library[existing_chemical_name]
+        if existing_chemical_name not in chemical_library:
+            error_messages.chemical_not_found(existing_chemical_name)
 
-    chemical_object.names += new_names
+        for new_name in new_names:
+            if new_name in chemical_library:
+                error_messages.chemical_already_exists(new_name)
+            if " " in new_name:
+                error_messages.spaces_in_chemical_name(new_name)
 
-    save_chemical_library(chemical_library)
+        if database.is_active():
+            database.nickname_chemical(existing_chemical_name, new_names)
+        else:
+            write_journal_records(["alias " + " ".join([existing_chemical_name] + list(new_names))])
 
 def delete_chemical(chemical_name: str, complete_deletion: bool = False, prompt_for_confirmation: bool = True):
     """Deletes chemical from the library. If complete_deletion == False, only the specific name specified is deleted from \
     the library. If true, then the entire chemical record (including all other names) is deleted."""
-    chemical_library = load_chemicals()
+    chemical_library = fetch_chemicals([chemical_name])
 
     if chemical_name not in chemical_library:
         error_messages.chemical_not_found(chemical_name)
@@ -209,25 +373,25 @@ def delete_chemical(chemical_name: str, complete_deletion: bool = False, prompt_
     chemical_object = chemical_library[chemical_name]
 
     if complete_deletion:
-        names = chemical_object.names
+        names = list(chemical_object.names)
 
         if prompt_for_confirmation:
             print("You are about to delete the following chemicals from your library:", *names)
             user_input.confirm()
 
-        for name in names:
-            del (chemical_library[name])
-
     else:
+        names = [chemical_name]
 
         if prompt_for_confirmation:
             print("You are about to delete '" + str(chemical_name) + "' from your chemical library.")
             user_input.confirm()
 
-        chemical_object.names.remove(chemical_name)
-        del (chemical_library[chemical_name])
-
-    save_chemical_library(chemical_library)
+    if database.is_active():
+        database.delete_chemical_names(names)
+    else:
+        # The lock isn't held while waiting for the user to confirm, so that other buf processes aren't held up.
+        # Deleting a name that another process deleted in the meantime is harmless.
+        write_journal_records(["delete " + " ".join(names)])
 
     print("Deletion successful.")
 
@@ -237,76 +401,272 @@ def delete_chemical(chemical_name: str, complete_deletion: bool = False, prompt_
 
 def save_chemical_library(chemical_library: dict):
     """Saves chemical_library to file."""
-    unique_chemical_objects = []
+    with libraries.lock_library(chemical_library_file, exclusive=True):
+        # Each chemical appears once per name, so chemicals are deduplicated by identity (keeping the library's order).
+        unique_chemical_objects = {id(chemical_object): chemical_object for chemical_object in chemical_library.values()}.values()
+
+        file_contents = "".join(str(chemical_object) + "\n" for chemical_object in unique_chemical_objects)
+        libraries.write_file_atomically(chemical_library_file, file_contents.encode("utf-8"), durable=True)
 
-    for chemical_object in chemical_library.values():
-        if chemical_object not in unique_chemical_objects:
-            unique_chemical_objects.append(chemical_object)
+        # The saved library already includes every change recorded in the journal.
+        libraries.clear_journal(chemical_library_file)
 
-    with open(chemical_library_file, "w") as file:
-        for chemical_object in unique_chemical_objects:
-            file.write(str(chemical_object) + "\n")
 
+def get_library_file_paths():
+    """Returns the paths of the files the chemical library is read from (the library file, its journal, and the database),
+    not all of which need exist."""
+    return [chemical_library_file, libraries.fetch_journal_file_path(chemical_library_file), database.database_file]
 
 def load_chemicals():
-    """Loads chemical library from file."""
-    try:
-        with open(chemical_library_file, "r") as file:
-            chemical_lines = file.readlines()
+    """Loads chemical library from file (or from the database, if the library has been migrated to one). When buf is running as
+    a daemon, the library is kept in memory, and only read again once it changes."""
+    with libraries.lock_library(chemical_library_file):
+        return libraries.load_resident_library(get_library_file_paths(), read_chemicals)
+
+def read_chemicals():
+    """Reads chemical library from file (or from the database, if the library has been migrated to one)."""
+    with libraries.lock_library(chemical_library_file):
+        if database.is_active():
+            chemicals = {}
+            for molar_mass, names in database.load_chemicals():
+                chemical = Chemical(molar_mass, names)
+                for name in names:
+                    chemicals[name] = chemical
+            return chemicals
+
+        try:
+            chemicals = libraries.load_cached_library(chemical_library_file, chemicals_from_entries)
+
+            if chemicals == None:
+                signature = libraries.get_file_signature(chemical_library_file)
+                with open(chemical_library_file, "r") as file:
+                    file_contents = file.read()
+
+                chemicals = {}
+
+                for line in file_contents.splitlines():
+                    words = line.split()
+                    molar_mass = words[0]
+                    names = words[1:]
+                    chemical = make_safe_chemical(molar_mass, names, chemical_library=chemicals)
+                    for name in names:
+                        chemicals[name] = chemical
+
+                libraries.cache_library(chemical_library_file, signature, file_contents, get_chemical_entries(chemicals))
+
+            for record in libraries.read_journal(chemical_library_file):
+                apply_journal_record(chemicals, record)
+
+            return chemicals
+        except:
+            error_messages.library_load_error(lower_case_library_name="chemical")
+
+def get_chemical_entries(chemicals: dict):
+    """Returns the entries of a chemical library to be cached (see libraries.cache_library): a [molar_mass, names] list
+    for each chemical."""
+    unique_chemical_objects = {id(chemical_object): chemical_object for chemical_object in chemicals.values()}.values()
+    return [[chemical_object.molar_mass, list(chemical_object.names)] for chemical_object in unique_chemical_objects]
+
+def chemicals_from_entries(entries: list):
+    """Builds a chemical library from the entries returned by get_chemical_entries."""
+    chemicals = {}
+    for molar_mass, names in entries:
+        chemical_object = Chemical(float(molar_mass), [str(name) for name in names])
+        for name in chemical_object.names:
+            chemicals[name] = chemical_object
+    return chemicals
+
+def fetch_chemicals(names: Sequence[str]):
+    """Returns a dictionary mapping each of the given names that exists in the chemical library to its Chemical.
+    If the library has been migrated to a database, only the requested chemicals are read."""
+    with libraries.lock_library(chemical_library_file):
+        if libraries.resident_libraries != None:
+            chemicals = load_chemicals()
+            return {name: chemicals[name] for name in names if name in chemicals}
+
+        if database.is_active():
+            chemicals = {}
+            for name, (molar_mass, chemical_names) in database.fetch_chemicals(names).items():
+                chemicals[name] = Chemical(molar_mass, chemical_names)
+            return chemicals
+
+        journal = libraries.read_journal(chemical_library_file)
+
+        # The journal may refer to chemicals by any of their names, so every chemical named in the journal is read from the
+        # library file as well, so that the journal can be replayed on top of them.
+        names_to_read = set(names)
+        for record in journal:
+            names_to_read.update(journal_record_names(record))
 
         chemicals = {}
+        chemicals_by_line = {}
+
+        for line in libraries.find_indexed_lines(chemical_library_file, names_to_read, chemical_line_names).values():
+            if line in chemicals_by_line:
+                continue
 
-        for line in chemical_lines:
+            # Names that share a line (i.e. nicknames of each other) share the same Chemical object, as in load_chemicals.
             words = line.split()
-            molar_mass = words[0]
-            names = words[1:]
-            chemical = make_safe_chemical(molar_mass, names, chemical_library=chemicals)
-            for name in names:
-                chemicals[name] = chemical
+            chemicals_by_line[line] = make_safe_chemical(words[0], words[1:], chemical_library={})
+            for chemical_name in words[1:]:
+                chemicals[chemical_name] = chemicals_by_line[line]
 
-        return chemicals
-    except:
-        error_messages.library_load_error(lower_case_library_name="chemical")
+        for record in journal:
+            apply_journal_record(chemicals, record)
+
+        return {name: chemicals[name] for name in names if name in chemicals}
+
+def chemical_line_names(words: Sequence[str]):
+    """Given the words on a line of the chemical library file, returns the names of the chemical defined on that line."""
+    return words[1:]
 
 def reset():
     """Wipes chemical library."""
-    with open(chemical_library_file, "w") as file:
-        pass
+    with libraries.lock_library(chemical_library_file, exclusive=True):
+        if database.is_active():
+            database.reset_chemicals()
+
+        with open(chemical_library_file, "w") as file:
+            pass
+
+        libraries.clear_journal(chemical_library_file)
+
+# --------------------------------------------------------------------------------
+# ----------------------------CHEMICAL LIBRARY JOURNAL----------------------------
+# --------------------------------------------------------------------------------
+
+# Rather than rewriting the whole chemical library file to nickname or delete a chemical, these changes are appended
+# to a journal, which is replayed on top of the library file whenever it is loaded. Each record in the journal is
+# one of the following:
+#
+#   add <molar_mass> <names>...            Adds a chemical with the given names.
+#   alias <existing_name> <new_names>...   Nicknames an existing chemical.
+#   delete <names>...                      Deletes the given names.
+#
+# Once the journal grows past libraries.journal_compaction_threshold bytes (or when 'buf compact' is used), it is
+# folded back into the library file.
+
+def write_journal_records(records: Sequence[str]):
+    """Appends records to the chemical library's journal, compacting the library if the journal has grown too large."""
+    with libraries.lock_library(chemical_library_file, exclusive=True):
+        libraries.append_journal_records(chemical_library_file, records)
+
+        if libraries.journal_needs_compaction(chemical_library_file):
+            compact_chemical_library()
+
+def journal_record_names(record: Sequence[str]):
+    """Returns the chemical names that a journal record (given as a list of words) refers to."""
+    if record[0] == "add":
+        return record[2:]
+    return record[1:]
+
+def apply_journal_record(chemical_library: dict, record: Sequence[str]):
+    """Applies a journal record (given as a list of words) to a dictionary mapping chemical names to Chemicals.
+    A name that is added or nicknamed is first detached from any chemical it is bound to, so replaying a record that
+    was already applied leaves the library unchanged."""
+    operation = record[0]
+
+    if operation == "add":
+        names = record[2:]
+        detach_chemical_names(chemical_library, names)
+        new_chemical = Chemical(float(record[1]), list(names))
+        for name in names:
+            chemical_library[name] = new_chemical
+
+    elif operation == "alias":
+        existing_chemical_name, new_names = record[1], record[2:]
+        if existing_chemical_name not in chemical_library:
+            return
+        new_names = [name for name in new_names if name != existing_chemical_name]
+        detach_chemical_names(chemical_library, new_names)
+        chemical_object = chemical_library[existing_chemical_name]
+        replace_chemical(chemical_library, chemical_object,
+                         Chemical(chemical_object.molar_mass, list(chemical_object.names) + new_names), new_names)
+
+    elif operation == "delete":
+        detach_chemical_names(chemical_library, record[1:])
+
+    else:
+        raise ValueError("Unknown journal operation: '" + str(operation) + "'.")
+
+def detach_chemical_names(chemical_library: dict, names: Sequence[str]):
+    """Removes names from a dictionary mapping chemical names to Chemicals, as well as from the Chemicals they refer to."""
+    for name in names:
+        if name in chemical_library:
+            chemical_object = chemical_library[name]
+            del (chemical_library[name])
+            remaining_names = [other_name for other_name in chemical_object.names if other_name != name]
+            replace_chemical(chemical_library, chemical_object, Chemical(chemical_object.molar_mass, remaining_names))
+
+def replace_chemical(chemical_library: dict, old_chemical: Chemical, new_chemical: Chemical, new_names: Sequence[str] = ()):
+    """Since Chemicals are immutable, changing a chemical's names means replacing it: this points every name in a dictionary
+    that referred to old_chemical, as well as each of new_names, to new_chemical instead."""
+    for name in old_chemical.names:
+        if chemical_library.get(name) is old_chemical:
+            chemical_library[name] = new_chemical
+    for name in new_names:
+        chemical_library[name] = new_chemical
+
+def compact_chemical_library():
+    """Folds the journal into the chemical library file. Within a group commit, compaction is put off until a later change
+    (see libraries.in_group_commit)."""
+    with libraries.lock_library(chemical_library_file, exclusive=True):
+        if database.is_active() or libraries.in_group_commit(chemical_library_file):
+            return
+
+        save_chemical_library(load_chemicals())
 
 # --------------------------------------------------------------------------------
 # -----------------------------DISPLAYING CHEMICALS-------------------------------
 # --------------------------------------------------------------------------------
 
-def display_chemical_information(chemical_name: str):
-    """Displays the names and molar mass of a specified chemical."""
-    chemical_library = load_chemicals()
+def display_chemical_information(chemical_name: str, library: Library = None, format_name: str = None):
+    """Displays the names and molar mass of a specified chemical, as a record in the given format (see
+    buf.tables.print_record) if format_name is given."""
+    if library == None:
+        library = Library()
+
+    chemical_library = library.fetch_chemicals([chemical_name])
 
-    if chemical_name not in chemical_name:
+    if chemical_name not in chemical_library:
         error_messages.chemical_not_found(chemical_name)
 
     chemical_object = chemical_library[chemical_name]
+    other_names = [name for name in chemical_object.names if name != chemical_name]
+
+    if format_name != None:
+        record = {"name": chemical_name, "other_names": other_names, "molar_mass": chemical_object.molar_mass}
+        tables.print_record(record, ["name", "other_names", "molar_mass"], format_name)
+        return
 
     print("Chemical name: " + str(chemical_name))
 
-    other_names = [name for name in chemical_object.names if name != chemical_name]
     print("Other names:", *other_names)
 
     print("Molar mass: " + str(chemical_object.molar_mass))
 
 
 
-def display_chemical_library():
-    """Displays all chemicals in the library."""
-    chemical_library = load_chemicals()
+def display_chemical_library(library: Library = None, limit: int = None, offset: int = None, plain: bool = False,
+                             format_name: str = None):
+    """Displays the chemicals in the library, sorted by name. If limit or offset are given, only limit chemicals are shown,
+    after skipping the first offset. Rows are printed as they are formatted (see buf.tables), plainly if plain is True, or
+    as records in the given format if format_name is given."""
+    if library == None:
+        library = Library()
 
-    print("The chemicals in your library are:")
+    chemical_library = library.load_chemicals()
 
-    table = []
+    # Sorting by the chemical name, case insensitively (see tables.get_page).
+    chemical_names = tables.get_page(chemical_library, limit, offset)
 
-    for chemical_name, chemical_object in chemical_library.items():
-        table.append((chemical_name, chemical_object.molar_mass))
+    if format_name != None:
+        records = ({"name": chemical_name, "molar_mass": chemical_library[chemical_name].molar_mass} for chemical_name in chemical_names)
+        tables.print_records(records, ["name", "molar_mass"], format_name)
+        return
+
+    print("The chemicals in your library are:")
 
-    # Sorting by the chemical name, upper() is called so that all the upper case names don't precede all the lowercase ones.
-    table.sort(key=lambda entry: entry[0].upper())
+    rows = ((chemical_name, chemical_library[chemical_name].molar_mass) for chemical_name in chemical_names)
 
-    print(tabulate.tabulate(table, headers=["Chemical Name", "Molar Mass (g/mol)"], tablefmt="fancy_grid"))
+    tables.print_table(rows, headers=["Chemical Name", "Molar Mass (g/mol)"], plain=plain)
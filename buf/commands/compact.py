@@ -0,0 +1,27 @@
+# File name: compact.py
+# Author: Jordan Juravsky
+# Date created: 18-10-2026
+
+"""Module for folding the journals of one's chemical and recipe libraries back into their library files."""
+
+from buf.commands import chemical, recipe
+from buf.session import Library
+
+instructions = """buf compact:
+
+This subcommand tidies up your chemical and recipe library files. To keep changes to large libraries fast, nicknaming \
+or deleting a chemical, or deleting a recipe, doesn't rewrite your whole library; instead, the change is noted down \
+in a journal that sits next to your library file. Buf folds the journal back into your library automatically once it \
+grows large enough, but you can use 'buf compact' to do so at any time (for example, before copying or editing your \
+library files by hand).
+"""
+
+def compact(options: dict, library: Library = None):
+    """Parses command line options, compacting both libraries."""
+    chemical.compact_chemical_library()
+    recipe.compact_recipe_library()
+
+    if library != None:
+        library.clear()
+
+    print("Compaction successful.")
@@ -0,0 +1,32 @@
+# File name: completion.py
+# Author: Jordan Juravsky
+# Date created: 18-10-2026
+
+"""Module for setting up tab completion of buf commands in bash and zsh."""
+
+from buf import commands
+from buf.completion import get_script, ensure_index_exists
+from buf.session import Library
+
+instructions = """buf completion:
+
+This subcommand sets up tab completion for buf in bash or zsh, so that pressing tab completes subcommands, the names \
+of chemicals and recipes in your libraries, and units (for example, 'buf make 2m' completes to 'buf make 2mL').
+
+To set it up, add the following line to your ~/.bashrc (for bash) or ~/.zshrc (for zsh, after 'compinit' is called):
+
+eval "$(buf completion bash)"     (or, for zsh: eval "$(buf completion zsh)")
+
+and open a new terminal. The names are completed from an index of your libraries kept in your library directory, \
+which buf updates whenever you change your libraries, so that completion stays instant however large your libraries are.
+"""
+
+def completion(options: dict, library: Library = None):
+    """Parses command line options, printing the completion script for the given shell."""
+    if library == None:
+        library = Library()
+
+    ensure_index_exists(library)
+
+    shell_name = "zsh" if options["zsh"] else "bash"
+    print(get_script(shell_name, commands.subcommand_names), end="")
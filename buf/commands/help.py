@@ -6,6 +6,7 @@
 
 from buf import commands
 from buf import error_messages
+from buf.session import Library
 
 instructions = """
 
@@ -28,10 +29,12 @@ buf chemical:
     Manage your chemical library. 
     
     View entire chemical library: 'buf chemical'.
+    View part of the chemical library: 'buf chemical [--limit=<limit>] [--offset=<offset>] [--plain]'. Ex. 'buf chemical --limit=20 --offset=40'.
     View information about a specific chemical: 'buf chemical <chemical_name>'. Ex. 'buf chemical NaCl'.
+    Print chemicals as JSON, CSV or NDJSON: 'buf chemical [<chemical_name>] --format=<format>'. Ex. 'buf chemical --format=csv'.
     
     Add a chemical: 'buf chemical -a <molar_mass> <chemical_names>...'. Ex. 'buf chemical -a 58.44 NaCl table_salt'.
-    Add chemicals from a file: 'buf chemical -a <file_name>'. Ex. 'buf chemical -a my_file.txt'. \
+    Add chemicals from files: 'buf chemical -a <file_names>... [--report-all]'. Ex. 'buf chemical -a my_file.txt other_file.txt'. \
 See 'buf help chemical' for details on file format.
     
     Nickname a chemical (attach additional names to an existing library entry): 'buf chemical -n <existing_chemical_name> <nicknames>...'. \
@@ -44,10 +47,12 @@ buf recipe:
     Manage your library of buffer/solution recipes.
     
     View entire recipe library: 'buf recipe'.
+    View part of the recipe library: 'buf recipe [--limit=<limit>] [--offset=<offset>] [--plain]'. Ex. 'buf recipe --limit=20 --plain'.
     View information about a specific recipe: 'buf recipe <recipe_name>'. Ex. 'buf recipe my_recipe'.
+    Print recipes as JSON, CSV or NDJSON: 'buf recipe [<recipe_name>] --format=<format>'. Ex. 'buf recipe my_recipe --format=json'.
     
     Add a recipe: 'buf recipe -a <recipe_name> (<concentration> <chemical_name>)...'. Ex. 'buf recipe -a my_recipe 300mM NaCl 10% glycerol'.
-    Add recipes from a file: 'buf recipe -a <file_name>'. Ex. 'buf recipe -a my_file.txt'. \
+    Add recipes from files: 'buf recipe -a <file_names>... [--report-all]'. Ex. 'buf recipe -a my_file.txt other_file.txt'. \
 See 'buf help recipe' for details on file format.
     
     Delete a recipe: 'buf recipe -d <recipe_name> [--confirm]'. Ex. 'buf recipe -d my_recipe'.
@@ -58,13 +63,53 @@ buf make:
     
     Make an already-defined recipe: 'buf make <volume> <recipe_name>'. Ex. 'buf make 250mL my_recipe'.
     Define a recipe as you make it: 'buf make <volume> (<concentration> <chemical_name>)...'. Ex. 'buf make 2M KCl 10% glycerol'.
+    Make every order listed in a CSV file: 'buf make --orders <orders_file>'. Ex. 'buf make --orders orders.csv'. \
+See 'buf help make' for details on file format.
+    Print the amounts as JSON, CSV or NDJSON: add '--format=<format>' to any of the above. Ex. 'buf make 2L my_recipe --format=json'.
+
+
+buf migrate:
+    Move your chemical and recipe libraries into a database, so that large libraries stay fast to use.
+
+    Migrate your libraries: 'buf migrate'.
+
+
+buf compact:
+    Fold the journal of recent nicknames and deletions back into your library files.
+
+    Compact your libraries: 'buf compact'.
+
+
+buf serve:
+    Keep your libraries in memory so that making buffers and looking up chemicals and recipes is faster.
+
+    Start the daemon: 'buf serve'.
+
+
+buf http:
+    Make buffers and look up chemicals and recipes over HTTP, with results in JSON.
+
+    Start the service: 'buf http [--host <host>] [--port <port>]'. Ex. 'buf http --port 8080'. \
+See 'buf help http' for the requests the service answers.
+
+
+buf shell:
+    Type buf commands one after another, with your libraries kept in memory and tab completion of chemical and recipe names.
+
+    Start a session: 'buf shell'.
+
+
+buf completion:
+    Complete subcommands, chemical and recipe names, and units by pressing tab in bash or zsh.
+
+    Set up completion: add 'eval "$(buf completion bash)"' to ~/.bashrc (or 'eval "$(buf completion zsh)"' to ~/.zshrc).
 
 
 For details and more example usages regarding a specific subcommand, use 'buf help <subcommand_name>'. Ex. 'buf help chemical'. \
 Documentation can also be accessed at https://buf.readthedocs.io/en/latest/index.html.
 """
 
-def help(options):
+def help(options, library: Library = None):
     """Parses command line options, finding the instructions docstring of a subcommand if the subcommand is specified, \
     otherwise printing the general help docstring of buf."""
     if options["<subcommand_name>"]:
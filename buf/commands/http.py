@@ -0,0 +1,404 @@
+# File name: http.py
+# Author: Jordan Juravsky
+# Date created: 18-10-2026
+
+"""Module for serving buf over HTTP, answering requests to make buffers and look up chemicals and recipes in JSON."""
+
+import json
+import time
+import asyncio
+from collections import deque
+from urllib.parse import urlsplit, parse_qs, unquote
+from buf import error_messages
+from buf.exceptions import BufError, ChemicalNotFoundError, RecipeNotFoundError
+from buf.session import Library
+
+instructions = """buf http:
+
+This subcommand starts buf as a web service, so that other programs (for example, a lab's inventory system or a \
+website) can make buffers and look up chemicals and recipes by sending HTTP requests, and receive the results in JSON. \
+Your chemical and recipe libraries are read once, when the service starts, and kept in memory.
+
+To start the service, use 'buf http'. By default, the service only accepts requests from the computer it is running on, \
+at http://127.0.0.1:8000. To choose another address or port, use 'buf http --host <host> --port <port>', \
+for example 'buf http --host 0.0.0.0 --port 8080'. The service stops when interrupted (e.g. with Ctrl-C).
+
+The service answers the following requests:
+
+GET /make?volume=2L&recipe=wash
+    Make a recipe in your recipe library, returning the steps required as a list of objects with the keys 'name', \
+'concentration' and 'amount_to_add'. A buffer can also be defined on the spot, by repeating the 'concentrations' \
+and 'chemical_names' parameters, e.g. /make?volume=2L&concentrations=300mM&chemical_names=NaCl.
+POST /make
+    As above, with the buffer given as a JSON object in the body of the request, e.g. {"volume": "2L", "recipe": "wash"} \
+or {"volume": "2L", "concentrations": ["300mM"], "chemical_names": ["NaCl"]}.
+GET /chemicals/<chemical_name>
+    Look up a chemical, returning its names and molar mass.
+GET /recipes/<recipe_name>
+    Look up a recipe, returning its name, concentrations and chemical names.
+POST /reload
+    Read your libraries again, after changing them (e.g. with 'buf chemical -a').
+GET /health
+    Check that the service is running, returning how long it has been running, how many requests it has answered, \
+and how long recent requests took to answer.
+
+If a request is invalid, the service responds with status 400 (or 404, if a chemical or recipe doesn't exist) and a JSON \
+object whose 'error' key holds the message buf would show on the command line.
+
+Requests to make buffers that arrive together are answered together, with a single calculation covering all of them \
+(which uses NumPy, if it is installed). The service can also be run under any ASGI server, such as uvicorn, \
+with 'uvicorn --factory buf.commands.http:create_app'.
+"""
+
+default_host = "127.0.0.1"
+default_port = 8000
+
+# The number of recent requests whose latencies are summarised by GET /health.
+max_recorded_latencies = 1000
+
+# Requests with a larger body (in bytes) are refused, so that a single request can't make the service hold an arbitrary
+# amount of memory.
+max_body_size = 1024 * 1024
+
+def http(options: dict, library: Library = None):
+    """Parses command line options, starting the service."""
+    host = options["--host"] if options["--host"] != None else default_host
+    port = get_port(options["--port"]) if options["--port"] != None else default_port
+
+    service = Service(library)
+
+    try:
+        asyncio.run(service.serve(host, port))
+    except KeyboardInterrupt:
+        pass
+
+def get_port(port_as_string: str):
+    """Given a string containing a port number, returns it as an int."""
+    try:
+        port = int(port_as_string)
+    except ValueError:
+        error_messages.invalid_port(port_as_string)
+
+    if port < 0 or port > 65535:
+        error_messages.invalid_port(port_as_string)
+
+    return port
+
+def create_app(library: Library = None):
+    """Returns a Service, which can be run under an ASGI server."""
+    return Service(library)
+
+class Service:
+    """Answers HTTP requests using the chemicals and recipes in a Library, which is loaded in full when the Service is created.
+
+    A Service is also an ASGI application, so it can be run under an ASGI server as well as by 'buf http' (see serve).
+
+    Requests to make buffers are not answered one at a time: each is added to pending_orders, and the first to arrive
+    schedules make_pending_orders to run once every request already received has been read, so that all the buffers
+    requested at once are calculated together (see make.calculate_order_amounts)."""
+    def __init__(self, library: Library = None):
+        if library == None:
+            library = Library()
+
+        self.library = library
+        self.load_libraries()
+
+        self.start_time = time.monotonic()
+        self.request_count = 0
+        self.latencies = deque(maxlen=max_recorded_latencies)
+        self.batch_count = 0
+        self.largest_batch = 0
+        self.pending_orders = []
+
+    def load_libraries(self):
+        """Reads the whole chemical and recipe libraries into memory, forgetting anything read before."""
+        self.library.clear()
+        self.library.load_chemicals()
+        self.library.load_recipes()
+
+    async def handle_request(self, method: str, path: str, query: dict, body: bytes):
+        """Answers a request, given its method, (decoded) path, query parameters (a dictionary mapping each parameter to a list of
+        values) and body, returning the response's status code and a JSON serialisable response."""
+        start_time = time.perf_counter()
+        self.request_count += 1
+
+        try:
+            status, response = 200, await self.route(method, path, query, body)
+        except (ChemicalNotFoundError, RecipeNotFoundError) as error:
+            status, response = 404, {"error": str(error)}
+        except BufError as error:
+            status, response = 400, {"error": str(error)}
+        except Exception as error:
+            status, response = 500, {"error": "Internal error: " + str(error)}
+
+        self.latencies.append(time.perf_counter() - start_time)
+        return status, response
+
+    async def route(self, method: str, path: str, query: dict, body: bytes):
+        """Passes a request on to the method that answers it, returning its response."""
+        if path == "/make" and method in ["GET", "POST"]:
+            if method == "GET":
+                order = get_order_from_query(query)
+            else:
+                order = get_order_from_body(body)
+            steps = await self.make(order)
+            return [{"name": step.name, "concentration": step.concentration, "amount_to_add": step.amount_to_add}
+                    for step in steps]
+
+        if path.startswith("/chemicals/") and method == "GET":
+            return self.get_chemical(path[len("/chemicals/"):])
+
+        if path.startswith("/recipes/") and method == "GET":
+            return self.get_recipe(path[len("/recipes/"):])
+
+        if path == "/reload" and method == "POST":
+            self.load_libraries()
+            return {"chemicals": len(self.library.chemicals), "recipes": len(self.library.recipes)}
+
+        if path == "/health" and method == "GET":
+            return self.get_health()
+
+        error_messages.invalid_request("no such endpoint: '" + method + " " + path + "'. See 'buf help http' for the endpoints available.")
+
+    def get_chemical(self, chemical_name: str):
+        """Returns the names and molar mass of a chemical."""
+        chemical_library = self.library.fetch_chemicals([chemical_name])
+
+        if chemical_name not in chemical_library:
+            error_messages.chemical_not_found(chemical_name)
+
+        chemical_object = chemical_library[chemical_name]
+        return {"names": list(chemical_object.names), "molar_mass": chemical_object.molar_mass}
+
+    def get_recipe(self, recipe_name: str):
+        """Returns the name and contents of a recipe."""
+        from buf.commands import make
+
+        recipe_object = make.get_recipe(recipe_name, self.library)
+        return {"name": recipe_object.name, "concentrations": list(recipe_object.concentrations),
+                "chemical_names": list(recipe_object.chemical_names)}
+
+    def get_health(self):
+        """Returns how long the service has been running, how many requests it has answered, how long recent requests
+        took to answer (in milliseconds), and how many batches of buffers have been made."""
+        latencies = sorted(self.latencies)
+
+        if len(latencies) > 0:
+            latency = {"mean": 1000 * sum(latencies) / len(latencies), "p50": 1000 * latencies[len(latencies) // 2],
+                       "p95": 1000 * latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))], "max": 1000 * latencies[-1]}
+        else:
+            latency = {"mean": None, "p50": None, "p95": None, "max": None}
+
+        return {"status": "ok", "uptime": time.monotonic() - self.start_time, "requests": self.request_count,
+                "latency_ms": latency, "batches": self.batch_count, "largest_batch": self.largest_batch}
+
+    async def make(self, order: dict):
+        """Returns the Steps required to make the buffer in an order (see get_order_from_query), once the batch of orders
+        it is part of has been made."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending_orders.append((order, future))
+
+        if len(self.pending_orders) == 1:
+            loop.call_soon(self.make_pending_orders)
+
+        return await future
+
+    def make_pending_orders(self):
+        """Makes every pending order at once, answering each order's future with its Steps (or the error in the order)."""
+        from buf.commands import make
+
+        orders, self.pending_orders = self.pending_orders, []
+        self.batch_count += 1
+        self.largest_batch = max(self.largest_batch, len(orders))
+
+        # Checking each order on its own, so that an invalid order doesn't affect the rest of the batch.
+        valid_orders = []
+        for order, future in orders:
+            try:
+                recipe_object = make.get_recipe_to_make(order["recipe"], order["concentrations"], order["chemical_names"], self.library)
+                buffer_volume_in_litres = make.get_buffer_litres(order["volume"])
+                compiled_recipe = make.compile_recipe(recipe_object, self.library.fetch_chemicals(recipe_object.chemical_names))
+            except BufError as error:
+                if future.done() == False:
+                    future.set_exception(error)
+            else:
+                valid_orders.append((buffer_volume_in_litres, compiled_recipe, future))
+
+        if len(valid_orders) == 0:
+            return
+
+        try:
+            steps_by_order = make_orders([order[0] for order in valid_orders], [order[1] for order in valid_orders])
+
+            for (buffer_volume_in_litres, compiled_recipe, future), steps in zip(valid_orders, steps_by_order):
+                if future.cancelled() == False:
+                    future.set_result(steps)
+        except Exception as error:
+            for buffer_volume_in_litres, compiled_recipe, future in valid_orders:
+                if future.done() == False:
+                    future.set_exception(error)
+
+    async def serve(self, host: str, port: int):
+        """Answers HTTP requests on the given host and port until cancelled."""
+        server = await asyncio.start_server(self.handle_connection, host, port)
+
+        print("Serving on 'http://" + host + ":" + str(port) + "'. Press Ctrl-C to stop.")
+        async with server:
+            await server.serve_forever()
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Answers each HTTP/1.1 request sent over a connection, until the client closes it (or asks for it to be closed)."""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if request_line == b"":
+                    break
+
+                parts = request_line.decode("latin-1").split()
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line.strip() == b"":
+                        break
+                    name, separator, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                if len(parts) != 3:
+                    write_response(writer, 400, {"error": "Invalid request: malformed request line."}, keep_alive=False)
+                    await writer.drain()
+                    break
+
+                method, target, version = parts
+                content_length = int(headers.get("content-length", "0"))
+
+                if content_length > max_body_size:
+                    write_response(writer, 400, get_body_too_large_response(), keep_alive=False)
+                    await writer.drain()
+                    break
+
+                body = await reader.readexactly(content_length)
+                url = urlsplit(target)
+
+                status, response = await self.handle_request(method, unquote(url.path), parse_qs(url.query), body)
+
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                write_response(writer, status, response, keep_alive)
+                await writer.drain()
+
+                if keep_alive == False:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def __call__(self, scope: dict, receive, send):
+        """Answers a request as an ASGI application."""
+        if scope["type"] == "lifespan":
+            while True:
+                message = await receive()
+                if message["type"] == "lifespan.startup":
+                    await send({"type": "lifespan.startup.complete"})
+                elif message["type"] == "lifespan.shutdown":
+                    await send({"type": "lifespan.shutdown.complete"})
+                    return
+
+        if scope["type"] != "http":
+            return
+
+        body = b""
+        more_body = True
+        while more_body and len(body) <= max_body_size:
+            message = await receive()
+            body += message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+        if len(body) > max_body_size:
+            status, response = 400, get_body_too_large_response()
+        else:
+            status, response = await self.handle_request(scope["method"], scope["path"],
+                                                         parse_qs(scope["query_string"].decode("latin-1")), body)
+        content = encode_response(response)
+
+        await send({"type": "http.response.start", "status": status,
+                    "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(content)).encode("latin-1"))]})
+        await send({"type": "http.response.body", "body": content})
+
+def get_body_too_large_response():
+    """Returns the response to a request whose body is larger than max_body_size."""
+    return {"error": "Invalid request: the body is larger than " + str(max_body_size) + " bytes."}
+
+def make_orders(order_litres: list, order_recipes: list):
+    """Given the volume (in litres) and CompiledRecipe of each of a list of orders, returns a list of the Steps required
+    to make each order. The amounts are calculated for all orders at once if NumPy is installed, and one order at a time
+    otherwise."""
+    from buf.commands import make
+
+    try:
+        import numpy
+    except ImportError:
+        return [compiled_recipe.get_steps(buffer_volume_in_litres)
+                for buffer_volume_in_litres, compiled_recipe in zip(order_litres, order_recipes)]
+
+    amounts_by_order = make.calculate_order_amounts(order_litres, order_recipes)
+
+    return [[make.Step(chemical_name, concentration, amount) for chemical_name, concentration, amount
+             in zip(compiled_recipe.chemical_names, compiled_recipe.concentrations, amounts)]
+            for compiled_recipe, amounts in zip(order_recipes, amounts_by_order)]
+
+def get_order_from_query(query: dict):
+    """Given the query parameters of a request to make a buffer, returns the order as a dictionary with the keys 'volume',
+    'recipe', 'concentrations' and 'chemical_names'."""
+    return check_order({"volume": query.get("volume", [None])[-1], "recipe": query.get("recipe", [None])[-1],
+                        "concentrations": query.get("concentrations", []), "chemical_names": query.get("chemical_names", [])})
+
+def get_order_from_body(body: bytes):
+    """Given the JSON body of a request to make a buffer, returns the order (see get_order_from_query)."""
+    try:
+        order = json.loads(body.decode("utf-8"))
+    except ValueError:
+        error_messages.invalid_request("the body is not valid JSON.")
+
+    if isinstance(order, dict) == False:
+        error_messages.invalid_request("the body must be a JSON object.")
+
+    return check_order({"volume": order.get("volume"), "recipe": order.get("recipe"),
+                        "concentrations": order.get("concentrations", []), "chemical_names": order.get("chemical_names", [])})
+
+def check_order(order: dict):
+    """Checks that an order gives a volume, and either a recipe name or matching lists of concentrations and chemical names."""
+    if isinstance(order["volume"], str) == False:
+        error_messages.invalid_request("the volume to make must be given as a string, e.g. '2L'.")
+
+    if order["recipe"] != None:
+        if isinstance(order["recipe"], str) == False:
+            error_messages.invalid_request("the recipe name must be a string.")
+        return order
+
+    concentrations, chemical_names = order["concentrations"], order["chemical_names"]
+
+    if isinstance(concentrations, list) == False or isinstance(chemical_names, list) == False \
+            or any(isinstance(item, str) == False for item in concentrations + chemical_names):
+        error_messages.invalid_request("concentrations and chemical names must be given as lists of strings.")
+
+    if len(concentrations) == 0 or len(concentrations) != len(chemical_names):
+        error_messages.invalid_request("give either a recipe name, or one concentration for each chemical name.")
+
+    return order
+
+def encode_response(response):
+    """Returns a response as JSON, encoded in UTF-8."""
+    return json.dumps(response).encode("utf-8")
+
+status_reasons = {200: "OK", 400: "Bad Request", 404: "Not Found", 500: "Internal Server Error"}
+
+def write_response(writer: asyncio.StreamWriter, status: int, response, keep_alive: bool = True):
+    """Writes an HTTP/1.1 response, with the given status code and JSON response."""
+    content = encode_response(response)
+    head = "HTTP/1.1 " + str(status) + " " + status_reasons.get(status, "") + "\r\n" \
+           + "Content-Type: application/json\r\n" \
+           + "Content-Length: " + str(len(content)) + "\r\n" \
+           + "Connection: " + ("keep-alive" if keep_alive else "close") + "\r\n\r\n"
+    writer.write(head.encode("latin-1") + content)
@@ -4,9 +4,16 @@
 
 """Module for calculating the amount to add of each ingredient when making a buffer/solution."""
 
-from buf.commands import chemical, recipe
-from buf import unit, error_messages
-import tabulate
+from buf.commands import recipe
+from buf import unit, error_messages, libraries, tables
+from buf.session import Library
+import csv
+import os
+import sys
+import json
+import hashlib
+import itertools
+from typing import Sequence
 
 instructions = """buf make:
 
@@ -23,45 +30,123 @@ Alternatively, one can define a solution on the spot, with 'buf make <volume> (<
 <chemical_name>)...'. For example, 'buf make 0.5L 300mM NaCl 10% glycerol'. \
 Note that in this case, the molar mass of NaCl must already be stored in your chemical library (see 'buf help chemical'). 
 
+To make many solutions at once, list them in a CSV file with one order per line, where each line contains the \
+volume to make followed by the name of a recipe in your recipe library, for example:
+
+2L,wash
+500mL,elution
+
+Using 'buf make --orders orders.csv' will then print, in CSV format, the amount of each ingredient required for every \
+order in the file. Making orders in bulk requires NumPy, which can be installed with 'pip install buf[batch]'.
+
+For use by other programs, the amounts can be printed in a machine-readable format with the '--format' option, which \
+is one of 'json', 'csv' or 'ndjson' (one JSON object per line), for example 'buf make 2L wash --format=json' or \
+'buf make --orders orders.csv --format=ndjson'. Each ingredient is printed as a record giving its name, concentration \
+and amount to add (e.g. '35.06g'), along with the amount as a plain number in grams or litres (e.g. 35.064, with \
+the unit 'g'), so that it can be used without parsing the units.
+
+Buf remembers the results of the last 256 buffers you have made, so making the same buffer again (even in another \
+volume unit, such as 'buf make 1000mL wash' after 'buf make 1L wash') doesn't repeat the calculation. Any change to \
+your chemical library means that buffers are calculated afresh.
+
 * Note: if one wishes to copy and paste a table outputted by 'buf make' (for example, into a text file to print), \
 make sure that one uses the font 'New Courier', in order for the table to be formatted properly. 
 """
 
-def make(options: dict):
-    """Parse command line options, calling the appropriate function."""
-    if options["<recipe_name>"]:
-        recipe_object = get_recipe(options["<recipe_name>"])
+def make(options: dict, library: Library = None):
+    """Parse command line options, calling the appropriate function. Chemicals and recipes are looked up in library
+    (see buf.session), so that each is read at most once."""
+    if library == None:
+        library = Library()
+
+    format_name = tables.get_format_option(options["--format"])
+
+    if options["--orders"]:
+        make_orders_from_file(options["<orders_file>"], library=library, format_name=format_name)
+        return
+
+    if format_name != None:
+        records = get_buffer_records(options["<volume>"], options["<recipe_name>"], options["<concentrations>"],
+                                     options["<chemical_names>"], library)
+        tables.print_records(records, step_record_fields, format_name)
+        return
+
+    steps = get_buffer_steps(options["<volume>"], options["<recipe_name>"], options["<concentrations>"], options["<chemical_names>"],
+                             library)
+    print_steps(steps)
+
+def get_buffer_steps(volume: str, recipe_name: str = None, concentrations: list = None, chemical_names: list = None,
+                     library: Library = None):
+    """Returns the Steps required to make the given volume of a buffer/solution, which is either a recipe in the recipe
+    library (given by recipe_name), or defined on the spot from lists of concentrations and chemical names. If the same
+    buffer has been made before, the Steps are taken from the results cache (see fetch_cached_steps)."""
+    if library == None:
+        library = Library()
+
+    if recipe_name:
+        recipe_object = get_recipe(recipe_name, library)
+    else:
+        recipe_object = recipe.Recipe("temp", concentrations, chemical_names)
+
+    buffer_volume_in_litres = get_buffer_litres(volume)
+
+    key = get_results_cache_key(recipe_object, buffer_volume_in_litres, library.chemical_version)
+    steps = fetch_cached_steps(key)
+
+    if steps == None:
+        # Only the recipes made before are known to be valid, so the recipe is checked before the Steps are calculated.
+        recipe_object = get_recipe_to_make(recipe_name, concentrations, chemical_names, library)
+        steps = BufferInstructions(buffer_volume_in_litres, recipe_object, library).steps
+        cache_steps(key, steps)
+
+    return steps
+
+def get_buffer_records(volume: str, recipe_name: str = None, concentrations: list = None, chemical_names: list = None,
+                       library: Library = None):
+    """Returns a record (see CompiledRecipe.get_records) for each ingredient required to make the given volume of a
+    buffer/solution (see get_buffer_steps). The records hold unrounded amounts, so they aren't kept in the results cache."""
+    if library == None:
+        library = Library()
+
+    recipe_object = get_recipe_to_make(recipe_name, concentrations, chemical_names, library)
+    buffer_volume_in_litres = get_buffer_litres(volume)
+
+    compiled_recipe = compile_recipe(recipe_object, library.fetch_chemicals(recipe_object.chemical_names))
+    return compiled_recipe.get_records(buffer_volume_in_litres)
+
+def get_recipe_to_make(recipe_name: str = None, concentrations: list = None, chemical_names: list = None, library: Library = None):
+    """Returns the Recipe to make, either looked up by name in the recipe library, or (if no name is given) defined on
+    the spot from lists of concentrations and chemical names."""
+    if library == None:
+        library = Library()
+
+    if recipe_name:
+        recipe_object = get_recipe(recipe_name, library)
 
         # Checking to make sure all the chemicals in the recipe contents (that have concentrations in molar) exist in the user's
         # chemical library. While this was true when the recipe was created, it might not be now as the user might have deleted chemicals
         # since defining the recipe.
-        recipe.assert_recipe_validity(recipe_object, recipe_library={}, check_existing_chemicals=True)
-    else:
-        recipe_object = recipe.make_safe_recipe("temp", options["<concentrations>"], options["<chemical_names>"], recipe_library= {},
-                                                check_existing_chemicals=True)
-
-    buffer_volume_in_litres = get_buffer_litres(options["<volume>"])
-
-    buffer = BufferInstructions(buffer_volume_in_litres, recipe_object)
-    buffer.print()
+        recipe.assert_recipe_validity(recipe_object, chemical_library=library.fetch_chemicals(recipe_object.chemical_names),
+                                      recipe_library={}, check_existing_chemicals=True)
+        return recipe_object
 
+    return recipe.make_safe_recipe("temp", concentrations, chemical_names, chemical_library=library.fetch_chemicals(chemical_names),
+                                   recipe_library= {}, check_existing_chemicals=True)
 
 def get_buffer_litres(volume_as_string: str):
     """Given a string containing a volume of buffer/solution to make, returns the volume in litres as a float."""
-    magnitude, symbol = unit.split_unit_quantity(volume_as_string)
+    quantity = unit.parse_quantity(volume_as_string)
 
-    try:
-        magnitude = float(magnitude)
-    except:
-        error_messages.non_number_buffer_volume_magnitude(magnitude)
+    if quantity.magnitude == None:
+        error_messages.non_number_buffer_volume_magnitude(unit.split_unit_quantity(volume_as_string)[0])
 
-    if magnitude <= 0:
-        error_messages.non_positive_buffer_volume_magnitude(magnitude)
+    if quantity.magnitude <= 0:
+        error_messages.non_positive_buffer_volume_magnitude(quantity.magnitude)
 
-    if symbol not in unit.volume_units:
-        error_messages.invalid_buffer_volume_unit(symbol)
+    if quantity.dimension != "volume":
+        error_messages.invalid_buffer_volume_unit(quantity.unit)
 
-    return magnitude * unit.volume_unit_to_litres(symbol)
+    return quantity.canonical_value
 
 
 def calculate_amount_to_add(buffer_volume_in_litres: float, concentration: str, chemical_name: str, chemical_library: dict):
@@ -72,27 +157,42 @@ def calculate_amount_to_add(buffer_volume_in_litres: float, concentration: str,
         - Molar: the amount to add is equal to the buffer volume (in litres) * molar mass of the chemical * the chemical's concentration (in molar).
         - Percentage points: the amount to add is the specified percentage of the buffer volume.
     """
-    magnitude, symbol = unit.split_unit_quantity(concentration)
-
-    if symbol in unit.concentration_units:
-        chemical_object = chemical_library[chemical_name]
-
-    magnitude = float(magnitude)
-
-    if symbol in unit.volume_units or symbol in unit.mass_units:
-        pass # If a constant volume or mass is specified, the amount does not change depending on the buffer volume.
-    elif symbol in unit.concentration_units:
-        magnitude = magnitude * unit.concentration_unit_to_molar(symbol) * chemical_object.molar_mass * buffer_volume_in_litres
-        symbol = "g"
-    elif symbol == "%":
-        magnitude = magnitude / 100 * buffer_volume_in_litres
-        symbol = "L"
-
-    return unit.scale_and_round_physical_quantity(magnitude, symbol)
-
-def get_recipe(recipe_name: str):
+    coefficient, constant, symbol = get_amount_coefficients(concentration, chemical_name, chemical_library)
+    scale_factor = get_unit_scale_factor(symbol)
+
+    return unit.scale_and_round_physical_quantity((coefficient * buffer_volume_in_litres + constant) / scale_factor, symbol)
+
+def get_amount_coefficients(concentration: str, chemical_name: str, chemical_library: dict):
+    """The amount of an ingredient to add is linear in the buffer volume. Returns a tuple (coefficient, constant, symbol),
+    such that the amount to add is coefficient * buffer volume in litres + constant, in grams or litres. The symbol is
+    the unit the amount should be displayed in: the unit of the concentration if it is a constant mass or volume, and
+    otherwise grams or litres."""
+    quantity = unit.parse_quantity(concentration)
+
+    if quantity.dimension == "volume" or quantity.dimension == "mass":
+        # If a constant volume or mass is specified, the amount does not change depending on the buffer volume.
+        return 0, quantity.canonical_value, quantity.unit
+    elif quantity.dimension == "amount":
+        return 0, quantity.canonical_value * chemical_library[chemical_name].molar_mass, "g"
+    elif quantity.dimension == "concentration":
+        return quantity.canonical_value * chemical_library[chemical_name].molar_mass, 0, "g"
+    elif quantity.dimension == "mass concentration":
+        return quantity.canonical_value, 0, "g"
+    elif quantity.dimension == "percent":
+        return quantity.canonical_value, 0, "L"
+
+def get_unit_scale_factor(symbol: str):
+    """Returns the factor one must multiply by to convert an amount with the given unit of mass or volume into grams or litres."""
+    if symbol in unit.volume_units:
+        return unit.units.get_conversion_factor(symbol, "L")
+    return unit.units.get_conversion_factor(symbol, "g")
+
+def get_recipe(recipe_name: str, library: Library = None):
     """Return the Recipe object corresponding to the given name."""
-    recipe_library = recipe.load_recipes()
+    if library == None:
+        library = Library()
+
+    recipe_library = library.fetch_recipes([recipe_name])
 
     if recipe_name not in recipe_library:
         error_messages.recipe_not_found(recipe_name)
@@ -101,28 +201,422 @@ def get_recipe(recipe_name: str):
 
 
 class Step:
-    """Record describing the name of an ingredient in a solution/buffer recipe, its concentration, and the amount of it to add."""
+    """Immutable record describing the name of an ingredient in a solution/buffer recipe, its concentration, and the amount of it to add."""
+    __slots__ = ("name", "concentration", "amount_to_add")
+
     def __init__(self, name: str, concentration: str, amount_to_add: str):
-        self.name = name
-        self.concentration = concentration
-        self.amount_to_add = amount_to_add
+        object.__setattr__(self, "name", name)
+        object.__setattr__(self, "concentration", concentration)
+        object.__setattr__(self, "amount_to_add", amount_to_add)
+
+    def __setattr__(self, attribute, value):
+        raise AttributeError("Step objects are immutable.")
+
+    def __reduce__(self):
+        return (Step, (self.name, self.concentration, self.amount_to_add))
+
     def __eq__(self, other):
         return self.name == other.name and self.concentration == other.concentration and self.amount_to_add == other.amount_to_add
 
+    def __hash__(self):
+        return hash((self.name, self.concentration, self.amount_to_add))
+
 class BufferInstructions:
     """Stores all the Steps required to make a buffer/solution recipe."""
-    def __init__(self, buffer_volume_in_litres: float, recipe_object: recipe.Recipe):
+    def __init__(self, buffer_volume_in_litres: float, recipe_object: recipe.Recipe, library: Library = None):
+        if library == None:
+            library = Library()
 
-        self.steps = []
+        chemical_library = library.fetch_chemicals(recipe_object.chemical_names)
 
-        chemical_library = chemical.load_chemicals()
-
-        for concentration, chemical_name in zip(recipe_object.concentrations, recipe_object.chemical_names):
-            self.steps.append(Step(chemical_name, concentration,
-                                   calculate_amount_to_add(buffer_volume_in_litres, concentration, chemical_name, chemical_library)))
+        self.steps = compile_recipe(recipe_object, chemical_library).get_steps(buffer_volume_in_litres)
 
     def print(self):
         """Prints all the Steps required to make the buffer."""
-        matrix = [[step.name, step.concentration, step.amount_to_add] for step in self.steps]
+        print_steps(self.steps)
+
+def print_steps(steps: list):
+    """Prints a table of the Steps required to make a buffer."""
+    matrix = [[step.name, step.concentration, step.amount_to_add] for step in steps]
+
+    # Imported here, as tabulate is slow to import and only needed to display tables.
+    import tabulate
+    print(tabulate.tabulate(matrix, headers=["Chemical Name", "Concentration", "Amount to Add"], tablefmt="fancy_grid"))
+
+# --------------------------------------------------------------------------------
+# --------------------------------COMPILED RECIPES--------------------------------
+# --------------------------------------------------------------------------------
+
+class CompiledRecipe:
+    """Stores a recipe in a form that is quick to make in any volume. Since the amount of each ingredient to add is linear
+    in the buffer volume (see get_amount_coefficients), a recipe reduces to a vector of coefficients and a vector of
+    constants, both in grams or litres, such that the amounts to add are coefficients * buffer volume in litres + constants.
+
+    The symbols and scale_factors lists give the unit each amount should be displayed in, and the factor to divide an
+    amount in grams or litres by to convert it into that unit."""
+    def __init__(self, recipe_object: recipe.Recipe, chemical_library: dict):
+
+        self.name = recipe_object.name
+        self.concentrations = recipe_object.concentrations
+        self.chemical_names = recipe_object.chemical_names
+
+        self.coefficients = []
+        self.constants = []
+        self.symbols = []
+        self.scale_factors = []
+
+        for concentration, chemical_name in zip(self.concentrations, self.chemical_names):
+            coefficient, constant, symbol = get_amount_coefficients(concentration, chemical_name, chemical_library)
+            self.coefficients.append(coefficient)
+            self.constants.append(constant)
+            self.symbols.append(symbol)
+            self.scale_factors.append(get_unit_scale_factor(symbol))
+
+    def get_amounts(self, buffer_volume_in_litres: float):
+        """Returns the amount of each ingredient to add, in grams or litres, when making the given volume of the recipe."""
+        return [coefficient * buffer_volume_in_litres + constant for coefficient, constant in zip(self.coefficients, self.constants)]
+
+    def format_amount(self, index: int, amount: float):
+        """Given the amount (in grams or litres) of the ingredient at the given index, returns it as a scaled and rounded string."""
+        return unit.scale_and_round_physical_quantity(amount / self.scale_factors[index], self.symbols[index])
+
+    def get_steps(self, buffer_volume_in_litres: float):
+        """Returns the Steps required to make the given volume of the recipe."""
+        return [Step(chemical_name, concentration, self.format_amount(index, amount)) for index, (chemical_name, concentration, amount)
+                in enumerate(zip(self.chemical_names, self.concentrations, self.get_amounts(buffer_volume_in_litres)))]
+
+    def get_records(self, buffer_volume_in_litres: float, formatted_amounts: Sequence[str] = None, amounts: Sequence[float] = None):
+        """Returns a record (see buf.tables.print_records) for each ingredient to add when making the given volume of the
+        recipe, with the fields in step_record_fields. The amount to add is given both as a scaled and rounded string, and
+        as a number in grams or litres (named by the record's unit). Amounts that have already been calculated (see
+        calculate_order_amounts) can be given instead of being calculated again."""
+        if amounts == None:
+            amounts = self.get_amounts(buffer_volume_in_litres)
+        if formatted_amounts == None:
+            formatted_amounts = [self.format_amount(index, amount) for index, amount in enumerate(amounts)]
+
+        return [{"chemical_name": chemical_name, "concentration": concentration, "amount_to_add": formatted_amount,
+                 "amount": get_canonical_amount(amount), "unit": "L" if symbol in unit.volume_units else "g"}
+                for chemical_name, concentration, formatted_amount, amount, symbol
+                in zip(self.chemical_names, self.concentrations, formatted_amounts, amounts, self.symbols)]
+
+step_record_fields = ["chemical_name", "concentration", "amount_to_add", "amount", "unit"]
+
+def get_canonical_amount(amount: float):
+    """Returns an amount in grams or litres rounded to 12 significant figures, dropping the floating point error of the
+    calculation (e.g. 35.064000000000004 becomes 35.064) while keeping far more precision than any balance."""
+    return float("%.12g" % amount)
+
+# Compiled recipes, keyed by the recipe's contents and the molar masses of its chemicals (so that a recipe is recompiled
+# if its contents change, or if the chemical library changes underneath it).
+compiled_recipes = {}
+max_compiled_recipes = 1024
+
+def compile_recipe(recipe_object: recipe.Recipe, chemical_library: dict):
+    """Returns a CompiledRecipe for the given recipe, reusing the one compiled previously if neither the recipe nor the
+    molar masses of its chemicals have changed since."""
+    molar_masses = tuple(chemical_library[chemical_name].molar_mass if chemical_name in chemical_library else None
+                         for chemical_name in recipe_object.chemical_names)
+    key = (recipe_object.name, tuple(recipe_object.concentrations), tuple(recipe_object.chemical_names), molar_masses)
+
+    if key not in compiled_recipes:
+        if len(compiled_recipes) >= max_compiled_recipes:
+            compiled_recipes.clear()
+        compiled_recipes[key] = CompiledRecipe(recipe_object, chemical_library)
+
+    return compiled_recipes[key]
+
+# --------------------------------------------------------------------------------
+# ---------------------------------CACHED RESULTS---------------------------------
+# --------------------------------------------------------------------------------
+
+# The same buffers tend to be made over and over, so the Steps of the buffers made most recently are kept in a results
+# cache file in the library directory, which holds a JSON object mapping keys (see get_results_cache_key) to lists of
+# Steps (each as a [name, concentration, amount_to_add] list), from the least to the most recently used. Since the version of the chemical library is part of each key,
+# changing any chemical means that buffers are made afresh (and the old entries are eventually evicted). The cache is
+# read and rewritten as a whole, without a lock; if two buf processes update it at once, an entry may be lost, but the
+# cache is always left complete, since it is replaced atomically.
+#
+# The cache is only rewritten when a buffer is added to it, since rewriting the whole cache just to record that a buffer
+# was used again would cost more than taking the buffer from the cache saves. Instead, the buffers taken from the cache
+# are remembered in used_results (from the least to the most recently used), and moved to the most recently used end of
+# the cache the next time this process adds a buffer to it. A buffer made again by a separate 'buf make' therefore keeps
+# its place in the cache, while one made again in a long-running process (such as 'buf shell' or the daemon) is kept
+# for as long as it is used.
+
+results_cache_file = os.path.join(libraries.library_dir, "results.cache")
+max_cached_results = 256
+used_results = {}
+
+def get_results_cache_key(recipe_object: recipe.Recipe, buffer_volume_in_litres: float, chemical_version):
+    """Returns the key of a buffer in the results cache: a hash of the recipe's contents, the volume to make, and the
+    version of the chemical library (see buf.session). The version (the size and modification time of each file the
+    chemical library is read from) serves as the library's generation number: unlike a counter kept by buf, it also
+    changes when a library file is edited by hand or by another program.
+    The key is a JSON string, so that it can be used as a key in the cache file."""
+    contents = "\n".join(recipe_object.concentrations) + "\0" + "\n".join(recipe_object.chemical_names)
+    contents_hash = hashlib.blake2b(contents.encode("utf-8"), digest_size=16).hexdigest()
+    return json.dumps([contents_hash, buffer_volume_in_litres, chemical_version])
+
+def load_results_cache():
+    """Returns the dictionary stored in the results cache file (mapping keys to lists of Steps), or an empty dictionary
+    if it is missing or unreadable. The file only holds plain JSON, so reading it never runs any code."""
+    try:
+        with open(results_cache_file, "r") as file:
+            results_cache = json.load(file)
+
+        return {str(key): [Step(str(name), str(concentration), str(amount_to_add)) for name, concentration, amount_to_add in steps]
+                for key, steps in results_cache.items()}
+    except Exception:
+        # A missing, unreadable or corrupt cache is simply started again.
+        return {}
+
+def save_results_cache(results_cache: dict):
+    """Writes the results cache to its file."""
+    contents = {key: [[step.name, step.concentration, step.amount_to_add] for step in steps] for key, steps in results_cache.items()}
+
+    try:
+        libraries.ensure_library_dir_exists()
+        libraries.write_file_atomically(results_cache_file, json.dumps(contents).encode("utf-8"))
+    except OSError:
+        # Caching is an optimisation, so being unable to write the cache (e.g. in a read-only library) is not an error.
+        pass
+
+def fetch_cached_steps(key):
+    """Returns the Steps cached under the given key, or None if there are none. The key is remembered in used_results,
+    rather than the cache being rewritten."""
+    results_cache = load_results_cache()
+
+    if key not in results_cache:
+        return None
+
+    used_results.pop(key, None)
+    used_results[key] = None
+    if len(used_results) > max_cached_results:
+        del used_results[next(iter(used_results))]
+
+    return results_cache[key]
+
+def cache_steps(key, steps: list):
+    """Adds the Steps of a buffer to the results cache, after moving the buffers in used_results to the most recently used
+    end of the cache, and evicting the least recently used buffers beyond max_cached_results."""
+    results_cache = load_results_cache()
+
+    for used_key in used_results:
+        if used_key in results_cache:
+            results_cache[used_key] = results_cache.pop(used_key)
+    used_results.clear()
 
-        print(tabulate.tabulate(matrix, headers=["Chemical Name", "Concentration", "Amount to Add"], tablefmt="fancy_grid"))
+    results_cache.pop(key, None)
+    results_cache[key] = steps
+
+    for old_key in list(results_cache)[:max(0, len(results_cache) - max_cached_results)]:
+        del results_cache[old_key]
+
+    save_results_cache(results_cache)
+
+# --------------------------------------------------------------------------------
+# ----------------------------------MAKING ORDERS---------------------------------
+# --------------------------------------------------------------------------------
+
+# Orders are read, calculated and written this many at a time, so that the results for a large orders file start
+# appearing straight away, and only one chunk of orders (and its results) is held in memory at once.
+orders_chunk_size = 10000
+
+def read_orders(file_name: str):
+    """Reads an orders file, yielding a (volume, recipe_name) tuple for each order. Blank lines, and a 'volume,recipe'
+    header line, are skipped."""
+    if os.path.isfile(file_name) == False:
+        error_messages.file_not_found(file_name)
+
+    try:
+        with open(file_name, "r", newline="") as file:
+            for line_number, row in enumerate(csv.reader(file)):
+                row = [entry.strip() for entry in row]
+                if len(row) == 0 or row == [""]:
+                    continue
+                if line_number == 0 and [entry.lower() for entry in row] == ["volume", "recipe"]:
+                    continue
+                if len(row) != 2:
+                    error_messages.invalid_order_line(line_number, ",".join(row))
+                yield row[0], row[1]
+    except (OSError, UnicodeDecodeError, csv.Error):
+        error_messages.file_read_error(file_name)
+
+def make_orders_from_file(file_name: str, output=None, library: Library = None, format_name: str = None):
+    """Calculates the amount of each ingredient required for every order in an orders file, writing the results to output
+    (standard output by default) in CSV format. If format_name is given, the results are instead printed as records in
+    that format (see get_order_records), which also give each amount as a number in grams or litres.
+
+    Orders are handled orders_chunk_size at a time: each chunk is read, its amounts are calculated at once with a single
+    multiply-add over arrays spanning its orders and their ingredients (see calculate_order_amounts), and its results are
+    written before the next chunk is read. Each recipe is only read from the libraries and compiled (see CompiledRecipe)
+    the first time it is ordered. Since results are written as they are calculated, an invalid order stops the output
+    partway through the file."""
+    try:
+        import numpy
+    except ImportError:
+        error_messages.numpy_not_installed("buf make --orders")
+
+    if output == None:
+        output = sys.stdout
+
+    if library == None:
+        library = Library()
+
+    orders = read_orders(file_name)
+    compiled_recipes = {}
+    number_of_orders = 0
+
+    try:
+        if format_name == None:
+            writer = csv.writer(output)
+            writer.writerow(["Order", "Volume", "Recipe", "Chemical Name", "Concentration", "Amount to Add"])
+        elif format_name == "csv":
+            writer = csv.writer(output, lineterminator="\n")
+            writer.writerow(order_record_fields)
+        elif format_name == "json":
+            output.write("[")
+
+        for chunk in iter(lambda: list(itertools.islice(orders, orders_chunk_size)), []):
+            compile_ordered_recipes([recipe_name for volume, recipe_name in chunk], compiled_recipes, library)
+
+            litres_by_volume = {volume: get_buffer_litres(volume) for volume, recipe_name in chunk}
+            order_litres = [litres_by_volume[volume] for volume, recipe_name in chunk]
+            order_recipes = [compiled_recipes[recipe_name] for volume, recipe_name in chunk]
+
+            if format_name == None:
+                amounts_by_order = calculate_order_amounts(order_litres, order_recipes)
+                writer.writerows([order_number, volume, compiled_recipe.name, chemical_name, concentration, amount]
+                                 for order_number, (volume, recipe_name), compiled_recipe, amounts
+                                 in zip(itertools.count(number_of_orders + 1), chunk, order_recipes, amounts_by_order)
+                                 for chemical_name, concentration, amount
+                                 in zip(compiled_recipe.chemical_names, compiled_recipe.concentrations, amounts))
+            else:
+                formatted_amounts_by_order, amounts_by_order = calculate_order_amounts(order_litres, order_recipes, return_amounts=True)
+                records = get_order_records(number_of_orders + 1, chunk, order_recipes, formatted_amounts_by_order, amounts_by_order)
+
+                # Each record is encoded with a single json.dumps call, and the chunk is written at once (in the same layout
+                # as tables.print_records).
+                if format_name == "csv":
+                    writer.writerows(record.values() for record in records)
+                elif format_name == "ndjson":
+                    output.write("".join(json.dumps(record) + "\n" for record in records))
+                else:
+                    output.write(("\n" if number_of_orders == 0 else ",\n") + ",\n".join(json.dumps(record) for record in records))
+
+            number_of_orders += len(chunk)
+            output.flush()
+
+        if format_name == "json":
+            output.write("\n]\n")
+        output.flush()
+    except BrokenPipeError:
+        tables.discard_output()
+
+def compile_ordered_recipes(recipe_names: Sequence[str], compiled_recipes: dict, library: Library):
+    """Adds a CompiledRecipe to compiled_recipes (a dictionary mapping recipe names to CompiledRecipes) for each of the
+    given recipe names that isn't in it yet, reading the recipes and their chemicals from the library."""
+    new_recipe_names = [recipe_name for recipe_name in dict.fromkeys(recipe_names) if recipe_name not in compiled_recipes]
+    if len(new_recipe_names) == 0:
+        return
+
+    recipe_library = library.fetch_recipes(new_recipe_names)
+
+    for recipe_name in new_recipe_names:
+        if recipe_name not in recipe_library:
+            error_messages.recipe_not_found(recipe_name)
+
+    chemical_names = set()
+    for recipe_object in recipe_library.values():
+        chemical_names.update(recipe_object.chemical_names)
+    chemical_library = library.fetch_chemicals(list(chemical_names))
+
+    for recipe_name in new_recipe_names:
+        recipe_object = recipe_library[recipe_name]
+        recipe.assert_recipe_validity(recipe_object, chemical_library=chemical_library, recipe_library={})
+        compiled_recipes[recipe_name] = compile_recipe(recipe_object, chemical_library)
+
+order_record_fields = ["order", "volume", "recipe"] + step_record_fields
+
+def get_order_records(first_order_number: int, orders: list, order_recipes: list, formatted_amounts_by_order: list,
+                      amounts_by_order: list):
+    """Returns a record for each ingredient of each order, with the fields in order_record_fields: the order's number
+    (counting from first_order_number), volume and recipe name, followed by the fields of CompiledRecipe.get_records.
+    Each record is built once, as a single dictionary."""
+    units_by_recipe = {}
+    records = []
+
+    for order_number, (volume, recipe_name), compiled_recipe, formatted_amounts, amounts \
+            in zip(itertools.count(first_order_number), orders, order_recipes, formatted_amounts_by_order, amounts_by_order):
+        if id(compiled_recipe) not in units_by_recipe:
+            units_by_recipe[id(compiled_recipe)] = ["L" if symbol in unit.volume_units else "g" for symbol in compiled_recipe.symbols]
+
+        for chemical_name, concentration, formatted_amount, amount, unit_name \
+                in zip(compiled_recipe.chemical_names, compiled_recipe.concentrations, formatted_amounts, amounts,
+                       units_by_recipe[id(compiled_recipe)]):
+            records.append({"order": order_number, "volume": volume, "recipe": compiled_recipe.name, "chemical_name": chemical_name,
+                            "concentration": concentration, "amount_to_add": formatted_amount,
+                            "amount": get_canonical_amount(amount), "unit": unit_name})
+
+    return records
+
+def calculate_order_amounts(order_litres: Sequence[float], order_recipes: Sequence[CompiledRecipe], return_amounts: bool = False):
+    """Given the volume (in litres) and CompiledRecipe of each of a list of orders, returns a list containing, for each
+    order, the amount of each of its ingredients to add, as scaled and rounded strings. The amounts for all orders are
+    calculated at once, with a single multiply-add over arrays spanning all orders and their ingredients. Requires NumPy.
+
+    If return_amounts is True, a tuple is returned instead, holding that list and a list of the same shape containing
+    the amounts in grams or litres, as floats."""
+    import numpy
+
+    # Flattening the ingredients of every distinct recipe into one table, recording where each recipe's ingredients start.
+    # Recipes are compiled once (see compile_recipe), so orders for the same recipe share the same CompiledRecipe.
+    recipe_numbers = {}
+    compiled = []
+    ingredient_starts = []
+    ingredient_counts = []
+
+    for compiled_recipe in order_recipes:
+        if id(compiled_recipe) not in recipe_numbers:
+            recipe_numbers[id(compiled_recipe)] = len(compiled)
+            ingredient_starts.append(sum(ingredient_counts))
+            ingredient_counts.append(len(compiled_recipe.coefficients))
+            compiled.append(compiled_recipe)
+
+    order_litres = numpy.array(order_litres, dtype=float)
+    order_recipe_numbers = numpy.array([recipe_numbers[id(compiled_recipe)] for compiled_recipe in order_recipes], dtype=numpy.intp)
+
+    coefficients = numpy.array([coefficient for compiled_recipe in compiled for coefficient in compiled_recipe.coefficients], dtype=float)
+    constants = numpy.array([constant for compiled_recipe in compiled for constant in compiled_recipe.constants], dtype=float)
+    ingredients = [(compiled_recipe, index) for compiled_recipe in compiled for index in range(len(compiled_recipe.coefficients))]
+
+    # One row per (order, ingredient) pair: which order it belongs to, and which entry in the ingredient table it uses.
+    counts = numpy.array(ingredient_counts, dtype=numpy.intp)[order_recipe_numbers]
+    row_orders = numpy.repeat(numpy.arange(len(order_recipes)), counts)
+    row_starts = numpy.repeat(numpy.cumsum(counts) - counts, counts)
+    row_ingredients = numpy.repeat(numpy.array(ingredient_starts, dtype=numpy.intp)[order_recipe_numbers], counts) \
+                      + numpy.arange(len(row_orders)) - row_starts
+
+    amounts = order_litres[row_orders] * coefficients[row_ingredients] + constants[row_ingredients]
+
+    # Formatting the amounts, converted into the unit each should be displayed in, one display unit at a time.
+    symbols = [compiled_recipe.symbols[index] for compiled_recipe, index in ingredients]
+    scale_factors = numpy.array([compiled_recipe.scale_factors[index] for compiled_recipe, index in ingredients], dtype=float)
+    row_symbols = numpy.array(symbols, dtype=object)[row_ingredients]
+    formatted_amounts = numpy.empty(len(row_orders), dtype=object)
+
+    for symbol in set(symbols):
+        rows = row_symbols == symbol
+        formatted_amounts[rows] = unit.scale_and_round_physical_quantities(amounts[rows] / scale_factors[row_ingredients[rows]], symbol)
+
+    # Splitting the rows back up by order.
+    formatted_amounts = formatted_amounts.tolist()
+    order_ends = numpy.cumsum(counts).tolist()
+    formatted_amounts_by_order = [formatted_amounts[order_end - count:order_end] for order_end, count in zip(order_ends, counts.tolist())]
+
+    if return_amounts:
+        amounts = amounts.tolist()
+        return formatted_amounts_by_order, [amounts[order_end - count:order_end] for order_end, count in zip(order_ends, counts.tolist())]
+
+    return formatted_amounts_by_order
@@ -0,0 +1,44 @@
+# File name: migrate.py
+# Author: Jordan Juravsky
+# Date created: 18-10-2026
+
+"""Module for moving one's chemical and recipe libraries from their library files into an indexed database."""
+
+from buf import database, error_messages
+from buf.commands import chemical, recipe
+from buf.session import Library
+
+instructions = """buf migrate:
+
+This subcommand moves your chemical and recipe libraries into a database. By default, buf stores your libraries \
+as text files, which have to be read in full every time buf is used. This is fine for small libraries, but once your \
+libraries contain thousands of chemicals or recipes, commands such as 'buf chemical NaCl' or 'buf make 2L wash' slow down. \
+After using 'buf migrate', buf only reads the chemicals and recipes each command actually needs.
+
+Migration is one-shot: every chemical and recipe in your library files is copied into the database, after which \
+all buf subcommands read from and write to the database instead. Your old library files are left untouched as a backup.
+"""
+
+def migrate(options: dict, library: Library = None):
+    """Parses command line options, migrating the library files into the database."""
+    migrate_libraries()
+
+    if library != None:
+        library.clear()
+
+def migrate_libraries():
+    """Copies the contents of the chemical and recipe library files into a newly created database."""
+    if database.is_active():
+        error_messages.database_already_exists(database.database_file)
+
+    chemical_library = chemical.load_chemicals()
+    recipe_library = recipe.load_recipes()
+
+    # Each of a chemical's names maps to the same Chemical object, so chemicals are told apart by identity.
+    unique_chemical_objects = list({id(chemical_object): chemical_object for chemical_object in chemical_library.values()}.values())
+
+    database.create_database([(chemical_object.molar_mass, chemical_object.names) for chemical_object in unique_chemical_objects],
+                             [(recipe_object.name, recipe_object.get_contents_string()) for recipe_object in recipe_library.values()])
+
+    print("Migrated " + str(len(unique_chemical_objects)) + " chemicals and " + str(len(recipe_library)) +
+          " recipes to the database at '" + str(database.database_file) + "'.")
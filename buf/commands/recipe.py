@@ -4,11 +4,12 @@
 
 """Module for manipulating one's library of buffer/solution recipes."""
 
-from buf import unit, user_input, error_messages, libraries
+from buf import unit, user_input, error_messages, libraries, database, completion, tables
 from buf.commands import chemical
+from buf.session import Library
 from typing import Sequence
 import os
-import tabulate
+import sys
 
 instructions = """buf recipe:
 
@@ -20,10 +21,14 @@ to skip the listing of a solution's contents when making it (see 'buf make').
 Chemical concentrations can be specified in a number of ways. One common method, shown in the example above, is \
 with molarity. Note that before one can specify a chemical's concentration in molar, that chemical's molar mass must \
 first be added to your chemical library (see 'buf help chemical' for more information). Alternatively, one can specify \
-a concentration of a chemical to be a percentage of the total volume of solution, shown above with '10% glycerol'. Lastly, \
-if you want a constant mass or volume of a chemical to be added to the solution, no matter its volume, you can specify that \
-constant amount in the recipe (e.g. '10g KCl'). When using these non-molar concentration, the chemical being listed does not \
-need to exist in your library.
+a concentration of a chemical to be a percentage of the total volume of solution, shown above with '10% glycerol' \
+(this can also be written '10%v/v'). Concentrations can also be given in mass per volume, such as '5mg/mL', '2g/L', \
+'1%w/v' (grams per 100mL) or '50ppm' (milligrams per litre). Lastly, if you want a constant mass, volume, or number of moles \
+of a chemical to be added to the solution, no matter its volume, you can specify that constant amount in the recipe \
+(e.g. '10g KCl', or '5mmol KCl'). Apart from molar and moles, the chemical being listed does not need to exist in your library.
+
+Units can be given with the SI prefixes k, m, µ (or u), n and p where they make sense, for example 'nL', 'µmol' and 'mM'. \
+Currently, valid units are: """ + " ".join(unit.valid_units) + """
 
 To add a recipe to your library, use 'buf recipe -a <recipe_name> (<concentration> <chemical_name>)...'. \
 For example, to add the recipe specified above, use 'buf recipe -a my_recipe 300mM NaCl 10% glycerol'.
@@ -36,43 +41,81 @@ contained the following:
 buffer_a 300mM NaCl 1M KCl
 buffer_b 500mM Arginine 10% glycerol
 
-Using 'buf recipe -a recipes.txt' would add these two recipes to your library.
+Using 'buf recipe -a recipes.txt' would add these two recipes to your library. Several files can be added at once \
+(e.g. 'buf recipe -a recipes.txt more_recipes.txt', or 'buf recipe -a lists/*.txt'), in which case they are checked \
+in parallel. If any line of any file is invalid, or the same recipe name is used twice, none of the recipes are added.
+
+By default, buf stops at the first invalid line it finds. To check every line of the files and list every error at once, \
+use the '--report-all' option (e.g. 'buf recipe -a recipes.txt --report-all'). Each error is printed on its own line \
+as a JSON object giving the file, line and column of the error, along with the reason for it. As before, nothing is added \
+to your library unless every line is valid.
 
 To delete a recipe, use 'buf recipe -d <recipe_name>'. To skip the program asking you to confirm your decision, use \
 the '--confirm' option.
 
 To view the contents of a recipe, use 'buf recipe <recipe_name>'. To view all the recipes in your library, use 'buf recipe'.
+
+As with 'buf chemical', large libraries can be viewed a page at a time with the '--limit' and '--offset' options \
+(e.g. 'buf recipe --limit=20 --offset=40'), and shown as plain columns rather than a grid with the '--plain' option. For use by other programs, 'buf recipe' and \
+'buf recipe <recipe_name>' can print recipes in a machine-readable format with the '--format' option, which is one of \
+'json', 'csv' or 'ndjson' (one JSON object per line), e.g. 'buf recipe --format=csv'.
 """
 
-recipe_library_file = libraries.fetch_library_file_path("recipes.txt")
+recipe_library_file = os.path.join(libraries.library_dir, "recipes.txt")
+
+def recipe(options: dict, library: Library = None):
+    """Parses command line options, calling the appropriate functions. Recipes are looked up in library (see
+    buf.session), which is updated if the command changes the recipe library."""
+    if library == None:
+        library = Library()
 
-def recipe(options: dict):
-    """Parses command line options, calling the appropriate functions."""
     if options["-a"]:
-        if options["<file_name>"]:
-            add_recipes_from_file(options["<file_name>"])
+        if options["<file_names>"]:
+            add_recipes_from_files(options["<file_names>"], report_all=options["--report-all"])
+            library.clear()
+            completion.rebuild_index(library)
+        elif unit.parse_quantity(options["<concentrations>"][0]).dimension == None and libraries.is_file_name(options["<recipe_name>"]):
+            # Several file names can match the usage for adding a single recipe, but a recipe's contents start with a concentration.
+            add_recipes_from_files([options["<recipe_name>"]] + [word for pair in zip(options["<concentrations>"], options["<chemical_names>"])
+                                                                 for word in pair])
+            library.clear()
+            completion.rebuild_index(library)
         else:
-            add_single_recipe(options["<recipe_name>"], options["<concentrations>"], options["<chemical_names>"])
+            with library.changing_recipes([options["<recipe_name>"]]):
+                add_single_recipe(options["<recipe_name>"], options["<concentrations>"], options["<chemical_names>"])
     elif options["-d"]:
-        delete_recipe(options["<recipe_name>"], prompt_for_confirmation= not options["--confirm"])
+        with library.changing_recipes([options["<recipe_name>"]]):
+            delete_recipe(options["<recipe_name>"], prompt_for_confirmation= not options["--confirm"])
     elif options["<recipe_name>"]:
-        display_recipe_information(options["<recipe_name>"])
+        format_name = tables.get_format_option(options["--format"])
+        display_recipe_information(options["<recipe_name>"], library, format_name=format_name)
     else:
-        display_recipe_library()
+        limit = tables.get_page_option("--limit", options["--limit"])
+        offset = tables.get_page_option("--offset", options["--offset"])
+        format_name = tables.get_format_option(options["--format"])
+        display_recipe_library(library, limit=limit, offset=offset, plain=options["--plain"], format_name=format_name)
 
 # --------------------------------------------------------------------------------
 # ----------------------------RECIPE DEFINITION AND CREATION----------------------
 # --------------------------------------------------------------------------------
 
 class Recipe:
-    """Record storing a recipe's name as well as its contents, given by two lists or chemical names and concentrationss.
-    For example, to make a recipe with the contents '2M NaCl 10% glycerol', the concentrations list would be ["2M", "10"]
-    and the chemical_names list would be ["NaCl", "glycerol"]"""
+    """Immutable record storing a recipe's name as well as its contents, given by two tuples of chemical names and concentrations.
+    For example, to make a recipe with the contents '2M NaCl 10% glycerol', the concentrations would be ("2M", "10%")
+    and the chemical_names would be ("NaCl", "glycerol"). All strings are interned, since the same chemical names and
+    concentrations appear in many recipes."""
+    __slots__ = ("name", "concentrations", "chemical_names")
+
     def __init__(self, name: str, concentrations: Sequence[str], chemical_names: Sequence[str]):
+        object.__setattr__(self, "name", sys.intern(name))
+        object.__setattr__(self, "concentrations", tuple([sys.intern(concentration) for concentration in concentrations]))
+        object.__setattr__(self, "chemical_names", tuple([sys.intern(chemical_name) for chemical_name in chemical_names]))
 
-        self.name = name
-        self.concentrations = concentrations
-        self.chemical_names = chemical_names
+    def __setattr__(self, attribute, value):
+        raise AttributeError("Recipe objects are immutable.")
+
+    def __reduce__(self):
+        return (Recipe, (self.name, self.concentrations, self.chemical_names))
 
     def get_contents(self):
         """Returns a list of tuples, with the format of each tuple being (chemical_concentration, chemical_name)."""
@@ -94,6 +137,9 @@ class Recipe:
     def __eq__(self, other):
         return self.name == other.name and set(self.get_contents()) == set(other.get_contents())
 
+    def __hash__(self):
+        return hash((self.name, frozenset(self.get_contents())))
+
 def assert_recipe_validity(recipe_object: Recipe, chemical_library: dict = None, recipe_library: dict = None,
                            check_existing_chemicals: bool = True):
 
@@ -102,9 +148,9 @@ def assert_recipe_validity(recipe_object: Recipe, chemical_library: dict = None,
      and that a recipe with the same name doesn't already exist in the recipe library)."""
 
     if chemical_library == None and check_existing_chemicals == True:
-        chemical_library = chemical.load_chemicals()
+        chemical_library = chemical.fetch_chemicals(recipe_object.chemical_names)
     if recipe_library == None:
-        recipe_library = load_recipes()
+        recipe_library = fetch_recipes([recipe_object.name])
 
     if recipe_object.name in recipe_library:
         error_messages.recipe_already_exists(recipe_object.name)
@@ -114,22 +160,20 @@ def assert_recipe_validity(recipe_object: Recipe, chemical_library: dict = None,
 
     for concentration, chemical_name in zip(recipe_object.concentrations, recipe_object.chemical_names):
 
-        magnitude, symbol = unit.split_unit_quantity(concentration)
+        quantity = unit.parse_quantity(concentration)
 
-        if symbol not in unit.valid_units:
-            error_messages.invalid_concentration_unit(symbol)
+        if quantity.dimension == None:
+            error_messages.invalid_concentration_unit(quantity.unit)
 
         if check_existing_chemicals:
-            if symbol in unit.concentration_units and chemical_name not in chemical_library:
+            if quantity.dimension in ["concentration", "amount"] and chemical_name not in chemical_library:
                 error_messages.chemical_not_found(chemical_name)
 
-        try:
-            float_magnitude = float(magnitude)
-        except:
-            error_messages.non_number_concentration_magnitude(magnitude)
+        if quantity.magnitude == None:
+            error_messages.non_number_concentration_magnitude(unit.split_unit_quantity(concentration)[0])
 
-        if float_magnitude <= 0:
-            error_messages.non_positive_concentration_magnitude(float_magnitude)
+        if quantity.magnitude <= 0:
+            error_messages.non_positive_concentration_magnitude(quantity.magnitude)
 
 
 def make_safe_recipe(name: str, concentrations: Sequence[str], chemical_names : Sequence[str],
@@ -150,140 +194,397 @@ def make_safe_recipe(name: str, concentrations: Sequence[str], chemical_names :
 
 def add_single_recipe(name: str, concentrations: Sequence[str], chemical_names: Sequence[str]):
     """Adds a single recipe to the library"""
-    new_recipe = make_safe_recipe(name, concentrations, chemical_names)
+    with libraries.lock_library(recipe_library_file, exclusive=True):
+        new_recipe = make_safe_recipe(name, concentrations, chemical_names)
+        append_recipes([new_recipe])
 
-    with open(recipe_library_file, "a") as file:
-        file.write(str(new_recipe) + "\n")
 
-
-def add_recipes_from_file(filename : str):
-    """Parses specified file, adding a recipe to the library for each line in the file.
-    Each line in the file should first contain the recipe's name, followed by a list of contents.
+def add_recipes_from_files(file_names: Sequence[str], report_all: bool = False):
+    """Parses the specified files, adding a recipe to the library for each line in the files.
+    Each line in a file should first contain the recipe's name, followed by a list of contents.
     All words should be separated by spaces. Example file:
 
     recipe_a 10% glycerol 2M NaCl
     recipe_b 20mM KCl 4g DTT
+
+    Each file is first checked on its own (in parallel, when there are several; see libraries.stage_files). The recipes
+    are then checked against the recipe and chemical libraries and against each other, and only once every line of every
+    file is valid are they appended to the library, in a single write. Normally, buf exits at the first invalid line; if
+    report_all is True, every file is checked in full, and every error found is reported (see libraries.report_import_errors).
     """
-    if os.path.isfile(filename) == False:
-        error_messages.file_not_found(filename)
+    file_names = libraries.expand_file_names(file_names)
+    errors = [] if report_all else None
+
+    with libraries.lock_library(recipe_library_file, exclusive=True):
+        for file_name in file_names:
+            if os.path.isfile(file_name) == False:
+                error_messages.file_not_found(file_name)
+
+        # Imported here, as it is only needed when adding recipes from files.
+        import tempfile
+
+        with libraries.stage_files(check_recipe_file, file_names, errors) as staged_file_paths, \
+                tempfile.TemporaryFile(mode="w+") as staged_file:
+            # Maps each recipe name seen so far to the index of the file it was first seen in.
+            files_by_name = {}
+            listed_names = []
+            number_of_lines = 0
+
+            for file_index, staged_file_path in enumerate(staged_file_paths):
+                # Errors name the file they occurred in when there are several.
+                file_name = file_names[file_index] if len(file_names) > 1 else None
+
+                with open(staged_file_path, "r") as staged_input:
+                    for staged_batch in libraries.read_line_batches(staged_input, staged_file_path):
+                        batch = [libraries.unstage_line(staged_line) for staged_line_number, staged_line in staged_batch]
+                        existing_recipe_library = fetch_recipes([line.split()[0] for line_number, line in batch])
+                        existing_chemical_library = chemical.fetch_chemicals(set(name for line_number, line in batch
+                                                                                 for name in line.split()[2::2]))
+
+                        for line_number, line in batch:
+                            words = line.split()
+                            recipe_name = words[0]
+
+                            checks = [(0, check_new_recipe_name, (recipe_name, existing_recipe_library, files_by_name, file_index, file_names))]
+                            # Concentrations were already checked with the rest of the file, so these checks can only find chemicals that
+                            # are missing from the chemical library.
+                            checks += [(index + 1, make_safe_recipe, (recipe_name, [words[index]], [words[index + 1]], existing_chemical_library, {}))
+                                       for index in range(1, len(words), 2)]
+
+                            try:
+                                if libraries.run_line_checks(checks, file_names[file_index], line_number, line, errors) == False:
+                                    continue
+                            except Exception as error:
+                                error_messages.add_from_file_termination(line_number, erroneous_line=line, upper_case_data_type="Recipes",
+                                                                         file_name=file_name, cause=error)
+
+                            staged_file.write(str(Recipe(recipe_name, words[1::2], words[2::2])) + "\n")
+
+                            if len(listed_names) < libraries.max_listed_names:
+                                listed_names.append(recipe_name)
+
+                        number_of_lines += len(batch)
+                        libraries.report_import_progress(number_of_lines)
+
+            libraries.report_import_progress(number_of_lines, finished=True)
+
+            if report_all and len(errors) > 0:
+                libraries.report_import_errors(errors, file_names, upper_case_data_type="Recipes")
+
+            staged_file.seek(0)
+            append_staged_recipes(staged_file)
+
+        if len(files_by_name) == len(listed_names):
+            print("Added the following recipes to your library:", *listed_names)
+        else:
+            print("Added " + str(len(files_by_name)) + " recipes to your library.")
 
+def check_recipe_file(file_name: str, staged_file_path: str, errors: list = None):
+    """Checks each line of a recipe file on its own (i.e. without looking at the libraries or the rest of the file),
+    writing the valid lines to a staged file (see libraries.stage_files). If errors is a list, every invalid line is
+    added to it, rather than exiting at the first one."""
     try:
-        with open(filename, "r") as file:
-            lines = file.readlines()
+        input_file = open(file_name, "r")
     except:
-        error_messages.file_read_error(filename)
+        error_messages.file_read_error(file_name)
+
+    with input_file as file, open(staged_file_path, "w") as staged_file:
+        for batch in libraries.read_line_batches(file, file_name):
+            for line_number, line in batch:
+                words = line.split()
+                if len(words) == 0:
+                    continue
+
+                # Each concentration is checked separately, so that every invalid concentration on a line can be reported.
+                checks = [(None, check_recipe_line_length, (words, line_number))]
+                checks += [(index, make_safe_recipe, (words[0], [words[index]], [words[index + 1]], None, {}, False))
+                           for index in range(1, len(words) - 1, 2)]
+
+                try:
+                    if libraries.run_line_checks(checks, file_name, line_number, line, errors) == False:
+                        continue
+                except Exception as error:
+                    error_messages.add_from_file_termination(line_number, erroneous_line=line.strip("\n"), upper_case_data_type="Recipes",
+                                                             cause=error)
+
+                staged_file.write(libraries.stage_line(line_number, line))
+
+def check_recipe_line_length(words: Sequence[str], line_number: int):
+    """Checks that a line of a recipe file has a recipe name followed by at least one pair of a concentration and a chemical name."""
+    if len(words) < 3:
+        error_messages.line_too_short_in_recipe_file(line_number)
+    elif len(words) % 2 == 0:
+        error_messages.line_has_inequal_contents_in_recipe_file(line_number)
+
+def check_new_recipe_name(recipe_name: str, recipe_library: dict, files_by_name: dict, file_index: int, file_names: Sequence[str]):
+    """Checks that a recipe name being added from a file isn't already in the library, and hasn't already been used in the
+    files being added (files_by_name maps each name used so far to the index of its file in file_names), then records its use."""
+    if recipe_name in recipe_library:
+        error_messages.recipe_already_exists(recipe_name)
+
+    if recipe_name in files_by_name:
+        if files_by_name[recipe_name] == file_index:
+            error_messages.duplicate_file_entry(recipe_name)
+        error_messages.duplicate_entry_across_files(recipe_name, file_names[files_by_name[recipe_name]])
+
+    files_by_name[recipe_name] = file_index
+
+def append_staged_recipes(staged_file):
+    """Appends the recipes in a staged file (an open file in the recipe library file's format) to the library, without
+    reading them all into memory at once."""
+    if database.is_active():
+        database.add_recipes(tuple(line.rstrip("\n").split(" ", 1)) for line in staged_file)
+        return
+
+    # Within a group commit, the recipes are added to the buffered journal, so that they are only written if the whole
+    # group succeeds (see libraries.group_commit).
+    if libraries.in_group_commit(recipe_library_file):
+        write_journal_records(["add " + line.rstrip("\n") for line in staged_file])
+        return
+
+    # Rather than adding every recipe to the journal, any pending changes are folded into the library file first,
+    # so that the recipes can be appended to the end of the library file.
+    if libraries.journal_is_empty(recipe_library_file) == False:
+        compact_recipe_library()
+
+    libraries.append_staged_file(recipe_library_file, staged_file, recipe_line_names)
+
+def append_recipes(new_recipes: Sequence[Recipe]):
+    """Appends new recipes to the library. They are written to the end of the library file, unless the library has a
+    journal of changes that haven't been compacted yet, in which case they are added to the journal so that all changes
+    are replayed in the order they were made."""
+    if database.is_active():
+        database.add_recipes([(new_recipe.name, new_recipe.get_contents_string()) for new_recipe in new_recipes])
+    elif libraries.journal_is_empty(recipe_library_file):
+        signature = libraries.get_file_signature(recipe_library_file)
+
+        with open(recipe_library_file, "a") as file:
+            for new_recipe in new_recipes:
+                file.write(str(new_recipe) + "\n")
+
+        libraries.index_appended_lines(recipe_library_file, signature, recipe_line_names)
+    else:
+        write_journal_records(["add " + str(new_recipe) for new_recipe in new_recipes])
+
+# --------------------------------------------------------------------------------
+# --------------------------------DISPLAYING RECIPES------------------------------
+# --------------------------------------------------------------------------------
 
-    existing_chemical_library = chemical.load_chemicals()
-    existing_recipe_library = load_recipes()
+def display_recipe_information(recipe_name: str, library: Library = None, format_name: str = None):
+    """Displays the name and contents of a specified recipe, as a record in the given format (see get_recipe_record) if
+    format_name is given."""
+    if library == None:
+        library = Library()
 
-    new_recipe_library = {}
+    recipe_library = library.fetch_recipes([recipe_name])
 
-    for line_number, line in enumerate(lines):
+    if recipe_name not in recipe_library:
+        error_messages.recipe_not_found(recipe_name)
 
-        try:
-            words = line.split()
-            if len(words) == 0:
-                continue
-            elif len(words) < 3:
-                error_messages.line_too_short_in_recipe_file(line_number)
-            elif len(words) % 2 == 0:
-                error_messages.line_has_inequal_contents_in_recipe_file(line_number)
+    recipe_object = recipe_library[recipe_name]
 
-            recipe_name = words[0]
+    if format_name != None:
+        tables.print_record(get_recipe_record(recipe_object), recipe_record_fields, format_name)
+        return
 
-            concentrations = words[1::2]
-            chemical_names = words[2::2]
+    print("Recipe name:", recipe_object.name)
 
+    print("Contents:", recipe_object.get_contents_string())
 
-            new_recipe_object = make_safe_recipe(recipe_name, concentrations, chemical_names, chemical_library=existing_chemical_library,
-                                          recipe_library=existing_recipe_library)
+def display_recipe_library(library: Library = None, limit: int = None, offset: int = None, plain: bool = False,
+                           format_name: str = None):
+    """Displays the names and contents of the recipes in the library, sorted by name. If limit or offset are given, only
+    limit recipes are shown, after skipping the first offset. Rows are printed as they are formatted (see buf.tables),
+    plainly if plain is True, or as records in the given format (see get_recipe_record) if format_name is given."""
+    if library == None:
+        library = Library()
 
-            if recipe_name in new_recipe_library:
-                error_messages.duplicate_file_entry(recipe_name)
+    recipe_library = library.load_recipes()
 
-            new_recipe_library[recipe_name] = new_recipe_object
+    # Sorting by the recipe name, case insensitively (see tables.get_page). Only the contents of the recipes shown are formatted.
+    recipe_names = tables.get_page(recipe_library, limit, offset)
 
-        except:
-            error_messages.add_from_file_termination(line_number, erroneous_line=line.strip("\n"), upper_case_data_type="Recipes")
+    if format_name != None:
+        records = (get_recipe_record(recipe_library[recipe_name]) for recipe_name in recipe_names)
+        tables.print_records(records, recipe_record_fields, format_name)
+        return
+
+    print("The recipes in your library are:")
+
+    rows = ((recipe_name, recipe_library[recipe_name].get_contents_string()) for recipe_name in recipe_names)
 
-    with open(recipe_library_file, "a") as file:
-        # Note: dict.values() can be used here but not in chemical.add_chemicals_from_file, since chemicals can
-        # have multiple names, and therefore will appear multiple times in values()
-        for new_recipe in list(new_recipe_library.values()):
-            file.write(str(new_recipe) + "\n")
+    tables.print_table(rows, headers=["Recipe Name", "Contents"], plain=plain)
+
+recipe_record_fields = ["name", "contents", "concentrations", "chemical_names"]
+
+def get_recipe_record(recipe_object: Recipe):
+    """Returns a recipe as a record (see buf.tables.print_records), giving its contents both as a string and as lists of
+    concentrations and chemical names."""
+    return {"name": recipe_object.name, "contents": recipe_object.get_contents_string(),
+            "concentrations": list(recipe_object.concentrations), "chemical_names": list(recipe_object.chemical_names)}
 
-    print("Added the following recipes to your library:", *list(new_recipe_library.keys()))
 
 # --------------------------------------------------------------------------------
-# --------------------------------DISPLAYING RECIPES------------------------------
+# --------------------------READING/WRITING TO RECIPE LIBRARY---------------------
 # --------------------------------------------------------------------------------
 
-def display_recipe_information(recipe_name: str):
-    """Displays the name and contents of a specified recipe."""
-    recipe_library = load_recipes()
+def get_library_file_paths():
+    """Returns the paths of the files the recipe library is read from (the library file, its journal, and the database),
+    not all of which need exist."""
+    return [recipe_library_file, libraries.fetch_journal_file_path(recipe_library_file), database.database_file]
 
-    if recipe_name not in recipe_library:
-        error_messages.recipe_not_found(recipe_name)
+def load_recipes():
+    """Loads recipe library from file (or from the database, if the library has been migrated to one). When buf is running as
+    a daemon, the library is kept in memory, and only read again once it changes."""
+    with libraries.lock_library(recipe_library_file):
+        return libraries.load_resident_library(get_library_file_paths(), read_recipes)
 
-    recipe_object = recipe_library[recipe_name]
+def read_recipes():
+    """Reads recipe library from file (or from the database, if the library has been migrated to one)."""
+    with libraries.lock_library(recipe_library_file):
+        if database.is_active():
+            return {name: recipe_from_contents_string(name, contents) for name, contents in database.load_recipes()}
 
-    print("Recipe name:", recipe_object.name)
+        try:
+            recipes = libraries.load_cached_library(recipe_library_file, recipes_from_entries)
 
-    print("Contents:", recipe_object.get_contents_string())
+            if recipes == None:
+                signature = libraries.get_file_signature(recipe_library_file)
+                with open(recipe_library_file, "r") as file:
+                    file_contents = file.read()
 
-def display_recipe_library():
-    """Displays the names and contents of all recipes in the library."""
-    print("The recipes in your library are:")
+                recipes = {}
 
-    recipe_library = load_recipes()
+                for line in file_contents.splitlines():
 
-    table = [(recipe_object.name, recipe_object.get_contents_string()) for recipe_object in recipe_library.values()]
+                    words = line.split()
 
-    # Sorting by the recipe name, upper() is called so that all the upper case names don't precede all the lowercase ones.
-    table.sort(key = lambda entry: entry[0].upper())
+                    name = words[0]
+                    concentrations = []
+                    chemical_names = []
 
-    print(tabulate.tabulate(table, headers=["Recipe Name", "Contents"], tablefmt="fancy_grid"))
+                    for index in range(1, len(words[1:]), 2):
+                        concentrations.append(words[index])
+                        chemical_names.append(words[index+1])
 
+                    recipe = make_safe_recipe(name, concentrations, chemical_names, recipe_library=recipes, check_existing_chemicals=False)
+                    recipes[name] = recipe
 
-# --------------------------------------------------------------------------------
-# --------------------------READING/WRITING TO RECIPE LIBRARY---------------------
-# --------------------------------------------------------------------------------
+                libraries.cache_library(recipe_library_file, signature, file_contents, get_recipe_entries(recipes))
 
-def load_recipes():
-    """Loads recipe library from file."""
+            for record in libraries.read_journal(recipe_library_file):
+                apply_journal_record(recipes, record)
+
+            return recipes
+        except:
+            error_messages.library_load_error(lower_case_library_name= "recipe")
+
+def get_recipe_entries(recipes: dict):
+    """Returns the entries of a recipe library to be cached (see libraries.cache_library): a [name, concentrations,
+    chemical_names] list for each recipe."""
+    return [[recipe.name, list(recipe.concentrations), list(recipe.chemical_names)] for recipe in recipes.values()]
+
+def recipes_from_entries(entries: list):
+    """Builds a recipe library from the entries returned by get_recipe_entries."""
     recipes = {}
+    for name, concentrations, chemical_names in entries:
+        recipes[name] = Recipe(name, concentrations, chemical_names)
+    return recipes
 
-    try:
-        with open(recipe_library_file, "r") as file:
-            for line in file:
+def fetch_recipes(names: Sequence[str]):
+    """Returns a dictionary mapping each of the given names that exists in the recipe library to its Recipe.
+    If the library has been migrated to a database, only the requested recipes are read."""
+    with libraries.lock_library(recipe_library_file):
+        if libraries.resident_libraries != None:
+            recipes = load_recipes()
+            return {name: recipes[name] for name in names if name in recipes}
 
-                words = line.split()
+        if database.is_active():
+            return {name: recipe_from_contents_string(name, contents) for name, contents in database.fetch_recipes(names).items()}
 
-                name = words[0]
-                concentrations = []
-                chemical_names = []
+        recipes = {}
 
-                for index in range(1, len(words[1:]), 2):
-                    concentrations.append(words[index])
-                    chemical_names.append(words[index+1])
+        # All the names are looked up in one pass over the index, rather than opening the index once per name.
+        for name, line in libraries.find_indexed_lines(recipe_library_file, names, recipe_line_names).items():
+            words = line.split()
+            recipes[name] = make_safe_recipe(words[0], words[1::2], words[2::2], recipe_library={}, check_existing_chemicals=False)
 
-                recipe = make_safe_recipe(name, concentrations, chemical_names, recipe_library=recipes, check_existing_chemicals=False)
-                recipes[name] = recipe
+        names = set(names)
+        for record in libraries.read_journal(recipe_library_file):
+            if record[1] in names:
+                apply_journal_record(recipes, record)
 
         return recipes
-    except:
-        error_messages.library_load_error(lower_case_library_name= "recipe")
+
+def recipe_line_names(words: Sequence[str]):
+    """Given the words on a line of the recipe library file, returns the name of the recipe defined on that line."""
+    return words[:1]
+
+def recipe_from_contents_string(name: str, contents: str):
+    """Makes a Recipe from its name and a contents string, e.g. '2M NaCl 10% glycerol' (the inverse of Recipe.get_contents_string)."""
+    words = contents.split()
+    return Recipe(name, words[0::2], words[1::2])
 
 def save_recipe_library(recipe_library: dict):
     """Saves recipe library to file."""
-    with open(recipe_library_file, "w") as file:
-        for recipe_object in recipe_library.values():
-            file.write(str(recipe_object) + "\n")
+    with libraries.lock_library(recipe_library_file, exclusive=True):
+        file_contents = "".join(str(recipe_object) + "\n" for recipe_object in recipe_library.values())
+        libraries.write_file_atomically(recipe_library_file, file_contents.encode("utf-8"), durable=True)
+
+        # The saved library already includes every change recorded in the journal.
+        libraries.clear_journal(recipe_library_file)
 
 def reset():
     """Wipes the library."""
-    with open(recipe_library_file, "w") as file:
-        pass
+    with libraries.lock_library(recipe_library_file, exclusive=True):
+        if database.is_active():
+            database.reset_recipes()
+
+        with open(recipe_library_file, "w") as file:
+            pass
+
+        libraries.clear_journal(recipe_library_file)
+
+# --------------------------------------------------------------------------------
+# -----------------------------RECIPE LIBRARY JOURNAL-----------------------------
+# --------------------------------------------------------------------------------
+
+# Rather than rewriting the whole recipe library file to delete a recipe, changes are appended to a journal, which is
+# replayed on top of the library file whenever it is loaded. Each record in the journal is one of the following:
+#
+#   add <recipe_name> (<concentration> <chemical_name>)...   Adds a recipe.
+#   delete <recipe_name>                                     Deletes a recipe.
+#
+# Once the journal grows past libraries.journal_compaction_threshold bytes (or when 'buf compact' is used), it is
+# folded back into the library file.
+
+def write_journal_records(records: Sequence[str]):
+    """Appends records to the recipe library's journal, compacting the library if the journal has grown too large."""
+    with libraries.lock_library(recipe_library_file, exclusive=True):
+        libraries.append_journal_records(recipe_library_file, records)
+
+        if libraries.journal_needs_compaction(recipe_library_file):
+            compact_recipe_library()
+
+def apply_journal_record(recipe_library: dict, record: Sequence[str]):
+    """Applies a journal record (given as a list of words) to a dictionary mapping recipe names to Recipes."""
+    operation = record[0]
+
+    if operation == "add":
+        recipe_library[record[1]] = Recipe(record[1], record[2::2], record[3::2])
+    elif operation == "delete":
+        recipe_library.pop(record[1], None)
+    else:
+        raise ValueError("Unknown journal operation: '" + str(operation) + "'.")
+
+def compact_recipe_library():
+    """Folds the journal into the recipe library file. Within a group commit, compaction is put off until a later change
+    (see libraries.in_group_commit)."""
+    with libraries.lock_library(recipe_library_file, exclusive=True):
+        if database.is_active() or libraries.in_group_commit(recipe_library_file):
+            return
+
+        save_recipe_library(load_recipes())
 
 # --------------------------------------------------------------------------------
 # -------------------------------DELETING RECIPES---------------------------------
@@ -291,7 +592,7 @@ def reset():
 
 def delete_recipe(recipe_name: str, prompt_for_confirmation: bool = True):
     """Removes a specified recipe from the library."""
-    recipe_library = load_recipes()
+    recipe_library = fetch_recipes([recipe_name])
 
     if recipe_name not in recipe_library:
         error_messages.recipe_not_found(recipe_name)
@@ -299,8 +600,9 @@ def delete_recipe(recipe_name: str, prompt_for_confirmation: bool = True):
     if prompt_for_confirmation:
         user_input.confirm()
 
-    del(recipe_library[recipe_name])
-
-    save_recipe_library(recipe_library)
+    if database.is_active():
+        database.delete_recipe(recipe_name)
+    else:
+        write_journal_records(["delete " + recipe_name])
 
     print("Deletion successful.")
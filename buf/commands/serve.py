@@ -0,0 +1,89 @@
+# File name: serve.py
+# Author: Jordan Juravsky
+# Date created: 18-10-2026
+
+"""Module for running buf as a daemon, which keeps one's libraries in memory and answers commands sent to it by buf."""
+
+import io
+import os
+import sys
+import json
+import signal
+import socket
+import socketserver
+from contextlib import redirect_stdout
+from buf import libraries, client, error_messages
+from buf.session import Library
+
+instructions = """buf serve:
+
+This subcommand starts buf as a daemon (a program that keeps running in the background). While the daemon is running, \
+your chemical and recipe libraries are kept in memory, and commands that only read your libraries (making buffers with \
+'buf make', and looking up chemicals and recipes with 'buf chemical' and 'buf recipe') are passed on to the daemon, \
+rather than reading your libraries from disk each time. This makes these commands much faster when your libraries are \
+large, or when buf is being called many times by another program. Commands that change your libraries are still run \
+as normal, and the daemon picks up their changes automatically.
+
+To start the daemon, use 'buf serve' (or 'buf serve &' to run it in the background). The daemon listens on a socket \
+named 'buf.sock' in your library directory, and stops when interrupted (e.g. with Ctrl-C). Only one daemon can run at a time.
+"""
+
+def serve(options: dict, library: Library = None):
+    """Parses command line options, starting the daemon."""
+    run_daemon()
+
+def run_daemon():
+    """Listens for commands on the daemon's socket until interrupted."""
+    if hasattr(socket, "AF_UNIX") == False:
+        error_messages.daemon_not_supported()
+
+    if client.send_request({"arguments": []}) != None:
+        error_messages.daemon_already_running(client.socket_file)
+
+    libraries.ensure_library_dir_exists()
+
+    # Removing the socket file left behind by a daemon that didn't shut down cleanly.
+    if os.path.exists(client.socket_file):
+        os.remove(client.socket_file)
+
+    libraries.keep_libraries_in_memory()
+
+    # Stopping cleanly (removing the socket file) when terminated, as well as when interrupted.
+    signal.signal(signal.SIGTERM, lambda signal_number, frame: sys.exit())
+
+    with socketserver.UnixStreamServer(client.socket_file, RequestHandler) as server:
+        print("Serving on '" + str(client.socket_file) + "'. Press Ctrl-C to stop.")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.remove(client.socket_file)
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    """Answers a single request, given as a line of JSON, with a response in JSON (see answer_request)."""
+    def handle(self):
+        request = json.loads(self.rfile.readline().decode("utf-8"))
+        self.wfile.write(json.dumps(answer_request(request)).encode("utf-8"))
+
+def answer_request(request: dict):
+    """Runs the command given in a request, returning a dictionary containing whether the command was handled, its output,
+    and the code it exited with (or None if it didn't exit)."""
+    # Imported here, since buf.main imports buf.commands.
+    from buf.main import run_command
+
+    arguments = request["arguments"]
+
+    if client.is_forwardable(arguments) == False:
+        return {"handled": False, "output": "", "exit_code": None}
+
+    output = io.StringIO()
+    exit_code = None
+
+    with redirect_stdout(output):
+        try:
+            run_command(arguments)
+        except SystemExit as system_exit:
+            exit_code = system_exit.code
+
+    return {"handled": True, "output": output.getvalue(), "exit_code": exit_code}
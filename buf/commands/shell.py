@@ -0,0 +1,133 @@
+# File name: shell.py
+# Author: Jordan Juravsky
+# Date created: 18-10-2026
+
+"""Module for running buf interactively, keeping one's libraries in memory between commands."""
+
+import shlex
+from buf import commands, completion, unit
+from buf.session import Library
+
+instructions = """buf shell:
+
+This subcommand starts an interactive buf session, in which you can type buf commands one after another (with or \
+without the leading 'buf'), for example:
+
+buf> chemical -a 58.44 NaCl
+buf> recipe -a wash 300mM NaCl 10% glycerol
+buf> make 2L wash
+
+Your chemical and recipe libraries are read once and kept in memory for the whole session, so each command runs \
+straight away, even when your libraries are large. Changes you make are saved to your libraries as soon as each \
+command finishes, and changes made outside the session (e.g. by buf running in another terminal) are picked up \
+before the next command.
+
+Pressing tab completes subcommands, the names of chemicals and recipes in your libraries, and units. To leave the \
+session, type 'exit' or 'quit' (or press Ctrl-D).
+"""
+
+prompt = "buf> "
+exit_words = ["exit", "quit"]
+
+def shell(options: dict, library: Library = None):
+    """Parses command line options, starting an interactive session."""
+    if library == None:
+        library = Library()
+
+    run_shell(library)
+
+def run_shell(library: Library):
+    """Reads and runs commands until the user leaves the session."""
+    set_up_completion(library)
+
+    print("Welcome to the buf shell! Type 'help' for an overview of buf, or 'exit' to leave.")
+
+    while True:
+        try:
+            line = input(prompt)
+        except EOFError:
+            print()
+            break
+        except KeyboardInterrupt:
+            print()
+            continue
+
+        if run_line(line, library) == False:
+            break
+
+def run_line(line: str, library: Library):
+    """Runs the command on a line typed into the shell, returning False if the user asked to leave the session."""
+    # Imported here, since buf.main imports buf.commands.
+    from buf.main import run_command
+
+    try:
+        arguments = shlex.split(line)
+    except ValueError as error:
+        print("Invalid command: " + str(error) + ".")
+        return True
+
+    if len(arguments) > 0 and arguments[0] == "buf":
+        arguments = arguments[1:]
+
+    if len(arguments) == 0:
+        return True
+
+    if arguments[0] in exit_words:
+        return False
+
+    if arguments[0] == "shell":
+        print("Already in the buf shell.")
+        return True
+
+    # Picking up any changes made to the libraries by other buf processes since the last command.
+    library.refresh()
+
+    try:
+        run_command(arguments, library)
+    except SystemExit as system_exit:
+        # Usage errors exit with the usage message, which would otherwise be shown by the interpreter as buf exits.
+        if isinstance(system_exit.code, str):
+            print(system_exit.code)
+    except KeyboardInterrupt:
+        print()
+
+    return True
+
+def set_up_completion(library: Library):
+    """Completes commands (see buf.completion) when tab is pressed, if the readline module is available."""
+    try:
+        import readline
+    except ImportError:
+        return
+
+    readline.set_completer(get_completer(library))
+    readline.set_completer_delims(" \t")
+    readline.parse_and_bind("tab: complete")
+
+def get_completer(library: Library):
+    """Returns a readline completer function, which completes the word being typed using the names in library."""
+    import readline
+
+    matches = []
+
+    def completer(text: str, state: int):
+        if state == 0:
+            matches[:] = get_completions(readline.get_line_buffer()[:readline.get_begidx()], text, library)
+        return matches[state] if state < len(matches) else None
+
+    return completer
+
+def get_completions(line_before_word: str, text: str, library: Library):
+    """Returns the words that the word being typed (which starts with text) could be completed to, given the rest of the
+    line before it."""
+    words = line_before_word.split()
+
+    if len(words) > 0 and words[0] == "buf":
+        words = words[1:]
+
+    subcommand_names = commands.subcommand_names + exit_words
+    chemical_names = library.load_chemicals().keys()
+    recipe_names = library.load_recipes().keys()
+
+    return completion.complete(words, text, subcommand_names, chemical_names, recipe_names, unit.valid_units,
+                               unit.volume_units.get_symbols())
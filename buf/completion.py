@@ -0,0 +1,332 @@
+# File name: completion.py
+# Author: Jordan Juravsky
+# Date created: 18-10-2026
+
+"""Module for completing partially typed buf commands, given the names in one's libraries. Words are completed in
+'buf shell' by complete, and in bash and zsh by the scripts printed by 'buf completion', which read the names from a
+completion index file kept up to date by buf whenever one's libraries change."""
+
+import os
+import re
+import shlex
+from typing import Sequence, Iterable
+from buf import libraries
+
+# --------------------------------------------------------------------------------
+# --------------------------------COMPLETING WORDS--------------------------------
+# --------------------------------------------------------------------------------
+
+number_pattern = re.compile(r"[0-9.]*")
+
+def complete(words: Sequence[str], text: str, subcommand_names: Iterable[str], chemical_names: Iterable[str],
+             recipe_names: Iterable[str], unit_symbols: Iterable[str] = (), volume_unit_symbols: Iterable[str] = ()):
+    """Given the words of a command typed so far (excluding a leading 'buf', and the word being typed), and the start of
+    the word being typed, returns a sorted list of the words it could be completed to."""
+    candidates = get_candidates(words, subcommand_names, chemical_names, recipe_names)
+
+    # Volumes and concentrations are completed with units, once their number has been typed.
+    number = number_pattern.match(text).group()
+    if number != "":
+        quantity = get_quantity_kind(words)
+        if quantity == "volume":
+            candidates += [number + symbol for symbol in volume_unit_symbols]
+        elif quantity == "concentration":
+            candidates += [number + symbol for symbol in unit_symbols]
+
+    return sorted(candidate for candidate in candidates if candidate.startswith(text))
+
+def get_candidates(words: Sequence[str], subcommand_names: Iterable[str], chemical_names: Iterable[str], recipe_names: Iterable[str]):
+    """Returns every name or option that could follow the given words of a command (see complete), following the usage
+    of each subcommand (see 'buf help')."""
+    if len(words) == 0:
+        return list(subcommand_names)
+
+    subcommand, arguments = words[0], words[1:]
+
+    if subcommand == "help":
+        return list(subcommand_names) if len(arguments) == 0 else []
+
+    if subcommand == "chemical":
+        if len(arguments) == 0:
+            return ["-a", "-n", "-d"] + list(chemical_names)
+        if arguments[0] == "-a":
+            return ["--report-all"]
+        if arguments[0] == "-n" and len(arguments) == 1:
+            return list(chemical_names)
+        if arguments[0] == "-d":
+            return list(chemical_names) if len(arguments) == 1 else ["--complete", "--confirm"]
+        return []
+
+    if subcommand == "recipe":
+        if len(arguments) == 0:
+            return ["-a", "-d"] + list(recipe_names)
+        if arguments[0] == "-a":
+            # After the new recipe's name, concentrations and chemical names alternate.
+            return list(chemical_names) if len(arguments) >= 3 and len(arguments) % 2 == 1 else []
+        if arguments[0] == "-d":
+            return list(recipe_names) if len(arguments) == 1 else ["--confirm"]
+        return []
+
+    if subcommand == "make":
+        if len(arguments) == 0:
+            return ["--orders"]
+        if arguments[0] == "--orders":
+            return []
+        if len(arguments) == 1:
+            return list(recipe_names)
+        # After the volume, concentrations and chemical names alternate.
+        return list(chemical_names) if len(arguments) % 2 == 0 else []
+
+    return []
+
+def get_quantity_kind(words: Sequence[str]):
+    """Returns 'volume' or 'concentration' if the word following the given words of a command (see complete) is a volume
+    or a concentration, and None otherwise."""
+    if len(words) == 0:
+        return None
+
+    subcommand, arguments = words[0], words[1:]
+
+    if subcommand == "make" and (len(arguments) == 0 or arguments[0] != "--orders"):
+        if len(arguments) == 0:
+            return "volume"
+        if len(arguments) % 2 == 1:
+            return "concentration"
+
+    if subcommand == "recipe" and len(arguments) >= 2 and arguments[0] == "-a" and len(arguments) % 2 == 0:
+        return "concentration"
+
+    return None
+
+# --------------------------------------------------------------------------------
+# --------------------------------COMPLETION INDEX--------------------------------
+# --------------------------------------------------------------------------------
+
+# The completion index lists the names in one's libraries, so that the completion scripts (see get_script) can
+# complete names without starting Python, which alone takes longer than a keypress should. It is a text file whose
+# first line holds the version of the libraries the names were read from (see buf.session), followed by one line for
+# each chemical name (e.g. 'c NaCl') and each recipe name (e.g. 'r wash'), so that the scripts can pick out the names
+# starting with the word being completed with a single search (with grep), even when the libraries are large.
+#
+# The index is only kept once 'buf completion' has been used. After that, whenever a command changes the libraries,
+# the names it changed are updated in the index (see update_index), unless the libraries were changed by something
+# else since the index was written, in which case the index is rebuilt from the whole libraries.
+
+completion_index_file = os.path.join(libraries.library_dir, "completion.index")
+
+def read_index():
+    """Returns the chemical names and recipe names in the completion index (as sets), and the version of the libraries
+    they were read from (as a string), or None if there is no index."""
+    try:
+        with open(completion_index_file, "r", encoding="utf-8") as file:
+            lines = file.read().splitlines()
+    except OSError:
+        return None
+
+    if len(lines) == 0 or lines[0].startswith("version ") == False:
+        return None
+
+    chemical_names = set(line[2:] for line in lines[1:] if line.startswith("c "))
+    recipe_names = set(line[2:] for line in lines[1:] if line.startswith("r "))
+    return chemical_names, recipe_names, lines[0][len("version "):]
+
+def write_index(chemical_names: Iterable[str], recipe_names: Iterable[str], version):
+    """Replaces the completion index with the given names, read from the given version of the libraries."""
+    lines = ["version " + repr(version)] + ["c " + name for name in sorted(chemical_names)] + ["r " + name for name in sorted(recipe_names)]
+
+    libraries.ensure_library_dir_exists()
+    libraries.write_file_atomically(completion_index_file, ("\n".join(lines) + "\n").encode("utf-8"))
+
+def build_index(library):
+    """Writes the completion index from the whole of one's libraries, as read by library (a buf.session.Library)."""
+    write_index(library.load_chemicals().keys(), library.load_recipes().keys(), library.version)
+
+def ensure_index_exists(library):
+    """Builds the completion index if there isn't one yet."""
+    if os.path.exists(completion_index_file) == False:
+        build_index(library)
+
+def rebuild_index(library):
+    """Rebuilds the completion index from the whole of one's libraries, if completion has been set up."""
+    if os.path.exists(completion_index_file):
+        build_index(library)
+
+def update_index(library, previous_version, chemical_names: Iterable[str] = (), recipe_names: Iterable[str] = ()):
+    """Updates the completion index (if completion has been set up) after a command changed the given chemical and
+    recipe names, changing the libraries from previous_version to library's version. Each name is added to the index
+    if library has read it, and removed otherwise."""
+    index = read_index()
+
+    if index == None:
+        return
+
+    indexed_chemical_names, indexed_recipe_names, indexed_version = index
+
+    if indexed_version != repr(previous_version):
+        build_index(library)
+        return
+
+    for name in chemical_names:
+        if name in library.chemicals:
+            indexed_chemical_names.add(name)
+        else:
+            indexed_chemical_names.discard(name)
+
+    for name in recipe_names:
+        if name in library.recipes:
+            indexed_recipe_names.add(name)
+        else:
+            indexed_recipe_names.discard(name)
+
+    write_index(indexed_chemical_names, indexed_recipe_names, library.version)
+
+# --------------------------------------------------------------------------------
+# ---------------------------------SHELL SCRIPTS----------------------------------
+# --------------------------------------------------------------------------------
+
+# Both scripts complete words following the same rules as get_candidates and get_quantity_kind, and fall back to
+# completing file names (e.g. after 'buf make --orders') when there is nothing else to complete. The subcommand names,
+# unit symbols and index file are filled in by get_script.
+
+bash_script = r"""# Tab completion for buf in bash. To enable it, add the following line to ~/.bashrc:
+#     eval "$(buf completion bash)"
+
+_buf_add() {
+    # Adds the words in the list $1, each prefixed by $2, that start with the word being completed.
+    local IFS=$' \n' noglob=
+    [[ $- == *f* ]] && noglob=1
+    set -f
+    COMPREPLY+=($(compgen -P "$2" -W "$1" -- "${cur:${#2}}"))
+    [[ -n $noglob ]] || set +f
+}
+
+_buf_add_names() {
+    # Adds the names of the given kind ('c' for chemicals, 'r' for recipes) in the index that start with the word being
+    # completed. Since names can't contain spaces, '<kind> <word>' can only be found at the start of a line of the index.
+    local IFS=$'\n' noglob=
+    local -a lines
+    [[ $- == *f* ]] && noglob=1
+    set -f
+    lines=($(LC_ALL=C grep -F -- "$1 $cur" INDEX_FILE 2> /dev/null))
+    COMPREPLY+=("${lines[@]#$1 }")
+    [[ -n $noglob ]] || set +f
+}
+
+_buf() {
+    local cur="${COMP_WORDS[COMP_CWORD]}"
+    local number="${cur%%[!0-9.]*}"
+    COMPREPLY=()
+
+    if (( COMP_CWORD == 1 )); then
+        _buf_add "SUBCOMMAND_NAMES"
+        return 0
+    fi
+
+    local -a args=("${COMP_WORDS[@]:2:COMP_CWORD-2}")
+    local n=${#args[@]}
+
+    case "${COMP_WORDS[1]}" in
+        help)
+            (( n == 0 )) && _buf_add "SUBCOMMAND_NAMES" ;;
+        chemical)
+            if (( n == 0 )); then _buf_add "-a -n -d"; _buf_add_names c
+            elif [[ ${args[0]} == -a ]]; then _buf_add "--report-all"
+            elif [[ ${args[0]} == -n ]]; then (( n == 1 )) && _buf_add_names c
+            elif [[ ${args[0]} == -d ]]; then
+                if (( n == 1 )); then _buf_add_names c; else _buf_add "--complete --confirm"; fi
+            fi ;;
+        recipe)
+            if (( n == 0 )); then _buf_add "-a -d"; _buf_add_names r
+            elif [[ ${args[0]} == -a ]]; then
+                if (( n >= 3 && n % 2 == 1 )); then _buf_add_names c
+                elif (( n >= 2 )) && [[ -n $number ]]; then _buf_add "UNIT_SYMBOLS" "$number"
+                fi
+            elif [[ ${args[0]} == -d ]]; then
+                if (( n == 1 )); then _buf_add_names r; else _buf_add "--confirm"; fi
+            fi ;;
+        make)
+            if [[ ${args[0]} == --orders ]]; then :
+            elif (( n == 0 )); then
+                _buf_add "--orders"
+                [[ -n $number ]] && _buf_add "VOLUME_UNIT_SYMBOLS" "$number"
+            elif (( n == 1 )); then
+                _buf_add_names r
+                [[ -n $number ]] && _buf_add "UNIT_SYMBOLS" "$number"
+            elif (( n % 2 == 0 )); then _buf_add_names c
+            elif [[ -n $number ]]; then _buf_add "UNIT_SYMBOLS" "$number"
+            fi ;;
+    esac
+    return 0
+}
+
+complete -o default -F _buf buf
+"""
+
+zsh_script = r"""# Tab completion for buf in zsh. To enable it, add the following line to ~/.zshrc (after compinit):
+#     eval "$(buf completion zsh)"
+
+_buf() {
+    local -a lines chemicals recipes args candidates
+    local -a units=(UNIT_SYMBOLS) volume_units=(VOLUME_UNIT_SYMBOLS)
+    local number=${PREFIX%%[^0-9.]*}
+
+    if (( CURRENT == 2 )); then
+        candidates=(SUBCOMMAND_NAMES)
+    else
+        [[ -r INDEX_FILE ]] && lines=("${(@f)$(< INDEX_FILE)}")
+        chemicals=(${${(M)lines:#c *}#c })
+        recipes=(${${(M)lines:#r *}#r })
+
+        args=("${(@)words[3,CURRENT-1]}")
+        local n=${#args}
+
+        case $words[2] in
+            help)
+                (( n == 0 )) && candidates=(SUBCOMMAND_NAMES) ;;
+            chemical)
+                if (( n == 0 )); then candidates=(-a -n -d $chemicals)
+                elif [[ $args[1] == -a ]]; then candidates=(--report-all)
+                elif [[ $args[1] == -n ]]; then (( n == 1 )) && candidates=($chemicals)
+                elif [[ $args[1] == -d ]]; then
+                    if (( n == 1 )); then candidates=($chemicals); else candidates=(--complete --confirm); fi
+                fi ;;
+            recipe)
+                if (( n == 0 )); then candidates=(-a -d $recipes)
+                elif [[ $args[1] == -a ]]; then
+                    if (( n >= 3 && n % 2 == 1 )); then candidates=($chemicals)
+                    elif (( n >= 2 )) && [[ -n $number ]]; then candidates=($number${^units})
+                    fi
+                elif [[ $args[1] == -d ]]; then
+                    if (( n == 1 )); then candidates=($recipes); else candidates=(--confirm); fi
+                fi ;;
+            make)
+                if [[ $args[1] == --orders ]]; then :
+                elif (( n == 0 )); then
+                    candidates=(--orders)
+                    [[ -n $number ]] && candidates+=($number${^volume_units})
+                elif (( n == 1 )); then
+                    candidates=($recipes)
+                    [[ -n $number ]] && candidates+=($number${^units})
+                elif (( n % 2 == 0 )); then candidates=($chemicals)
+                elif [[ -n $number ]]; then candidates=($number${^units})
+                fi ;;
+        esac
+    fi
+
+    compadd -a candidates || _files
+}
+
+compdef _buf buf
+"""
+
+def get_script(shell_name: str, subcommand_names: Iterable[str]):
+    """Returns the completion script for the given shell ('bash' or 'zsh')."""
+    from buf import unit
+
+    script = bash_script if shell_name == "bash" else zsh_script
+
+    # Unit symbols (such as '%w/v') are quoted, since some contain characters that are special to the shell.
+    return script.replace("SUBCOMMAND_NAMES", " ".join(subcommand_names)) \
+                 .replace("VOLUME_UNIT_SYMBOLS", " ".join(shlex.quote(symbol) for symbol in unit.volume_units.get_symbols())) \
+                 .replace("UNIT_SYMBOLS", " ".join(shlex.quote(symbol) for symbol in unit.valid_units)) \
+                 .replace("INDEX_FILE", shlex.quote(completion_index_file))
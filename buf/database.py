@@ -0,0 +1,207 @@
+# File name: database.py
+# Author: Jordan Juravsky
+# Date created: 18-10-2026
+
+"""Module for storing one's chemical and recipe libraries in an indexed SQLite database, as an alternative to the
+chemicals.txt and recipes.txt library files. Once the library files have been migrated into the database (see
+'buf help migrate'), looking up a chemical or recipe only reads the rows belonging to it, rather than the whole library.
+
+This module only deals in plain values (molar masses, lists of names, and recipe contents strings), so that it does not
+depend on buf.commands; the chemical and recipe modules turn these into Chemical and Recipe objects."""
+
+import os
+from contextlib import closing
+from buf import libraries
+
+database_file = os.path.join(libraries.library_dir, "library.db")
+
+schema = """
+CREATE TABLE chemicals (
+    id INTEGER PRIMARY KEY,
+    molar_mass REAL NOT NULL
+);
+CREATE TABLE chemical_names (
+    name TEXT PRIMARY KEY,
+    chemical_id INTEGER NOT NULL REFERENCES chemicals (id) ON DELETE CASCADE
+);
+CREATE INDEX chemical_names_by_chemical ON chemical_names (chemical_id);
+CREATE TABLE recipes (
+    name TEXT PRIMARY KEY,
+    contents TEXT NOT NULL
+);
+"""
+
+# The most names looked up by a single query. SQLite limits the number of parameters in a statement (to 999 before
+# version 3.32, and 32766 since), so longer lists of names are looked up in chunks of this size.
+max_query_names = 999
+
+def is_active():
+    """Checks whether one's libraries have been migrated into the database (in which case the library files are no longer used)."""
+    return os.path.exists(database_file)
+
+def connect():
+    """Opens a connection to the database. Use the connection as a context manager to wrap statements in a transaction."""
+    import sqlite3
+    connection = sqlite3.connect(database_file)
+    connection.execute("PRAGMA foreign_keys = ON")
+    return connection
+
+def get_chunks(names: list):
+    """Splits a list of names into lists of at most max_query_names names, each small enough to look up in one query."""
+    return [names[start:start + max_query_names] for start in range(0, len(names), max_query_names)]
+
+def create_database(chemicals, recipes):
+    """Creates the database from the given chemicals (a list of (molar_mass, names) tuples) and recipes (a list of
+    (name, contents_string) tuples) in a single transaction. The database is built under a temporary name and moved into
+    place once complete, so a failed migration never leaves a half-filled database behind."""
+    libraries.ensure_library_dir_exists()
+
+    temp_file = database_file + ".tmp"
+    if os.path.exists(temp_file):
+        os.remove(temp_file)
+
+    import sqlite3
+    with closing(sqlite3.connect(temp_file)) as connection:
+        connection.execute("PRAGMA foreign_keys = ON")
+        connection.executescript(schema)
+        with connection:
+            insert_chemicals(connection, chemicals)
+            insert_recipes(connection, recipes)
+
+    os.replace(temp_file, database_file)
+
+def reset():
+    """Deletes the database, meaning that one's library files will be used again."""
+    if os.path.exists(database_file):
+        os.remove(database_file)
+
+# --------------------------------------------------------------------------------
+# ------------------------------------CHEMICALS-----------------------------------
+# --------------------------------------------------------------------------------
+
+def insert_chemicals(connection, chemicals):
+    """Inserts each (molar_mass, names) tuple in chemicals using an open connection."""
+    for molar_mass, names in chemicals:
+        chemical_id = connection.execute("INSERT INTO chemicals (molar_mass) VALUES (?)", (molar_mass,)).lastrowid
+        connection.executemany("INSERT INTO chemical_names (name, chemical_id) VALUES (?, ?)",
+                               [(name, chemical_id) for name in names])
+
+def fetch_chemicals(names):
+    """Returns a dictionary mapping each of the given names that exists in the database to a (molar_mass, names) tuple
+    describing its chemical. Only the rows of the requested chemicals are read."""
+    names = list(names)
+    if len(names) == 0:
+        return {}
+
+    chemicals = {}
+    found = {}
+
+    with closing(connect()) as connection:
+        for names_chunk in get_chunks(names):
+            placeholders = ", ".join("?" for _ in names_chunk)
+            query = """SELECT requested.name, chemicals.id, chemicals.molar_mass, all_names.name
+                       FROM chemical_names AS requested
+                       JOIN chemicals ON chemicals.id = requested.chemical_id
+                       JOIN chemical_names AS all_names ON all_names.chemical_id = chemicals.id
+                       WHERE requested.name IN (""" + placeholders + """)
+                       ORDER BY all_names.rowid"""
+
+            for requested_name, chemical_id, molar_mass, name in connection.execute(query, names_chunk):
+                if chemical_id not in chemicals:
+                    chemicals[chemical_id] = (molar_mass, [])
+                if name not in chemicals[chemical_id][1]:
+                    chemicals[chemical_id][1].append(name)
+                found[requested_name] = chemical_id
+
+    return {name: chemicals[chemical_id] for name, chemical_id in found.items()}
+
+def load_chemicals():
+    """Returns every chemical in the database as a list of (molar_mass, names) tuples."""
+    chemicals = {}
+
+    with closing(connect()) as connection:
+        query = """SELECT chemicals.id, chemicals.molar_mass, chemical_names.name
+                   FROM chemical_names JOIN chemicals ON chemicals.id = chemical_names.chemical_id
+                   ORDER BY chemical_names.rowid"""
+        for chemical_id, molar_mass, name in connection.execute(query):
+            if chemical_id not in chemicals:
+                chemicals[chemical_id] = (molar_mass, [])
+            chemicals[chemical_id][1].append(name)
+
+    return list(chemicals.values())
+
+def add_chemicals(chemicals):
+    """Adds each (molar_mass, names) tuple in chemicals to the database in a single transaction."""
+    with closing(connect()) as connection:
+        with connection:
+            insert_chemicals(connection, chemicals)
+
+def nickname_chemical(existing_chemical_name: str, new_names):
+    """Binds each of new_names to the chemical that existing_chemical_name refers to."""
+    with closing(connect()) as connection:
+        with connection:
+            connection.executemany("""INSERT INTO chemical_names (name, chemical_id)
+                                      SELECT ?, chemical_id FROM chemical_names WHERE name = ?""",
+                                   [(new_name, existing_chemical_name) for new_name in new_names])
+
+def delete_chemical_names(names):
+    """Removes the given names from the database, deleting any chemical that is left without a name."""
+    with closing(connect()) as connection:
+        with connection:
+            connection.executemany("DELETE FROM chemical_names WHERE name = ?", [(name,) for name in names])
+            connection.execute("""DELETE FROM chemicals WHERE NOT EXISTS
+                                  (SELECT 1 FROM chemical_names WHERE chemical_names.chemical_id = chemicals.id)""")
+
+def reset_chemicals():
+    """Deletes every chemical in the database."""
+    with closing(connect()) as connection:
+        with connection:
+            connection.execute("DELETE FROM chemical_names")
+            connection.execute("DELETE FROM chemicals")
+
+# --------------------------------------------------------------------------------
+# -------------------------------------RECIPES------------------------------------
+# --------------------------------------------------------------------------------
+
+def insert_recipes(connection, recipes):
+    """Inserts each (name, contents_string) tuple in recipes using an open connection."""
+    connection.executemany("INSERT INTO recipes (name, contents) VALUES (?, ?)", recipes)
+
+def fetch_recipes(names):
+    """Returns a dictionary mapping each of the given names that exists in the database to its recipe's contents string."""
+    names = list(names)
+    if len(names) == 0:
+        return {}
+
+    recipes = {}
+
+    with closing(connect()) as connection:
+        for names_chunk in get_chunks(names):
+            placeholders = ", ".join("?" for _ in names_chunk)
+            rows = connection.execute("SELECT name, contents FROM recipes WHERE name IN (" + placeholders + ")", names_chunk)
+            recipes.update(rows.fetchall())
+
+    return recipes
+
+def load_recipes():
+    """Returns every recipe in the database as a list of (name, contents_string) tuples."""
+    with closing(connect()) as connection:
+        return connection.execute("SELECT name, contents FROM recipes ORDER BY rowid").fetchall()
+
+def add_recipes(recipes):
+    """Adds each (name, contents_string) tuple in recipes to the database in a single transaction."""
+    with closing(connect()) as connection:
+        with connection:
+            insert_recipes(connection, recipes)
+
+def delete_recipe(recipe_name: str):
+    """Removes the recipe with the given name from the database."""
+    with closing(connect()) as connection:
+        with connection:
+            connection.execute("DELETE FROM recipes WHERE name = ?", (recipe_name,))
+
+def reset_recipes():
+    """Deletes every recipe in the database."""
+    with closing(connect()) as connection:
+        with connection:
+            connection.execute("DELETE FROM recipes")
@@ -2,152 +2,185 @@
 # Author: Jordan Juravsky
 # Date created: 08-08-2018
 
-"""Descriptive error messages that use sys.exit to cleanly end the program without displaying a traceback."""
+"""Descriptive error messages, each raised as an exception from buf.exceptions. On the command line, the message is shown
+and the program ends cleanly without displaying a traceback (see buf.main.run_command)."""
 
-from sys import exit
-from buf import unit
+from buf import unit, exceptions
 
 # --------------------------------------------------------------------------------
 # -----------------------------------CHEMICAL ERRORS------------------------------
 # --------------------------------------------------------------------------------
 
 def chemical_not_found(chemical_name: str):
-    print("Chemical not found: '" + str(chemical_name) + "' does not exist in your chemical library. "
+    raise exceptions.ChemicalNotFoundError("Chemical not found: '" + str(chemical_name) + "' does not exist in your chemical library. "
           "To add a chemical to your library, use 'buf chemical -a <molar_mass> <chemical_names>...'. For "
           "more information, see 'buf help chemical'.")
-    exit()
 
 def chemical_already_exists(chemical_name: str):
-    print("Chemical already exists: '" + str(chemical_name) + "' already exists in your library. "
+    raise exceptions.ChemicalExistsError("Chemical already exists: '" + str(chemical_name) + "' already exists in your library. "
           "To delete a chemical from your library, use 'buf chemical -d <chemical_name>'. To see the "
           "chemicals in your library, use 'buf chemical'. For more information, see 'buf help chemical'.")
-    exit()
 
 def non_number_molar_mass(molar_mass: str):
-    print("Invalid molar mass: '" + str(molar_mass) + "' is not a number.")
-    exit()
+    raise exceptions.InvalidChemicalError("Invalid molar mass: '" + str(molar_mass) + "' is not a number.")
 
 def non_positive_molar_mass(molar_mass: float):
-    print("Invalid molar mass: '" + str(molar_mass) + "' must be greater than 0.")
-    exit()
+    raise exceptions.InvalidChemicalError("Invalid molar mass: '" + str(molar_mass) + "' must be greater than 0.")
 
 def line_too_short_in_chemical_file(line_number_zero_indexed: float):
-    print("Invalid line length: line " + str(line_number_zero_indexed + 1) + " must contain at least one name after its molar mass. For "
+    raise exceptions.FileFormatError("Invalid line length: line " + str(line_number_zero_indexed + 1) + " must contain at least one name after its molar mass. For "
           "more information, see 'buf help chemical'.")
-    exit()
 
 def spaces_in_chemical_name(chemical_name: str):
-    print("Invalid chemical name: '" + str(chemical_name) + "' cannot contain spaces.")
-    exit()
+    raise exceptions.InvalidChemicalError("Invalid chemical name: '" + str(chemical_name) + "' cannot contain spaces.")
 
 # --------------------------------------------------------------------------------
 # ---------------------------------RECIPE ERRORS----------------------------------
 # --------------------------------------------------------------------------------
 
 def recipe_not_found(recipe_name: str):
-    print("Recipe not found: '" + str(recipe_name) + "' does not exist in your recipe library.",
-          "To add a recipe to your library, use 'buf recipe -a <recipe_name> (<chemical_concentration> <chemical_name>)...'.",
+    raise exceptions.RecipeNotFoundError("Recipe not found: '" + str(recipe_name) + "' does not exist in your recipe library. "
+          "To add a recipe to your library, use 'buf recipe -a <recipe_name> (<chemical_concentration> <chemical_name>)...'. "
           "For more information, see 'buf help recipe'.")
-    exit()
 
 def recipe_already_exists(recipe_name: str):
-    print("Recipe already exists: '" + str(recipe_name) + "' already exists in your library.",
-          "To delete a recipe from your library, use 'buf recipe -d <recipe_name>'. To see the",
+    raise exceptions.RecipeExistsError("Recipe already exists: '" + str(recipe_name) + "' already exists in your library. "
+          "To delete a recipe from your library, use 'buf recipe -d <recipe_name>'. To see the "
           "recipes in your library, use 'buf recipe'. For more information, see 'buf help recipe'.")
-    exit()
 
 def invalid_concentration_unit(symbol: str):
-    print("Invalid unit: '" + str(symbol) + "' is not a valid unit. Valid units are:", *unit.valid_units)
-    exit()
+    raise exceptions.UnitError("Invalid unit: '" + str(symbol) + "' is not a valid unit. Valid units are: " + " ".join(unit.valid_units))
 
 def non_number_concentration_magnitude(magnitude: str):
-    print("Invalid concentration: '" + str(magnitude) + "' is not a number.")
-    exit()
+    raise exceptions.InvalidRecipeError("Invalid concentration: '" + str(magnitude) + "' is not a number.")
 
 def non_positive_concentration_magnitude(magnitude: str):
-    print("Invalid concentration: '" + str(magnitude) + "' is not greater than 0.")
-    exit()
+    raise exceptions.InvalidRecipeError("Invalid concentration: '" + str(magnitude) + "' is not greater than 0.")
 
 def line_too_short_in_recipe_file(line_number_zero_indexed: float):
-    print("Invalid line length: line " + str(line_number_zero_indexed + 1) + " must contain at least one concentration-chemical name pair.",
+    raise exceptions.FileFormatError("Invalid line length: line " + str(line_number_zero_indexed + 1) + " must contain at least one concentration-chemical name pair. "
           "For more information see 'buf help recipe'.")
-    exit()
 
 def line_has_inequal_contents_in_recipe_file(line_number_zero_indexed: float):
-    print("Invalid line length: line " + str(line_number_zero_indexed + 1) + " contains an inequal number of concentrations and chemical names.")
-    exit()
+    raise exceptions.FileFormatError("Invalid line length: line " + str(line_number_zero_indexed + 1) + " contains an inequal number of concentrations and chemical names.")
 
 def spaces_in_recipe_name(recipe_name: str):
-    print("Invalid recipe name: '" + str(recipe_name) + "' cannot contain spaces.")
-    exit()
+    raise exceptions.InvalidRecipeError("Invalid recipe name: '" + str(recipe_name) + "' cannot contain spaces.")
 
 # --------------------------------------------------------------------------------
 # -----------------------------------MAKE ERRORS----------------------------------
 # --------------------------------------------------------------------------------
 
 def invalid_buffer_volume_unit(symbol: str):
-    print("Invalid volume unit: '" + str(symbol) + "' is not a valid unit of volume. Valid units are:", *unit.volume_units.get_symbols())
-    exit()
+    raise exceptions.InvalidVolumeError("Invalid volume unit: '" + str(symbol) + "' is not a valid unit of volume. Valid units are: " +
+                                        " ".join(unit.volume_units.get_symbols()))
 
 def non_number_buffer_volume_magnitude(magnitude: str):
-    print("Invalid volume: '" + str(magnitude) + "' is not a valid number.")
-    exit()
+    raise exceptions.InvalidVolumeError("Invalid volume: '" + str(magnitude) + "' is not a valid number.")
 
 def non_positive_buffer_volume_magnitude(magnitude: float):
-    print("Invalid volume: '" + str(magnitude) + "' is not greater than 0.")
-    exit()
+    raise exceptions.InvalidVolumeError("Invalid volume: '" + str(magnitude) + "' is not greater than 0.")
+
+def invalid_order_line(line_number_zero_indexed: int, erroneous_line: str):
+    raise exceptions.FileFormatError("Invalid order: line " + str(line_number_zero_indexed + 1) + " ('" + str(erroneous_line) + "') must contain a volume followed "
+          "by a recipe name, separated by a comma. For more information, see 'buf help make'.")
+
+def numpy_not_installed(command: str):
+    raise exceptions.DependencyError("NumPy not installed: '" + str(command) + "' requires NumPy. To install it, use 'pip install buf[batch]'.")
 
 # --------------------------------------------------------------------------------
 # -----------------------------------HELP ERRORS----------------------------------
 # --------------------------------------------------------------------------------
 
 def subcommand_not_found(subcommand: str):
-    print("Subcommand not found: '" + str(subcommand) + "' is not a valid subcommand.",
+    raise exceptions.SubcommandNotFoundError("Subcommand not found: '" + str(subcommand) + "' is not a valid subcommand. "
           "For an overview of all subcommands, see 'buf help'.")
-    exit()
 
 # --------------------------------------------------------------------------------
 # -----------------------------------UNIT ERRORS----------------------------------
 # --------------------------------------------------------------------------------
 
 def unit_not_in_ladder(symbol: str):
-    print("Invalid unit: '" + str(symbol) + "' not in ladder.")
-    exit()
+    raise exceptions.UnitError("Invalid unit: '" + str(symbol) + "' not in ladder.")
 
 def unit_not_in_any_ladder(symbol: str):
-    print("Invalid unit: '" + str(symbol) + "' not in any unit ladder.")
-    exit()
+    raise exceptions.UnitError("Invalid unit: '" + str(symbol) + "' not in any unit ladder.")
+
+def unit_not_in_registry(symbol: str):
+    raise exceptions.UnitError("Invalid unit: '" + str(symbol) + "' is not a known unit.")
+
+def incompatible_units(from_symbol: str, to_symbol: str):
+    raise exceptions.UnitError("Incompatible units: cannot convert from '" + str(from_symbol) + "' to '" + str(to_symbol) + "'.")
 
 def no_greater_unit_in_ladder(symbol: str):
-    print("No greater unit: '" + str(symbol) + "' is the largest unit in its ladder.")
-    exit()
+    raise exceptions.UnitError("No greater unit: '" + str(symbol) + "' is the largest unit in its ladder.")
 
 def no_lesser_unit_in_ladder(symbol: str):
-    print("No lesser unit: '" + str(symbol) + "' is the smallest unit in its ladder.")
-    exit()
+    raise exceptions.UnitError("No lesser unit: '" + str(symbol) + "' is the smallest unit in its ladder.")
 
 # --------------------------------------------------------------------------------
 # ------------------------------FILE HANDLING ERRORS------------------------------
 # --------------------------------------------------------------------------------
 
 def file_not_found(file_name: str):
-    print("File not found: '" + str(file_name) + "' could not be located.")
-    exit()
+    raise exceptions.InputFileError("File not found: '" + str(file_name) + "' could not be located.")
 
 def file_read_error(file_name: str):
-    print("File read error: '" + str(file_name) + "' could not be read.")
-    exit()
+    raise exceptions.InputFileError("File read error: '" + str(file_name) + "' could not be read.")
 
 def duplicate_file_entry(name: str):
-    print("Duplicate file entry: '" + str(name) + "' already used earlier in the file.")
-    exit()
+    raise exceptions.FileFormatError("Duplicate file entry: '" + str(name) + "' already used earlier in the file.")
+
+def duplicate_entry_across_files(name: str, other_file_name: str):
+    raise exceptions.FileFormatError("Duplicate file entry: '" + str(name) + "' already used in '" + str(other_file_name) + "'.")
+
+def invalid_files(error_lines: str, errors: list):
+    raise exceptions.InvalidFilesError(str(error_lines), errors)
+
+def database_already_exists(database_file: str):
+    raise exceptions.LibraryError("Database already exists: your libraries have already been migrated to '" + str(database_file) + "'.")
+
+def library_locked(file_name: str):
+    raise exceptions.LibraryError("Library busy: '" + str(file_name) + "' is being changed by another buf process. Please try again shortly.")
+
+def lock_file_error(lock_file_name: str, reason: str):
+    raise exceptions.LibraryError("Library not accessible: the lock file '" + str(lock_file_name) + "' could not be opened (" +
+                                  str(reason) + "). Check that you have permission to use the library directory.")
+
+def daemon_not_supported():
+    raise exceptions.DaemonError("Daemon not supported: 'buf serve' requires Unix domain sockets, which are not available on this system.")
+
+def daemon_already_running(socket_file: str):
+    raise exceptions.DaemonError("Daemon already running: a buf daemon is already listening on '" + str(socket_file) + "'.")
+
+def invalid_port(port: str):
+    raise exceptions.DaemonError("Invalid port: '" + str(port) + "' is not a valid port number (between 0 and 65535).")
+
+def invalid_request(reason: str):
+    raise exceptions.InvalidRequestError("Invalid request: " + str(reason))
+
+def invalid_page_option(option_name: str, value: str):
+    raise exceptions.InvalidOptionError("Invalid option: '" + str(option_name) + "' must be a whole number of at least 0, not '" + str(value) + "'.")
+
+def invalid_format(format_name: str):
+    raise exceptions.InvalidOptionError("Invalid format: '" + str(format_name) + "' is not a valid format. Valid formats are json, csv and ndjson.")
 
 def library_load_error(lower_case_library_name: str):
-    print("Library load error: unable to load " + str(lower_case_library_name) + " library. Possible file corruption.")
-    exit()
-
-# Data type refers to chemicals or recipes.
-def add_from_file_termination(line_number_zero_indexed: str, erroneous_line: str, upper_case_data_type: str):
-    print("Error encountered on line " + str(line_number_zero_indexed + 1) + ": '" + str(erroneous_line) + "'. " + str(upper_case_data_type) +
-          " specified in file not added to library.")
-    exit()
\ No newline at end of file
+    raise exceptions.LibraryError("Library load error: unable to load " + str(lower_case_library_name) + " library. Possible file corruption.")
+
+# Data type refers to chemicals or recipes. The file name is given when adding from several files at once. The cause is the
+# error that the line led to, whose message is shown first.
+def add_from_file_termination(line_number_zero_indexed: str, erroneous_line: str, upper_case_data_type: str, file_name: str = None,
+                              cause: Exception = None):
+    message = ""
+    if isinstance(cause, exceptions.BufError):
+        message = str(cause) + "\n"
+
+    if file_name == None:
+        message += ("Error encountered on line " + str(line_number_zero_indexed + 1) + ": '" + str(erroneous_line) + "'. " + str(upper_case_data_type) +
+                    " specified in file not added to library.")
+    else:
+        message += ("Error encountered on line " + str(line_number_zero_indexed + 1) + " of '" + str(file_name) + "': '" + str(erroneous_line) + "'. " +
+                    str(upper_case_data_type) + " specified in files not added to library.")
+
+    raise exceptions.FileFormatError(message)
@@ -0,0 +1,101 @@
+# File name: exceptions.py
+# Author: Jordan Juravsky
+# Date created: 18-10-2026
+
+"""The exceptions raised by buf when given invalid input, or when a command can't be carried out. The message of each
+exception describes the problem to the user; on the command line, the message is shown and buf exits (see
+buf.main.run_command), while programs using buf in-process (see buf.api) can catch these exceptions instead.
+
+Every exception is a subclass of BufError, so catching BufError catches any error caused by the input given to buf."""
+
+class BufError(Exception):
+    """Base class of the exceptions raised by buf. The message describes the error to the user."""
+
+# --------------------------------------------------------------------------------
+# -----------------------------------CHEMICAL ERRORS------------------------------
+# --------------------------------------------------------------------------------
+
+class ChemicalError(BufError):
+    """Raised when a chemical can't be looked up, added or changed."""
+
+class ChemicalNotFoundError(ChemicalError, LookupError):
+    """Raised when a chemical name does not exist in the chemical library."""
+
+class ChemicalExistsError(ChemicalError):
+    """Raised when adding a chemical name that already exists in the chemical library."""
+
+class InvalidChemicalError(ChemicalError, ValueError):
+    """Raised when a chemical's molar mass or names are invalid."""
+
+# --------------------------------------------------------------------------------
+# ---------------------------------RECIPE ERRORS----------------------------------
+# --------------------------------------------------------------------------------
+
+class RecipeError(BufError):
+    """Raised when a recipe can't be looked up, added or changed."""
+
+class RecipeNotFoundError(RecipeError, LookupError):
+    """Raised when a recipe name does not exist in the recipe library."""
+
+class RecipeExistsError(RecipeError):
+    """Raised when adding a recipe name that already exists in the recipe library."""
+
+class InvalidRecipeError(RecipeError, ValueError):
+    """Raised when a recipe's name or contents (e.g. a concentration) are invalid."""
+
+# --------------------------------------------------------------------------------
+# -----------------------------------MAKE ERRORS----------------------------------
+# --------------------------------------------------------------------------------
+
+class InvalidVolumeError(BufError, ValueError):
+    """Raised when the volume of buffer/solution to make is invalid."""
+
+# --------------------------------------------------------------------------------
+# -----------------------------------UNIT ERRORS----------------------------------
+# --------------------------------------------------------------------------------
+
+class UnitError(BufError, ValueError):
+    """Raised when a unit is unknown, or can't be converted into another unit."""
+
+# --------------------------------------------------------------------------------
+# ------------------------------FILE HANDLING ERRORS------------------------------
+# --------------------------------------------------------------------------------
+
+class InputFileError(BufError, OSError):
+    """Raised when a file given to buf (such as a list of chemicals to add) can't be found or read."""
+
+class FileFormatError(BufError, ValueError):
+    """Raised when a file given to buf contains an invalid line."""
+
+class InvalidFilesError(FileFormatError):
+    """Raised when every error in the files being added is reported at once (see 'buf help chemical'). The message lists
+    the errors, and errors holds each as a (file_name, line_number, column, reason) tuple, where line_number is zero
+    indexed and column is one indexed (or None, if the error concerns the whole line)."""
+    def __init__(self, message: str, errors: list):
+        super().__init__(message)
+        self.errors = errors
+
+    def __reduce__(self):
+        return (InvalidFilesError, (str(self), self.errors))
+
+# --------------------------------------------------------------------------------
+# ----------------------------------OTHER ERRORS----------------------------------
+# --------------------------------------------------------------------------------
+
+class LibraryError(BufError):
+    """Raised when a library can't be read or changed (e.g. because another buf process is changing it)."""
+
+class DaemonError(BufError):
+    """Raised when the buf daemon (or the HTTP service, see 'buf help http') can't be started."""
+
+class InvalidRequestError(BufError, ValueError):
+    """Raised when a request sent to the HTTP service (see 'buf help http') is malformed."""
+
+class InvalidOptionError(BufError, ValueError):
+    """Raised when a command line option is given an invalid value (e.g. a negative '--limit')."""
+
+class SubcommandNotFoundError(BufError, LookupError):
+    """Raised when asking for help on a subcommand that doesn't exist."""
+
+class DependencyError(BufError, ImportError):
+    """Raised when a command needs an optional dependency that isn't installed."""
@@ -6,6 +6,20 @@
 
 import sys
 import os
+import time
+import json
+import hashlib
+import struct
+from contextlib import contextmanager, ExitStack
+from itertools import islice
+from typing import Sequence
+from buf import error_messages, exceptions
+
+try:
+    import fcntl
+except ImportError:
+    # fcntl is unavailable on Windows, where libraries are used without locking.
+    fcntl = None
 
 # Library directory is relative to sys.prefix, so that each virtual environment will have it's own library.
 # This directory is not created when the package is installed because upgrading buf would then reset one's library.
@@ -48,6 +62,690 @@ def fetch_library_file_path(file_name: str):
 
     return file_path
 
+def ensure_library_file_exists(file_path: str):
+    """Creates a library file (and the library directory) if it is in the library directory and doesn't exist yet.
+    Library files are created the first time they are used, rather than when buf is imported."""
+    if os.path.dirname(file_path) == library_dir and os.path.exists(file_path) == False:
+        fetch_library_file_path(os.path.basename(file_path))
+
+def write_file_atomically(file_path: str, contents: bytes, durable: bool = False):
+    """Writes contents to a uniquely named temporary file next to file_path, and then moves it into place. Readers
+    therefore never see a partially written file, and two processes writing the same file can't interleave their writes.
+    If durable is True, the new contents are flushed to disk before this function returns, so that a crash can never
+    leave file_path truncated or empty."""
+    import tempfile
+    file_descriptor, temp_file_path = tempfile.mkstemp(dir=os.path.dirname(file_path) or ".", prefix=os.path.basename(file_path) + ".")
+    try:
+        with os.fdopen(file_descriptor, "wb") as file:
+            file.write(contents)
+            if durable:
+                file.flush()
+                os.fsync(file.fileno())
+
+        # mkstemp creates files that only their owner can read, so the permissions of the file being replaced are kept,
+        # and new files are given the permissions that open() would give them, as the library files are.
+        if os.path.exists(file_path):
+            os.chmod(temp_file_path, os.stat(file_path).st_mode & 0o777)
+        else:
+            os.chmod(temp_file_path, 0o666 & ~get_umask())
+
+        os.replace(temp_file_path, file_path)
+    except:
+        os.remove(temp_file_path)
+        raise
+
+    if durable:
+        fsync_directory(os.path.dirname(file_path) or ".")
+
+# The process's umask, read the first time it is needed (see get_umask).
+umask = None
+
+def get_umask():
+    """Returns the process's umask. The umask can only be read by setting it, so it is set back straight away."""
+    global umask
+    if umask == None:
+        umask = os.umask(0)
+        os.umask(umask)
+    return umask
+
+def fsync_directory(directory: str):
+    """Flushes a directory's entries to disk, so that a file that was just renamed into it survives a crash."""
+    if hasattr(os, "O_DIRECTORY") == False:
+        # Directories can't be opened (and don't need to be flushed) on Windows.
+        return
+
+    directory_descriptor = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(directory_descriptor)
+    finally:
+        os.close(directory_descriptor)
+
+# --------------------------------------------------------------------------------
+# ----------------------------------LIBRARY LOCKS---------------------------------
+# --------------------------------------------------------------------------------
+
+# Several buf processes may use the same library at once. Each library file has a lock file next to it: processes
+# that only read a library hold a shared lock on it (so any number of them can run in parallel), while processes
+# that change a library hold an exclusive lock. Locks are advisory, and only guard against other buf processes.
+
+# Number of seconds to wait for a lock before giving up.
+lock_timeout = 10
+lock_poll_interval = 0.05
+
+# Maps the path of each library file this process holds a lock on to [lock file descriptor, is_exclusive, depth], so
+# that functions holding a lock can call other functions that take the same lock.
+held_locks = {}
+
+def fetch_lock_file_path(file_path: str):
+    """Gets the path to the lock file of the library file passed as an argument."""
+    return file_path + ".lock"
+
+def acquire_lock(file_descriptor: int, file_path: str, exclusive: bool):
+    """Locks an open lock file, waiting up to lock_timeout seconds for other processes to release it."""
+    operation = (fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH) | fcntl.LOCK_NB
+    deadline = time.monotonic() + lock_timeout
+
+    while True:
+        try:
+            fcntl.flock(file_descriptor, operation)
+            return
+        except BlockingIOError:
+            if time.monotonic() >= deadline:
+                error_messages.library_locked(file_path)
+            time.sleep(lock_poll_interval)
+
+def open_lock_file(file_path: str):
+    """Opens (creating, if need be) the lock file of a library file, returning its file descriptor. Lock files are opened
+    read only, since flock doesn't need write access, and are created writable by everyone, so that every user sharing
+    a library (e.g. on a shared workstation) can open them, whoever created them."""
+    lock_file_path = fetch_lock_file_path(file_path)
+
+    try:
+        try:
+            file_descriptor = os.open(lock_file_path, os.O_RDONLY | os.O_CREAT | os.O_EXCL, 0o666)
+        except FileExistsError:
+            return os.open(lock_file_path, os.O_RDONLY)
+
+        try:
+            # The umask would otherwise take away other users' access.
+            os.fchmod(file_descriptor, 0o666)
+        except OSError:
+            os.close(file_descriptor)
+            raise
+        return file_descriptor
+    except OSError as error:
+        error_messages.lock_file_error(lock_file_path, error.strerror)
+
+@contextmanager
+def lock_library(file_path: str, exclusive: bool = False):
+    """Context manager that holds a shared (or, if exclusive is True, an exclusive) lock on a library file. Since every
+    use of a library file is made while holding its lock, this also creates the library file if it doesn't exist yet."""
+    if file_path not in held_locks:
+        ensure_library_file_exists(file_path)
+
+    if fcntl == None:
+        yield
+        return
+
+    if file_path in held_locks:
+        held_lock = held_locks[file_path]
+        if exclusive and not held_lock[1]:
+            acquire_lock(held_lock[0], file_path, exclusive=True)
+            held_lock[1] = True
+        held_lock[2] += 1
+        try:
+            yield
+        finally:
+            held_lock[2] -= 1
+        return
+
+    file_descriptor = open_lock_file(file_path)
+    try:
+        acquire_lock(file_descriptor, file_path, exclusive)
+        held_locks[file_path] = [file_descriptor, exclusive, 1]
+        yield
+    finally:
+        held_locks.pop(file_path, None)
+        # Closing the lock file releases the lock.
+        os.close(file_descriptor)
+
+# --------------------------------------------------------------------------------
+# ----------------------------------LIBRARY CACHES--------------------------------
+# --------------------------------------------------------------------------------
+
+# Parsing a library file validates every entry in it, which is slow for large libraries. Instead, the entries of the
+# parsed library are written as JSON (plain lists of strings and numbers, so that reading a cache never runs any code)
+# to a cache file next to the library file, alongside the size and modification time of the library file and a hash of
+# its contents. As long as the library file is unchanged, the library is built straight from the cache's entries. The
+# size and modification time are checked first, so that an unchanged library file isn't even read; the file is only
+# read and hashed when they differ (e.g. when the file was rewritten with the same contents).
+
+cache_format = "buf-cache-1"
+
+def fetch_cache_file_path(file_path: str):
+    """Gets the path to the cache file of the library file passed as an argument."""
+    return file_path + ".cache"
+
+def hash_file_contents(file_contents: str):
+    """Returns a hash of the contents of a library file."""
+    return hashlib.blake2b(file_contents.encode("utf-8"), digest_size=16).hexdigest()
+
+def load_cached_library(file_path: str, from_entries):
+    """Returns the library built by from_entries (a function taking the list of entries stored in the cache file of
+    file_path), or None if there is no cache, or the library file has changed since the cache was written."""
+    try:
+        with open(fetch_cache_file_path(file_path), "r") as file:
+            format_name, signature, contents_hash, entries = json.load(file)
+
+        if format_name != cache_format:
+            return None
+
+        if tuple(signature) != get_file_signature(file_path):
+            with open(file_path, "r") as file:
+                if hash_file_contents(file.read()) != contents_hash:
+                    return None
+
+        return from_entries(entries)
+    except Exception:
+        # A missing, unreadable or corrupt cache is simply rebuilt.
+        return None
+
+def cache_library(file_path: str, signature, file_contents: str, entries: list):
+    """Writes the entries of a parsed library (as lists of strings and numbers), along with the signature of the library
+    file (see get_file_signature) and a hash of the contents it was parsed from, to the cache file of file_path. The
+    signature must be taken before the contents are read, so that a change made in between is noticed."""
+    try:
+        write_file_atomically(fetch_cache_file_path(file_path),
+                              json.dumps([cache_format, signature, hash_file_contents(file_contents), entries]).encode("utf-8"))
+    except OSError:
+        # Caching is an optimisation, so being unable to write the cache (e.g. in a read-only library) is not an error.
+        pass
+
+# --------------------------------------------------------------------------------
+# ----------------------------------LIBRARY INDEXES-------------------------------
+# --------------------------------------------------------------------------------
+
+# To look up a single chemical or recipe without reading the whole library file, each library file has an index file
+# next to it mapping names to the byte offset of the line that defines them. The index is an on-disk hash table, so a
+# lookup only reads the index header, a slot or two, and the line itself, however large the library gets.
+#
+# Index file layout: a header (magic bytes, then the size and modification time of the library file when the index
+# was last updated, the number of slots and the number of used slots), followed by fixed-size slots, each of which
+# holds a hash of a name and one more than the offset of its line (so that an empty slot is all zeroes).
+
+index_magic = b"BUFINDEX"
+index_header = struct.Struct("<8sQQQQ")
+index_slot = struct.Struct("<QQ")
+index_min_slots = 64
+index_max_load = 0.7
+
+def fetch_index_file_path(file_path: str):
+    """Gets the path to the index file of the library file passed as an argument."""
+    return file_path + ".index"
+
+def get_file_signature(file_path: str):
+    """Returns the size and modification time of a file, used to tell whether a file has changed since it was indexed."""
+    stat = os.stat(file_path)
+    return stat.st_size, stat.st_mtime_ns
+
+def hash_name(name: str):
+    """Returns a 64 bit hash of a name that, unlike hash(), is the same in every Python process."""
+    return int.from_bytes(hashlib.blake2b(name.encode("utf-8"), digest_size=8).digest(), "little")
+
+def insert_into_index(index_file, num_slots: int, name: str, offset: int):
+    """Inserts a name into an open index file using linear probing. Returns False if the name was already in the index."""
+    key = hash_name(name)
+    slot = key % num_slots
+    while True:
+        index_file.seek(index_header.size + slot * index_slot.size)
+        slot_key, slot_value = index_slot.unpack(index_file.read(index_slot.size))
+        if slot_value == 0:
+            index_file.seek(index_header.size + slot * index_slot.size)
+            index_file.write(index_slot.pack(key, offset + 1))
+            return True
+        if slot_key == key:
+            return False
+        slot = (slot + 1) % num_slots
+
+def build_index(file_path: str, line_names):
+    """(Re)builds the index of a library file from scratch. line_names is a function that is given the words on a line
+    of the library file and returns the names that line defines."""
+    signature = get_file_signature(file_path)
+
+    # The library file is read twice (once to count its names, and once to index them) rather than held in memory.
+    num_names = sum(1 for entry in read_names_from_offset(file_path, 0, line_names))
+
+    num_slots = max(index_min_slots, int(num_names / index_max_load) * 2)
+
+    # The slots are filled in memory (after space for the header) and then written out in one go, rather than one slot
+    # at a time.
+    contents = bytearray(index_header.size + num_slots * index_slot.size)
+    num_used_slots = 0
+    for name, offset in read_names_from_offset(file_path, 0, line_names):
+        key = hash_name(name)
+        slot = key % num_slots
+        while True:
+            slot_key, slot_value = index_slot.unpack_from(contents, index_header.size + slot * index_slot.size)
+            if slot_value == 0:
+                index_slot.pack_into(contents, index_header.size + slot * index_slot.size, key, offset + 1)
+                num_used_slots += 1
+                break
+            if slot_key == key:
+                break
+            slot = (slot + 1) % num_slots
+
+    index_header.pack_into(contents, 0, index_magic, signature[0], signature[1], num_slots, num_used_slots)
+    write_file_atomically(fetch_index_file_path(file_path), contents)
+
+def read_index_header(file_path: str):
+    """Returns the header of a library file's index as a tuple of (signature, num_slots, num_used_slots), or None if the
+    index does not exist or is corrupt."""
+    try:
+        with open(fetch_index_file_path(file_path), "rb") as index_file:
+            magic, size, mtime, num_slots, num_used_slots = index_header.unpack(index_file.read(index_header.size))
+    except (OSError, struct.error):
+        return None
+
+    if magic != index_magic:
+        return None
+
+    return (size, mtime), num_slots, num_used_slots
+
+def find_indexed_line(file_path: str, name: str, line_names):
+    """Returns the line of a library file that defines the given name, or None if no line does. The index of the
+    library file is rebuilt first if the library file has changed since it was last indexed."""
+    return find_indexed_lines(file_path, [name], line_names).get(name)
+
+def find_indexed_lines(file_path: str, names, line_names):
+    """Returns a dictionary mapping each of the given names that is defined in a library file to the line that defines
+    it. The index and library file are each opened once, however many names are looked up. The index of the library
+    file is rebuilt first if the library file has changed since it was last indexed."""
+    for attempt in range(2):
+        header = read_index_header(file_path)
+
+        if header == None or header[0] != get_file_signature(file_path):
+            build_index(file_path, line_names)
+            header = read_index_header(file_path)
+
+        signature, num_slots, num_used_slots = header
+        lines = {}
+        index_is_stale = False
+
+        with open(fetch_index_file_path(file_path), "rb") as index_file, open(file_path, "rb") as file:
+            for name in names:
+                key = hash_name(name)
+                slot = key % num_slots
+
+                while True:
+                    index_file.seek(index_header.size + slot * index_slot.size)
+                    slot_key, slot_value = index_slot.unpack(index_file.read(index_slot.size))
+
+                    if slot_value == 0 or slot_key == key:
+                        break
+                    slot = (slot + 1) % num_slots
+
+                if slot_value == 0:
+                    continue
+
+                file.seek(slot_value - 1)
+                line = file.readline().decode("utf-8")
+
+                if name in line_names(line.split()):
+                    lines[name] = line
+                else:
+                    index_is_stale = True
+                    break
+
+        if index_is_stale == False:
+            return lines
+
+        # The index points at a line that doesn't define a name, so it is out of date; rebuild it and try again.
+        build_index(file_path, line_names)
+
+    return lines
+
+def index_appended_lines(file_path: str, signature_before_append, line_names):
+    """Adds the lines appended to a library file to its index, given the signature of the file from before the lines
+    were appended. If the index was already out of date, it is left to be rebuilt on the next lookup."""
+    header = read_index_header(file_path)
+
+    if header == None or header[0] != signature_before_append:
+        return
+
+    signature, num_slots, num_used_slots = header
+
+    # The appended lines are read twice (once to count them, and once to index them) rather than held in memory, as
+    # there may be a great many of them.
+    num_new_names = sum(1 for entry in read_names_from_offset(file_path, signature_before_append[0], line_names))
+
+    if num_used_slots + num_new_names > num_slots * index_max_load:
+        build_index(file_path, line_names)
+        return
+
+    with open(fetch_index_file_path(file_path), "rb+") as index_file:
+        for name, offset in read_names_from_offset(file_path, signature_before_append[0], line_names):
+            if insert_into_index(index_file, num_slots, name, offset):
+                num_used_slots += 1
+
+        new_signature = get_file_signature(file_path)
+        index_file.seek(0)
+        index_file.write(index_header.pack(index_magic, new_signature[0], new_signature[1], num_slots, num_used_slots))
+
+def read_names_from_offset(file_path: str, offset: int, line_names):
+    """Yields a (name, offset) tuple for each name defined on the lines of a library file that start at or after offset."""
+    with open(file_path, "rb") as file:
+        file.seek(offset)
+        for line in file:
+            for name in line_names(line.decode("utf-8").split()):
+                yield name, offset
+            offset += len(line)
+
+# --------------------------------------------------------------------------------
+# ---------------------------------LIBRARY JOURNALS-------------------------------
+# --------------------------------------------------------------------------------
+
+# Changes to a library (such as nicknaming or deleting a chemical) are appended as records to a journal file next to
+# the library file, instead of rewriting the whole library file each time. What each record means is up to the module
+# that owns the library; this module only stores them, one record per line.
+
+# Size (in bytes) past which a journal is folded back into its library file.
+journal_compaction_threshold = 64 * 1024
+
+def fetch_journal_file_path(file_path: str):
+    """Gets the path to the journal file of the library file passed as an argument."""
+    return file_path + ".journal"
+
+# Maps library file paths to the journal records that are waiting to be written as part of a group commit.
+pending_journal_records = {}
+
+@contextmanager
+def group_commit(*file_paths: str):
+    """Context manager that groups changes to the given library files into a single durable write. Exclusive locks on
+    the library files are held throughout, and the journal records written to them are buffered (while still being
+    visible to read_journal in this process) and flushed to disk together on exit. If an error occurs (such as a
+    BufError caused by invalid input), none of the buffered changes are written."""
+    with ExitStack() as stack:
+        new_file_paths = [file_path for file_path in file_paths if file_path not in pending_journal_records]
+
+        for file_path in new_file_paths:
+            stack.enter_context(lock_library(file_path, exclusive=True))
+            pending_journal_records[file_path] = []
+
+        try:
+            yield
+            for file_path in new_file_paths:
+                flush_journal_records(file_path, pending_journal_records[file_path])
+        finally:
+            for file_path in new_file_paths:
+                del pending_journal_records[file_path]
+
+def in_group_commit(file_path: str):
+    """Checks whether changes to a library file are currently being grouped (see group_commit). Within a group commit,
+    every change goes through the buffered journal, and the library file itself is left untouched (it isn't appended to
+    or compacted), so that the group's changes can still be discarded."""
+    return file_path in pending_journal_records
+
+def journal_is_empty(file_path: str):
+    """Checks whether the journal of a library file has no records in it."""
+    # Within a group commit, every change goes through the journal, so that it can be discarded if the group fails.
+    if in_group_commit(file_path):
+        return False
+
+    journal_file_path = fetch_journal_file_path(file_path)
+    return os.path.exists(journal_file_path) == False or os.path.getsize(journal_file_path) == 0
+
+def journal_needs_compaction(file_path: str):
+    """Checks whether the journal of a library file has grown past journal_compaction_threshold."""
+    # Compacting during a group commit would fold in buffered records that might still be discarded.
+    if in_group_commit(file_path):
+        return False
+
+    journal_file_path = fetch_journal_file_path(file_path)
+    return os.path.exists(journal_file_path) and os.path.getsize(journal_file_path) > journal_compaction_threshold
+
+def append_journal_records(file_path: str, records):
+    """Appends records (strings of space separated words) to the journal of a library file. Within a group commit
+    (see group_commit), the records are buffered until the group commit ends."""
+    if file_path in pending_journal_records:
+        pending_journal_records[file_path] += records
+    else:
+        flush_journal_records(file_path, records)
+
+def flush_journal_records(file_path: str, records):
+    """Durably appends records to the journal of a library file, using a single write."""
+    if len(records) == 0:
+        return
+
+    with open(fetch_journal_file_path(file_path), "a") as file:
+        file.write("".join(record + "\n" for record in records))
+        file.flush()
+        os.fsync(file.fileno())
+
+def read_journal(file_path: str):
+    """Returns the records in the journal of a library file (including those buffered by a group commit), each as a
+    list of words."""
+    pending_records = [record.split() for record in pending_journal_records.get(file_path, [])]
+
+    journal_file_path = fetch_journal_file_path(file_path)
+    if os.path.exists(journal_file_path) == False or os.path.getsize(journal_file_path) == 0:
+        return pending_records
+
+    with open(journal_file_path, "r") as file:
+        return [line.split() for line in file if line.strip()] + pending_records
+
+def clear_journal(file_path: str):
+    """Deletes the journal of a library file, once its records have been folded into the library file."""
+    journal_file_path = fetch_journal_file_path(file_path)
+    if os.path.exists(journal_file_path):
+        os.remove(journal_file_path)
+
+# --------------------------------------------------------------------------------
+# -------------------------------RESIDENT LIBRARIES-------------------------------
+# --------------------------------------------------------------------------------
+
+# When buf is running as a daemon (see 'buf help serve'), parsed libraries are kept in memory between commands. This
+# maps the path of each library file to a tuple (signature, library), where signature describes the files the library
+# was read from (see get_resident_signature). Libraries are only kept in memory once this is set to a dictionary.
+resident_libraries = None
+
+def keep_libraries_in_memory():
+    """Starts keeping parsed libraries in memory between calls to load_resident_library."""
+    global resident_libraries
+    resident_libraries = {}
+
+def get_resident_signature(file_paths: Sequence[str]):
+    """Returns the sizes and modification times of the given files (None for any that don't exist). If any of the files
+    a library was read from changes, so does its signature."""
+    return tuple(get_file_signature(file_path) if os.path.exists(file_path) else None for file_path in file_paths)
+
+def load_resident_library(file_paths: Sequence[str], read_library):
+    """Returns the library read from the given files (the first of which is the library file itself) by calling
+    read_library. If libraries are being kept in memory, the library is only read again once one of the files has
+    changed since it was last read; otherwise, read_library is always called."""
+    if resident_libraries == None:
+        return read_library()
+
+    # The signature is taken before reading, so that a change made while the library is being read is picked up next time.
+    signature = get_resident_signature(file_paths)
+
+    if file_paths[0] in resident_libraries and resident_libraries[file_paths[0]][0] == signature:
+        return resident_libraries[file_paths[0]][1]
+
+    library = read_library()
+    resident_libraries[file_paths[0]] = (signature, library)
+    return library
+
+# --------------------------------------------------------------------------------
+# -----------------------------------BULK IMPORTS---------------------------------
+# --------------------------------------------------------------------------------
+
+# Chemicals and recipes are added from files in two passes. First, each file is checked on its own for lines that are
+# invalid no matter what is in one's libraries, and its valid lines are written to a staged file (see stage_files); when
+# several files are given, they are checked in parallel worker processes. Then, the staged lines of every file are
+# checked against one's libraries and each other, and only once every line is valid are they added to the library in
+# a single write. Files are read in batches of lines, so that files of any size can be added.
+
+# Number of lines read from a file at a time when adding chemicals or recipes from it.
+import_batch_size = 10000
+
+# Past this many names, adding chemicals or recipes from files reports how many were added rather than listing them all.
+max_listed_names = 1000
+
+def expand_file_names(file_names: Sequence[str]):
+    """Expands any glob patterns (such as 'lists/*.txt') in file_names, so that file names can be given as patterns even
+    where the shell doesn't expand them. Patterns that match no files are kept as they are."""
+    import glob
+    expanded_file_names = []
+    for file_name in file_names:
+        expanded_file_names += sorted(glob.glob(file_name)) or [file_name]
+    return expanded_file_names
+
+def is_file_name(argument: str):
+    """Checks whether a command line argument names at least one existing file (either as a path, or as a glob pattern)."""
+    import glob
+    return len(glob.glob(argument)) > 0
+
+@contextmanager
+def stage_files(check_file, file_names: Sequence[str], errors: list = None):
+    """Context manager that checks each of file_names by calling check_file(file_name, staged_file_path, errors), which
+    writes each valid line of the file to the staged file (see stage_line). Yields the paths of the staged files, in the
+    same order as file_names, and removes them on exit. When there are several files, they are checked in parallel
+    worker processes; if any file is invalid, the error of the first invalid file is raised. If errors is a list, every
+    error found in the files is added to it instead (see run_line_checks)."""
+    import tempfile
+    staged_file_paths = []
+
+    try:
+        for file_name in file_names:
+            file_descriptor, staged_file_path = tempfile.mkstemp(prefix="buf-import-")
+            os.close(file_descriptor)
+            staged_file_paths.append(staged_file_path)
+
+        if len(file_names) == 1:
+            check_file(file_names[0], staged_file_paths[0], errors)
+        else:
+            from concurrent.futures import ProcessPoolExecutor
+            with ProcessPoolExecutor(max_workers=min(len(file_names), os.cpu_count() or 1)) as executor:
+                outcomes = list(executor.map(run_file_check, [check_file] * len(file_names), file_names, staged_file_paths,
+                                             [errors != None] * len(file_names)))
+
+            for error, file_errors in outcomes:
+                if error != None:
+                    raise error
+                if file_errors != None:
+                    errors += file_errors
+
+        yield staged_file_paths
+    finally:
+        for staged_file_path in staged_file_paths:
+            os.remove(staged_file_path)
+
+def run_file_check(check_file, file_name: str, staged_file_path: str, report_all: bool):
+    """Calls check_file in a worker process (see stage_files). Returns a tuple of the error raised if the file was invalid
+    (or None if it was valid), and the list of errors found in the file if report_all is True (or None)."""
+    errors = [] if report_all else None
+
+    try:
+        check_file(file_name, staged_file_path, errors)
+    except exceptions.BufError as error:
+        return error, errors
+
+    return None, errors
+
+def run_line_checks(checks, file_name: str, line_number: int, line: str, errors: list = None):
+    """Runs the checks for a line of a file being added, each given as a tuple of (word_index, function, arguments), where
+    word_index is the index of the word being checked on the line (or None, if the check concerns the whole line). Each
+    function raises a BufError if its check fails.
+
+    If errors is None, the checks are simply run in turn, so the first failure is raised. Otherwise every check is run,
+    and each failure is added to errors as a (file_name, line_number, column, reason) tuple instead, where reason is
+    the error's message. Returns whether every check passed."""
+    if errors == None:
+        for word_index, function, arguments in checks:
+            function(*arguments)
+        return True
+
+    passed = True
+
+    for word_index, function, arguments in checks:
+        try:
+            function(*arguments)
+        except exceptions.BufError as error:
+            errors.append((file_name, line_number, get_word_column(line, word_index), str(error)))
+            passed = False
+
+    return passed
+
+def get_word_column(line: str, word_index: int):
+    """Returns the (one indexed) column at which the word with the given index starts on a line, or None if word_index
+    is None."""
+    if word_index == None:
+        return None
+
+    column = 0
+    for index, word in enumerate(line.split()):
+        column = line.index(word, column)
+        if index == word_index:
+            return column + 1
+        column += len(word)
+
+def report_import_errors(errors: list, file_names: Sequence[str], upper_case_data_type: str):
+    """Raises an InvalidFilesError listing every error found in the files being added, one JSON object per line (with
+    the keys 'file', 'line', 'column' and 'reason'), in the order they appear in the files. A summary is written to
+    stderr, so that it doesn't get mixed in with the listed errors. Data type refers to chemicals or recipes."""
+    errors.sort(key=lambda error: (file_names.index(error[0]), error[1], error[2] or 0))
+
+    error_lines = "\n".join(json.dumps({"file": file_name, "line": line_number + 1, "column": column, "reason": reason})
+                            for file_name, line_number, column, reason in errors)
+
+    sys.stderr.write(str(len(errors)) + " error" + ("s" if len(errors) > 1 else "") + " found. " + upper_case_data_type +
+                     " specified in files not added to library.\n")
+    error_messages.invalid_files(error_lines, errors)
+
+def stage_line(line_number: int, line: str):
+    """Returns a line of a file to be written to a staged file, preceded by its (zero indexed) line number."""
+    return str(line_number) + " " + line.strip("\n") + "\n"
+
+def unstage_line(staged_line: str):
+    """Returns the (line_number, line) tuple that a line of a staged file was made from."""
+    line_number, line = staged_line.rstrip("\n").split(" ", 1)
+    return int(line_number), line
+
+def read_line_batches(file, file_name: str):
+    """Yields the lines of an open file in lists of at most import_batch_size (line_number, line) tuples."""
+    numbered_lines = enumerate(file)
+
+    while True:
+        try:
+            batch = list(islice(numbered_lines, import_batch_size))
+        except (OSError, UnicodeDecodeError):
+            error_messages.file_read_error(file_name)
+
+        if len(batch) == 0:
+            return
+
+        yield batch
+
+def report_import_progress(number_of_lines: int, finished: bool = False):
+    """Shows how many lines have been checked so far, once the files being added have turned out to be large enough for
+    this to be worth showing. Progress is written to stderr (and only if it is a terminal), so it never ends up in buf's output."""
+    if number_of_lines < import_batch_size or sys.stderr.isatty() == False:
+        return
+
+    sys.stderr.write("\rChecked " + str(number_of_lines) + " lines..." + ("\n" if finished else ""))
+    sys.stderr.flush()
+
+def append_staged_file(file_path: str, staged_file, line_names):
+    """Appends the contents of a staged file (an open file, positioned at its start, of lines in the library file's
+    format) to a library file, adding them to its index, without reading them all into memory at once."""
+    import shutil
+    signature = get_file_signature(file_path)
+
+    with open(file_path, "a") as file:
+        shutil.copyfileobj(staged_file, file)
+
+    index_appended_lines(file_path, signature, line_names)
+
 def reset():
     """Deletes the library directory."""
     if os.path.exists(library_dir):
@@ -4,7 +4,6 @@
 
 """Entry point when calling buf from the command line, parses command line arguments and passes them to appropriate modules in buf.commands"""
 
-from docopt import docopt
 import sys
 
 if __name__ == '__main__':
@@ -12,6 +11,8 @@ if __name__ == '__main__':
 else:
     import buf.commands as commands
 
+version = "1.0.0"
+
 
 # TODO: add buf reset
 docstring = """
@@ -21,19 +22,26 @@ Usage:
     buf --version
     buf help
     buf help <subcommand_name>
-    buf chemical
-    buf chemical <chemical_name>
+    buf chemical [--limit=<limit>] [--offset=<offset>] [--plain | --format=<format>]
+    buf chemical <chemical_name> [--format=<format>]
     buf chemical -a <molar_mass> <chemical_names>...
-    buf chemical -a <file_name>
+    buf chemical -a <file_names>... [--report-all]
     buf chemical -n <existing_chemical_name> <nicknames>...
     buf chemical -d <chemical_name> [--complete] [--confirm]
-    buf recipe
-    buf recipe <recipe_name>
+    buf recipe [--limit=<limit>] [--offset=<offset>] [--plain | --format=<format>]
+    buf recipe <recipe_name> [--format=<format>]
     buf recipe -a <recipe_name> (<concentrations> <chemical_names>)...
-    buf recipe -a <file_name>
+    buf recipe -a <file_names>... [--report-all]
     buf recipe -d <recipe_name> [--confirm]
-    buf make <volume> <recipe_name>
-    buf make <volume> (<concentrations> <chemical_names>)...
+    buf make <volume> <recipe_name> [--format=<format>]
+    buf make <volume> (<concentrations> <chemical_names>)... [--format=<format>]
+    buf make --orders <orders_file> [--format=<format>]
+    buf migrate
+    buf compact
+    buf serve
+    buf http [--host=<host>] [--port=<port>]
+    buf shell
+    buf completion (bash|zsh)
 """
 
 def main():
@@ -41,20 +49,44 @@ def main():
     If a module is found that matches a subcommand name, the function in the module that shares
     the same name is called. For example, using the 'buf chemical <args>... [options]' subcommand
     in turn calls buf.commands.chemical.chemical, passing in the dictionary of command line options
-    as a parameter."""
-    options = docopt(docstring, help=False, version="1.0.0")
-    for k, v in options.items():
-        if v:
-            if hasattr(commands, k):
-                module = getattr(commands, k)
-                func = getattr(module, k)
-                func(options)
+    as a parameter.
+
+    If a buf daemon is running (see 'buf help serve'), commands it can answer are forwarded to it instead."""
+    # Answered straight away, without importing the rest of buf.
+    if sys.argv[1:] == ["--version"]:
+        print(version)
+        return
+
+    from buf import client
+    if client.forward_command(sys.argv[1:]):
+        return
+
+    run_command(sys.argv[1:])
+
+def run_command(arguments, library = None):
+    """Runs the command given by a list of command line arguments (excluding the leading 'buf'). Chemicals and recipes
+    are looked up in library (a buf.session.Library), so that a library shared across several commands is only read
+    once; if it is None, the command reads the libraries itself. If the command fails with a BufError (see
+    buf.exceptions), its message is shown and buf exits with a non-zero status."""
+    from docopt import docopt
+    from buf import exceptions
+    options = docopt(docstring, argv=arguments, help=False, version=version)
+    try:
+        for k, v in options.items():
+            if v:
+                if hasattr(commands, k):
+                    module = getattr(commands, k)
+                    func = getattr(module, k)
+                    func(options, library)
+    except exceptions.BufError as error:
+        print(error)
+        sys.exit(1)
 
 
 def line(string):
     """Simulates a command line entry."""
     sys.argv = string.split()
-    main()
+    run_command(sys.argv[1:])
 
 def reset():
     """Wipes the recipe and chemical libraries."""
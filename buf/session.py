@@ -0,0 +1,181 @@
+# File name: session.py
+# Author: Jordan Juravsky
+# Date created: 18-10-2026
+
+"""Module for sharing the chemicals and recipes read from one's libraries across several operations (such as the steps
+of a single command, or many calls to buf.api), so that each is read from disk at most once."""
+
+from typing import Sequence
+from contextlib import contextmanager
+from buf import libraries, completion
+
+class Library:
+    """Stores the chemicals and recipes read from one's libraries so far, as dictionaries mapping names to Chemical and
+    Recipe objects. Only the names that are asked for are read (see fetch_chemicals), unless the whole library is
+    loaded (see load_chemicals).
+
+    The version is a stamp of the library files the chemicals and recipes were read from (their sizes and modification
+    times), taken when the Library was created: a tuple of the chemical library's version and the recipe library's
+    version. If the libraries are changed afterwards (for example, by another buf process), the Library keeps returning
+    what it read before, until refreshed (see refresh).
+
+    When a command changes the libraries, only the chemicals or recipes it changed are read again (see changing_chemicals),
+    so that a Library shared across many commands (as in 'buf shell') stays loaded."""
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        """Forgets every chemical and recipe read so far, and takes a new version stamp."""
+        self.version = get_current_version()
+        self.chemicals = {}
+        self.recipes = {}
+        self.missing_chemical_names = set()
+        self.missing_recipe_names = set()
+        self.all_chemicals_loaded = False
+        self.all_recipes_loaded = False
+
+    @property
+    def chemical_version(self):
+        """The version of the chemical library, which changes whenever any chemical does."""
+        return self.version[0]
+
+    def is_current(self):
+        """Checks whether the library files are unchanged since the version stamp was taken."""
+        return self.version == get_current_version()
+
+    def refresh(self):
+        """Forgets every chemical and recipe read so far if the library files have changed since they were read, so that
+        they are read again when next needed."""
+        if self.is_current() == False:
+            self.clear()
+
+    def fetch_chemicals(self, names: Sequence[str]):
+        """Returns a dictionary mapping each of the given names that exists in the chemical library to its Chemical,
+        only reading the names that haven't been read already."""
+        # Imported here, since the command modules import this module.
+        from buf.commands import chemical
+
+        names_to_read = [name for name in names if name not in self.chemicals and name not in self.missing_chemical_names]
+
+        if len(names_to_read) > 0 and self.all_chemicals_loaded == False:
+            found_chemicals = chemical.fetch_chemicals(names_to_read)
+            self.chemicals.update(found_chemicals)
+            self.missing_chemical_names.update(name for name in names_to_read if name not in found_chemicals)
+
+        return {name: self.chemicals[name] for name in names if name in self.chemicals}
+
+    def load_chemicals(self):
+        """Returns the whole chemical library, as a dictionary mapping each chemical name to its Chemical."""
+        from buf.commands import chemical
+
+        if self.all_chemicals_loaded == False:
+            self.chemicals = dict(chemical.load_chemicals())
+            self.missing_chemical_names = set()
+            self.all_chemicals_loaded = True
+
+        return self.chemicals
+
+    def fetch_recipes(self, names: Sequence[str]):
+        """Returns a dictionary mapping each of the given names that exists in the recipe library to its Recipe,
+        only reading the names that haven't been read already."""
+        from buf.commands import recipe
+
+        names_to_read = [name for name in names if name not in self.recipes and name not in self.missing_recipe_names]
+
+        if len(names_to_read) > 0 and self.all_recipes_loaded == False:
+            found_recipes = recipe.fetch_recipes(names_to_read)
+            self.recipes.update(found_recipes)
+            self.missing_recipe_names.update(name for name in names_to_read if name not in found_recipes)
+
+        return {name: self.recipes[name] for name in names if name in self.recipes}
+
+    def load_recipes(self):
+        """Returns the whole recipe library, as a dictionary mapping each recipe name to its Recipe."""
+        from buf.commands import recipe
+
+        if self.all_recipes_loaded == False:
+            self.recipes = dict(recipe.load_recipes())
+            self.missing_recipe_names = set()
+            self.all_recipes_loaded = True
+
+        return self.recipes
+
+    @contextmanager
+    def changing_chemicals(self, names: Sequence[str]):
+        """Context manager to wrap around a change to the chemical library that only affects the given names. Afterwards,
+        those chemicals are read again and a new version stamp is taken, keeping everything else read so far. If the
+        libraries had already been changed by something else beforehand, everything is forgotten instead. Either way,
+        the completion index is updated to match (see buf.completion)."""
+        was_current = self.is_current()
+        previous_version = self.version
+
+        # Reading the chemicals beforehand, so that their other names are known (see update_chemicals).
+        if was_current:
+            self.fetch_chemicals(names)
+
+        yield
+
+        if was_current:
+            changed_names = self.update_chemicals(names)
+            self.version = get_current_version()
+            completion.update_index(self, previous_version, chemical_names=changed_names)
+        else:
+            self.clear()
+            completion.rebuild_index(self)
+
+    def update_chemicals(self, names: Sequence[str]):
+        """Reads the given chemicals again, along with every other name of each (since nicknames share a Chemical),
+        returning every name read."""
+        from buf.commands import chemical
+
+        names = set(names)
+        for name in list(names):
+            if name in self.chemicals:
+                names.update(self.chemicals[name].names)
+
+        found_chemicals = chemical.fetch_chemicals(list(names))
+
+        for name in names:
+            self.chemicals.pop(name, None)
+            self.missing_chemical_names.discard(name)
+
+        self.chemicals.update(found_chemicals)
+        self.missing_chemical_names.update(name for name in names if name not in found_chemicals)
+
+        return names
+
+    @contextmanager
+    def changing_recipes(self, names: Sequence[str]):
+        """Context manager to wrap around a change to the recipe library that only affects the given names (see
+        changing_chemicals)."""
+        was_current = self.is_current()
+        previous_version = self.version
+        yield
+
+        if was_current:
+            self.update_recipes(names)
+            self.version = get_current_version()
+            completion.update_index(self, previous_version, recipe_names=names)
+        else:
+            self.clear()
+            completion.rebuild_index(self)
+
+    def update_recipes(self, names: Sequence[str]):
+        """Reads the given recipes again."""
+        from buf.commands import recipe
+
+        found_recipes = recipe.fetch_recipes(list(names))
+
+        for name in names:
+            self.recipes.pop(name, None)
+            self.missing_recipe_names.discard(name)
+
+        self.recipes.update(found_recipes)
+        self.missing_recipe_names.update(name for name in names if name not in found_recipes)
+
+def get_current_version():
+    """Returns a stamp of the files one's chemical and recipe libraries are read from, as a tuple of a stamp for each
+    library, which changes whenever any of its files does."""
+    from buf.commands import chemical, recipe
+    return (libraries.get_resident_signature(chemical.get_library_file_paths()),
+            libraries.get_resident_signature(recipe.get_library_file_paths()))
@@ -0,0 +1,166 @@
+# File name: tables.py
+# Author: Jordan Juravsky
+# Date created: 18-10-2026
+
+"""Module for printing tables. Plain tables are printed one row at a time, so that large tables (such as a whole chemical
+library) start appearing straight away, rather than after the whole table has been built in memory (as tabulate does
+for grids). Tables can also be printed as records in a machine-readable format (see print_records), for programs that
+read buf's output."""
+
+import os
+import sys
+import csv
+import json
+import heapq
+from itertools import chain, islice
+from typing import Sequence, Iterable
+from buf import error_messages
+
+# In plain tables, the width of each column is taken from this many rows at most (see print_plain_table).
+max_rows_measured = 1000
+
+# Output is flushed after this many rows, so that the start of a large table appears straight away even when buf's
+# output is piped into another program (e.g. 'less'), rather than once the output buffer fills up.
+rows_before_flush = 50
+
+# The machine-readable formats that records can be printed in (see print_records).
+record_formats = ["json", "csv", "ndjson"]
+
+def get_page_option(option_name: str, value):
+    """Given the value of a --limit or --offset option (a string, or None if the option wasn't used), returns it as an
+    int (or None)."""
+    if value == None:
+        return None
+
+    try:
+        number = int(value)
+    except ValueError:
+        error_messages.invalid_page_option(option_name, value)
+
+    if number < 0:
+        error_messages.invalid_page_option(option_name, value)
+
+    return number
+
+def get_format_option(value):
+    """Given the value of a --format option (or None if the option wasn't used), checks that it names one of
+    record_formats, returning it (or None)."""
+    if value != None and value not in record_formats:
+        error_messages.invalid_format(value)
+
+    return value
+
+def get_page(names: Iterable[str], limit: int = None, offset: int = None):
+    """Returns the given names sorted case insensitively (so that all the upper case names don't precede all the lower
+    case ones), skipping the first offset names and keeping at most limit names. When a limit is given, only the names up
+    to the end of the page are sorted."""
+    offset = 0 if offset == None else offset
+
+    if limit == None:
+        sorted_names = sorted(names, key=str.upper)
+    else:
+        sorted_names = heapq.nsmallest(offset + limit, names, key=str.upper)
+
+    return sorted_names[offset:]
+
+def print_table(rows: Iterable[Sequence], headers: Sequence[str], plain: bool = False):
+    """Prints a table of rows, either as a grid in tabulate's 'fancy_grid' format, or (if plain is True) as plain columns
+    separated by spaces. If the output is closed early (e.g. when piped into 'head'), printing stops quietly."""
+    try:
+        if plain:
+            print_plain_table(rows, headers)
+        else:
+            # Imported here, as tabulate is slow to import and only needed to display grids.
+            import tabulate
+            print(tabulate.tabulate(rows, headers=headers, tablefmt="fancy_grid"))
+        sys.stdout.flush()
+    except BrokenPipeError:
+        discard_output()
+
+def discard_output():
+    """Points standard output at devnull once the program reading it has stopped, so that Python doesn't fail again when
+    flushing it as buf exits."""
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, sys.stdout.fileno())
+
+def print_rows(lines: Iterable[str], output=None):
+    """Prints lines to output (standard output by default), flushing it once the first rows_before_flush lines have been
+    printed."""
+    if output == None:
+        output = sys.stdout
+
+    for line_number, line in enumerate(lines):
+        print(line, file=output)
+        if line_number == rows_before_flush:
+            output.flush()
+
+def print_plain_table(rows: Iterable[Sequence], headers: Sequence[str]):
+    """Prints a table as plain columns separated by two spaces. The width of each column is measured in a single pass
+    over the first max_rows_measured rows, and the rest of the rows are printed as they come (any cell wider than its
+    column simply pushes the rest of its row along)."""
+    rows = iter(rows)
+    measured_rows = [[str(cell) for cell in row] for row in islice(rows, max_rows_measured)]
+
+    widths = [len(header) for header in headers]
+    for row in measured_rows:
+        for index, cell in enumerate(row):
+            if len(cell) > widths[index]:
+                widths[index] = len(cell)
+
+    def format_row(row):
+        return "  ".join(str(cell).ljust(width) for cell, width in zip(row, widths)).rstrip()
+
+    print(format_row(headers))
+    print_rows(format_row(row) for row in chain(measured_rows, rows))
+
+# --------------------------------------------------------------------------------
+# ---------------------------MACHINE-READABLE RECORDS-----------------------------
+# --------------------------------------------------------------------------------
+
+def print_records(records: Iterable[dict], fields: Sequence[str], format_name: str, output=None):
+    """Prints records (dictionaries with the given fields as keys) to output (standard output by default) in one of
+    record_formats, one record at a time:
+
+        - json: a JSON array of objects.
+        - ndjson: one JSON object per line.
+        - csv: a header line naming the fields, then one line per record. Lists (such as a chemical's names) are
+          joined with spaces.
+
+    Numbers are printed as numbers (rather than as formatted strings), so that programs can read them directly."""
+    if output == None:
+        output = sys.stdout
+
+    try:
+        if format_name == "csv":
+            writer = csv.writer(output, lineterminator="\n")
+            writer.writerow(fields)
+            writer.writerows([" ".join(record[field]) if isinstance(record[field], list) else record[field] for field in fields]
+                             for record in records)
+        elif format_name == "ndjson":
+            print_rows((json.dumps(record) for record in records), output)
+        else:
+            print("[", file=output)
+            print_rows(with_commas(json.dumps(record) for record in records), output)
+            print("]", file=output)
+        output.flush()
+    except BrokenPipeError:
+        discard_output()
+
+def print_record(record: dict, fields: Sequence[str], format_name: str):
+    """Prints a single record (see print_records). In the json format, the record is printed as a JSON object, rather
+    than as an array holding one object."""
+    if format_name == "json":
+        print(json.dumps(record))
+    else:
+        print_records([record], fields, format_name)
+
+def with_commas(lines: Iterable[str]):
+    """Yields the given lines, each followed by a comma except for the last (as between the items of a JSON array)."""
+    previous_line = None
+    for line in lines:
+        if previous_line != None:
+            yield previous_line + ","
+        previous_line = line
+
+    if previous_line != None:
+        yield previous_line
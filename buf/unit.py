@@ -6,13 +6,19 @@
 A note on terminology used in this module and in the larger program as a whole: given a physical quantity "10L",
 "10" is the quantity's magnitude, while "L" is the quantity's unit/symbol. """
 
-from sys import exit
+from functools import lru_cache
+from bisect import bisect_right
+from array import array
+import math
+import re
 from buf import error_messages
 
 class UnitInfo:
     """Record that stores a list of equivalent unit symbols, their scale factor (the factor one needs to multiply by
     to reach a standard unit, for example the scale factor of mL relative to L is 1e-3), and pointers to the units that are immediately
     larger and smaller than it (for example, the UnitInfo describing mL might point to L and uL)."""
+    __slots__ = ("symbols", "scale_factor", "greater", "lesser")
+
     def __init__(self, symbols, scale_factor):
         self.symbols = symbols
         self.scale_factor = scale_factor
@@ -27,6 +33,11 @@ class UnitInfo:
         return set(self.symbols) == set(other.symbols) and self.scale_factor == other.scale_factor \
             and self.greater == other.greater
 
+    # NOTE: the symbols and neighbours of a UnitInfo are filled in as its ladder is assembled, so only its scale factor
+    # (which no two UnitInfos in a ladder share) is hashed.
+    def __hash__(self):
+        return hash(self.scale_factor)
+
 class UnitLadder:
     """Stores a hierarchy of units of a certain type, such as units of volume. Allows one to easily scale/convert physical
     quantities between units in the ladder.
@@ -68,6 +79,12 @@ class UnitLadder:
         self.symbol_to_info = symbol_to_info
         self.symbols = list(unit_dict.keys())
 
+        # The position of each unit in unit_info_list, and the (sorted) base 10 logarithms of the units' scale factors,
+        # so that the unit a quantity should be scaled to can be found with a single bisection.
+        self.symbol_to_index = {symbol: unit_info_list.index(unit_info) for symbol, unit_info in symbol_to_info.items()}
+        self.scale_factors = [unit_info.scale_factor for unit_info in unit_info_list]
+        self.scale_exponents = [math.log10(scale_factor) for scale_factor in self.scale_factors]
+
     def __contains__(self, item):
         return item in self.symbol_to_info
 
@@ -133,61 +150,90 @@ class UnitLadder:
             error_messages.no_lesser_unit_in_ladder(symbol)
 
 
+    def find_unit_in_range(self, magnitude: float, symbol: str):
+        """Returns the index (in unit_info_list) of the unit that a physical quantity should be scaled to so that its
+        magnitude is in the range [1, 1000). This is the unit repeated calls to scale_up_unit (if the magnitude is at
+        least 1000) or scale_down_unit (if the magnitude is less than 1) would reach, but is found directly from the
+        quantity's order of magnitude."""
+        if symbol not in self.symbol_to_info:
+            error_messages.unit_not_in_ladder(symbol)
+
+        index = self.symbol_to_index[symbol]
+
+        if magnitude >= 1000:
+            exponent = math.log10(magnitude) + self.scale_exponents[index]
+            new_index = min(max(bisect_right(self.scale_exponents, exponent - 3), index), len(self.unit_info_list) - 1)
+        elif magnitude < 1:
+            if magnitude > 0:
+                exponent = math.log10(magnitude) + self.scale_exponents[index]
+                new_index = max(min(bisect_right(self.scale_exponents, exponent) - 1, index), 0)
+            else:
+                new_index = 0
+        else:
+            return index
+
+        # Correcting for any rounding error in the logarithms, which can only put a quantity one unit away from its target.
+        scale_factors = self.scale_factors
+        if magnitude >= 1000:
+            if new_index > index and magnitude * (scale_factors[index] / scale_factors[new_index - 1]) < 1000:
+                new_index -= 1
+            elif new_index < len(scale_factors) - 1 and magnitude * (scale_factors[index] / scale_factors[new_index]) >= 1000:
+                new_index += 1
+        elif magnitude > 0:
+            if new_index < index and magnitude * (scale_factors[index] / scale_factors[new_index + 1]) >= 1:
+                new_index += 1
+            elif new_index > 0 and magnitude * (scale_factors[index] / scale_factors[new_index]) < 1:
+                new_index -= 1
+
+        return new_index
+
+    def scale_to_unit(self, magnitude: float, symbol: str, new_index: int):
+        """Converts a physical quantity into the unit at the given index in unit_info_list, returning its new magnitude and
+        unit. If the quantity is already in that unit, its symbol is kept as is."""
+        index = self.symbol_to_index[symbol]
+        if new_index == index:
+            return magnitude, symbol
+
+        new_info = self.unit_info_list[new_index]
+        return magnitude * (self.unit_info_list[index].scale_factor / new_info.scale_factor), new_info.symbols[0]
+
+
+# Matches a physical quantity, capturing its magnitude (the leading run of digits, decimal points and signs) and its unit
+# (everything after).
+quantity_pattern = re.compile(r"([0-9.+-]*)(.*)", re.DOTALL)
+
 # NOTE: This method does NOT do any type checking.
 def split_unit_quantity(string):
     """Given a physical quantity as a string, returns a tuple containing the quantity's magnitude and unit, both
     as strings."""
-    quantity = ""
-    index = 0
-    quantity_characters = [str(num) for num in range(10)] + [".", "-", "+"]
-    for character in string:
-        if character in quantity_characters:
-            quantity+= character
-            index += 1
-        else:
-            break
-    symbol = string[index:]
-    return quantity, symbol
+    return quantity_pattern.fullmatch(string).groups()
+
+def get_ladder(symbol: str):
+    """Returns the UnitLadder containing the given unit."""
+    if symbol not in ladders_by_symbol:
+        error_messages.unit_not_in_any_ladder(symbol)
+    return ladders_by_symbol[symbol]
 
 def scale_up_physical_quantity(quantity: float, symbol: str):
     """Scales up a physical quantity (ie. unit gets larger, magnitude gets smaller) until the magnitude is in the
     range [1, 1000) or there is no greater unit to scale to. For example, "10000mL" would be scaled up to "10L"."""
-    if symbol in volume_units:
-        ladder = volume_units
-    elif symbol in mass_units:
-        ladder = mass_units
-    elif symbol in concentration_units:
-        ladder = concentration_units
-    else:
-        error_messages.unit_not_in_any_ladder(symbol)
-
+    ladder = get_ladder(symbol)
 
-    while quantity >= 1000 and ladder.can_scale_up_unit(symbol):
-        new_symbol, scale_factor = ladder.scale_up_unit(symbol)
-        quantity *= scale_factor
-        symbol = new_symbol
+    if quantity < 1000:
+        return quantity, symbol
 
-    return quantity, symbol
+    return ladder.scale_to_unit(quantity, symbol, ladder.find_unit_in_range(quantity, symbol))
 
 
 def scale_down_physical_quantity(magnitude: float, symbol: str):
     """Scales down a physical quantity (ie. unit gets smaller, magnitude gets larger) until the magnitude is in the
         range [1, 1000) or there is no lesser unit to scale to. For example, "0.1L" would be scaled down to "100mL"."""
-    if symbol in volume_units:
-        ladder = volume_units
-    elif symbol in mass_units:
-        ladder = mass_units
-    elif symbol in concentration_units:
-        ladder = concentration_units
-    else:
-        error_messages.unit_not_in_any_ladder(symbol)
+    ladder = get_ladder(symbol)
 
-    while magnitude < 1 and ladder.can_scale_down_unit(symbol):
-        new_symbol, scale_factor = ladder.scale_down_unit(symbol)
-        magnitude *= scale_factor
-        symbol = new_symbol
+    if not magnitude < 1:
+        return magnitude, symbol
 
-    return magnitude, symbol
+    return ladder.scale_to_unit(magnitude, symbol, ladder.find_unit_in_range(magnitude, symbol))
 
 def scale_and_round_physical_quantity(magnitude: float, symbol : str):
     """Scales a physical quantity up/down so that its magnitude is in the range [1,1000), before rounding the magnitude
@@ -201,29 +247,228 @@ def scale_and_round_physical_quantity(magnitude: float, symbol : str):
 
     return str(magnitude) + symbol
 
+def scale_and_round_physical_quantities(magnitudes, symbol: str):
+    """Vectorized version of scale_and_round_physical_quantity, which formats a whole NumPy array of magnitudes that share
+    the same unit, returning a list of strings. Units are chosen for every magnitude at once, leaving only the rounding
+    and conversion to strings to be done one at a time (so that the results are identical to those of
+    scale_and_round_physical_quantity)."""
+    import numpy
+
+    ladder = get_ladder(symbol)
+    index = ladder.symbol_to_index[symbol]
+    last_index = len(ladder.unit_info_list) - 1
+
+    magnitudes = numpy.asarray(magnitudes, dtype=float)
+    scale_factors = numpy.array(ladder.scale_factors)
+    scale_exponents = numpy.array(ladder.scale_exponents)
+
+    scaling_up = magnitudes >= 1000
+    scaling_down = magnitudes < 1
+
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        exponents = numpy.log10(magnitudes) + scale_exponents[index]
+
+    new_indices = numpy.full(magnitudes.shape, index, dtype=numpy.intp)
+    new_indices[scaling_up] = numpy.clip(numpy.searchsorted(scale_exponents, exponents[scaling_up] - 3, side="right"),
+                                         index, last_index)
+    new_indices[scaling_down] = numpy.clip(numpy.searchsorted(scale_exponents, exponents[scaling_down], side="right") - 1,
+                                           0, index)
+    new_indices[scaling_down & ~(magnitudes > 0)] = 0
+
+    # Correcting for any rounding error in the logarithms, as in UnitLadder.find_unit_in_range.
+    def scaled(indices):
+        return magnitudes * (scale_factors[index] / scale_factors[numpy.clip(indices, 0, last_index)])
+
+    new_indices -= scaling_up & (new_indices > index) & (scaled(new_indices - 1) < 1000)
+    new_indices += scaling_up & (new_indices < last_index) & (scaled(new_indices) >= 1000)
+    positive = scaling_down & (magnitudes > 0)
+    new_indices += positive & (new_indices < index) & (scaled(new_indices + 1) >= 1)
+    new_indices -= positive & (new_indices > 0) & (scaled(new_indices) < 1)
+
+    scaled_magnitudes = scaled(new_indices)
+    scaled_magnitudes[new_indices == index] = magnitudes[new_indices == index]
+
+    new_symbols = [unit_info.symbols[0] for unit_info in ladder.unit_info_list]
+    new_symbols[index] = symbol
+
+    return [str(round(magnitude, 2)) + new_symbols[new_index]
+            for magnitude, new_index in zip(scaled_magnitudes.tolist(), new_indices.tolist())]
+
+
+# --------------------------------------------------------------------------------
+# ----------------------------------UNIT REGISTRY---------------------------------
+# --------------------------------------------------------------------------------
+
+# Dimensions are vectors of the exponents of mass, volume and amount of substance. For example, molar (moles per litre)
+# has the dimension (0, -1, 1).
+dimension_names = {(1, 0, 0) : "mass", (0, 1, 0) : "volume", (0, 0, 1) : "amount", (0, -1, 1) : "concentration",
+                   (1, -1, 0) : "mass concentration", (0, 0, 0) : "percent"}
+
+si_prefixes = {"k" : 1e3, "" : 1, "m" : 1e-3, "µ" : 1e-6, "u" : 1e-6, "n" : 1e-9, "p" : 1e-12}
+
+class UnitRegistry:
+    """Stores every unit buf understands, along with its dimension and scale factor (the factor one needs to multiply by
+    to reach the canonical unit of its dimension: grams, litres, moles, molar, grams per litre, or a fraction).
+
+    Each unit is given an integer ID, in the order units are defined. Once all units are defined, compile() builds a dense
+    table of the factors to convert between every pair of units, so that any conversion is a single lookup and multiply."""
+    def __init__(self):
+        self.symbols = []
+        self.symbol_to_id = {}
+        self.scale_factors = []
+        self.dimensions = []
+        self.conversion_table = array("d")
+
+    def __contains__(self, symbol):
+        return symbol in self.symbol_to_id
+
+    def define_unit(self, symbol: str, scale_factor: float, dimension: tuple):
+        """Adds a unit to the registry, returning its ID."""
+        self.symbol_to_id[symbol] = len(self.symbols)
+        self.symbols.append(symbol)
+        self.scale_factors.append(scale_factor)
+        self.dimensions.append(dimension)
+        return self.symbol_to_id[symbol]
+
+    def define_prefixed_units(self, base_symbol: str, prefixes, scale_factor: float, dimension: tuple):
+        """Adds a base unit combined with each of the given SI prefixes (e.g. "L" with "m" and "µ" gives "mL" and "µL"),
+        returning a dictionary mapping the new symbols to their scale factors."""
+        units = {}
+        for prefix in prefixes:
+            units[prefix + base_symbol] = si_prefixes[prefix] * scale_factor
+            self.define_unit(prefix + base_symbol, units[prefix + base_symbol], dimension)
+        return units
+
+    def define_compound_units(self, numerator_symbols, denominator_symbols):
+        """Adds every unit of the form numerator/denominator (e.g. "mg/mL") for the given, already defined, units. The
+        dimension of a compound unit is the difference of its parts' dimensions."""
+        for numerator in numerator_symbols:
+            for denominator in denominator_symbols:
+                numerator_id, denominator_id = self.symbol_to_id[numerator], self.symbol_to_id[denominator]
+                dimension = tuple(numerator_exponent - denominator_exponent for numerator_exponent, denominator_exponent
+                                  in zip(self.dimensions[numerator_id], self.dimensions[denominator_id]))
+                self.define_unit(numerator + "/" + denominator,
+                                 self.scale_factors[numerator_id] / self.scale_factors[denominator_id], dimension)
+
+    def compile(self):
+        """Builds the conversion table, in which the entry at from_id * (number of units) + to_id is the factor to convert
+        from one unit to the other, or NaN if they have different dimensions."""
+        number_of_units = len(self.symbols)
+        self.conversion_table = array("d", [float("nan")]) * (number_of_units * number_of_units)
+
+        for from_id in range(number_of_units):
+            for to_id in range(number_of_units):
+                if self.dimensions[from_id] == self.dimensions[to_id]:
+                    self.conversion_table[from_id * number_of_units + to_id] = self.scale_factors[from_id] / self.scale_factors[to_id]
+
+    def get_id(self, symbol: str):
+        """Returns the ID of the given unit."""
+        if symbol not in self.symbol_to_id:
+            error_messages.unit_not_in_registry(symbol)
+        return self.symbol_to_id[symbol]
+
+    def get_dimension_name(self, symbol: str):
+        """Returns the name of the dimension of the given unit (e.g. "volume"), or None if the unit is not in the registry."""
+        if symbol not in self.symbol_to_id:
+            return None
+        return dimension_names[self.dimensions[self.symbol_to_id[symbol]]]
+
+    def get_conversion_factor(self, from_symbol: str, to_symbol: str):
+        """Returns the factor one must multiply by to convert a physical quantity from one unit to another."""
+        factor = self.conversion_table[self.get_id(from_symbol) * len(self.symbols) + self.get_id(to_symbol)]
+        if math.isnan(factor):
+            error_messages.incompatible_units(from_symbol, to_symbol)
+        return factor
+
+    def convert(self, magnitude: float, from_symbol: str, to_symbol: str):
+        """Converts the magnitude of a physical quantity from one unit to another."""
+        return magnitude * self.get_conversion_factor(from_symbol, to_symbol)
+
+
+units = UnitRegistry()
 
 # Standardised to litres.
-volume_units = UnitLadder({"L" : 1, "mL" : 1e-3, "µL" : 1e-6, "uL": 1e-6})
+volume_units = UnitLadder(units.define_prefixed_units("L", ["", "m", "µ", "u", "n", "p"], 1, (0, 1, 0)))
 
 # Standardised to grams.
-mass_units = UnitLadder({"kg" : 1000, "g" : 1, "mg" : 1e-3, "µg": 1e-6, "ug" : 1e-6})
+mass_units = UnitLadder(units.define_prefixed_units("g", ["k", "", "m", "µ", "u"], 1, (1, 0, 0)))
+
+# Standardised to moles.
+amount_units = UnitLadder(units.define_prefixed_units("mol", ["", "m", "µ", "u", "n"], 1, (0, 0, 1)))
 
 # Standardised to molar.
-concentration_units = UnitLadder({"M" : 1, "mM" : 1e-3, "µM" : 1e-6, "uM" : 1e-6})
+concentration_units = UnitLadder(units.define_prefixed_units("M", ["", "m", "µ", "u"], 1, (0, -1, 1)))
+
+# Standardised to grams per litre.
+units.define_compound_units(["g", "mg", "µg", "ug"], ["L", "mL"])
+units.define_unit("%w/v", 10, (1, -1, 0)) # Grams per 100mL.
+units.define_unit("ppm", 1e-3, (1, -1, 0)) # Milligrams per litre.
+
+# Standardised to a fraction of the solution's volume.
+units.define_unit("%", 1e-2, (0, 0, 0))
+units.define_unit("%v/v", 1e-2, (0, 0, 0))
+
+units.compile()
+
+valid_units = list(units.symbols)
 
-valid_units = volume_units.symbols + mass_units.symbols + concentration_units.symbols + ["%"]
+ladders_by_symbol = {symbol: ladder for ladder in [volume_units, mass_units, amount_units, concentration_units]
+                     for symbol in ladder.symbols}
 
 def volume_unit_to_litres(symbol):
     """Convenience function that returns the factor one must multiply to convert a physical quantity with the specified
     unit of volume into litres."""
-    return volume_units.get_scale_factor(symbol)
+    return units.get_conversion_factor(symbol, "L")
 
 def concentration_unit_to_molar(symbol):
     """Convenience function that returns the factor one must multiply to convert a physical quantity with the specified
         unit of concentration into molar."""
-    return concentration_units.get_scale_factor(symbol)
+    return units.get_conversion_factor(symbol, "M")
 
 def mass_unit_to_grams(symbol):
     """Convenience function that returns the factor one must multiply to convert a physical quantity with the specified
         unit of mass into grams."""
-    return mass_units.get_scale_factor(symbol)
\ No newline at end of file
+    return units.get_conversion_factor(symbol, "g")
+
+class Quantity:
+    """Record storing a parsed physical quantity: its magnitude (a float, or None if the magnitude is not a number), its
+    unit, the name of the unit's dimension (see dimension_names, or None if the unit is not valid), and its canonical value
+    (the quantity in the canonical unit of its dimension, e.g. litres, grams or molar, or None if either the magnitude or
+    unit is invalid). Quantities are shared between calls to parse_quantity, so should not be modified."""
+    __slots__ = ("magnitude", "unit", "dimension", "canonical_value")
+
+    def __init__(self, magnitude, unit: str, dimension, canonical_value):
+        self.magnitude = magnitude
+        self.unit = unit
+        self.dimension = dimension
+        self.canonical_value = canonical_value
+
+    def __eq__(self, other):
+        return self.magnitude == other.magnitude and self.unit == other.unit and self.dimension == other.dimension \
+            and self.canonical_value == other.canonical_value
+
+    def __repr__(self):
+        return "Quantity(" + repr(self.magnitude) + ", " + repr(self.unit) + ", " + repr(self.dimension) + ", " \
+            + repr(self.canonical_value) + ")"
+
+@lru_cache(maxsize=4096)
+def parse_quantity(string: str):
+    """Parses a physical quantity given as a string (e.g. "300mM") into a Quantity. Invalid magnitudes and units do not
+    cause errors, but are recorded in the returned Quantity, so that callers can report them as they see fit."""
+    magnitude_string, symbol = split_unit_quantity(string)
+
+    try:
+        magnitude = float(magnitude_string)
+    except ValueError:
+        magnitude = None
+
+    dimension = units.get_dimension_name(symbol)
+
+    if magnitude == None or dimension == None:
+        canonical_value = None
+    elif dimension == "percent":
+        canonical_value = magnitude / 100
+    else:
+        canonical_value = magnitude * units.scale_factors[units.symbol_to_id[symbol]]
+
+    return Quantity(magnitude, symbol, dimension, canonical_value)
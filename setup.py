@@ -5,12 +5,11 @@ with open("README.rst", "r") as file:
 
 setup(name='buf',
       version="1.0.0",
-      python_requires='>=3.6',
+      python_requires='>=3.7',
       description='For easily making chemical buffers and solutions',
       long_description= long_description,
       long_description_content_type = "text/x-rst",
       classifiers=[
-        "Programming Language :: Python :: 3.6",
         "Programming Language :: Python :: 3.7",
         "License :: OSI Approved :: MIT License",
         "Operating System :: OS Independent"
@@ -21,5 +20,6 @@ setup(name='buf',
       author_email='jordan@mindcharger.com',
       packages=find_packages(),
       install_requires=['docopt==0.6.2', 'tabulate==0.8.2'],
+      extras_require={'batch': ['numpy']},
       entry_points = {"console_scripts" : ["buf=buf.main:main"]},
       include_package_data = True)
\ No newline at end of file
@@ -0,0 +1,48 @@
+# File name: helpers.py
+# Author: Jordan Juravsky
+# Date created: 18-10-2026
+
+"""Helpers shared by buf's tests."""
+
+from unittest import mock, TestCase
+import os
+from tempfile import NamedTemporaryFile, TemporaryDirectory
+
+def make_temp_file(contents: str):
+    """Returns a NamedTemporaryFile containing the given contents."""
+    temp_file = NamedTemporaryFile(mode="a+")
+    with open(temp_file.name, "a") as file:
+        file.write(contents)
+    return temp_file
+
+class LibraryTestCase(TestCase):
+    """A TestCase whose library directory is a temporary directory, so that tests never read or change one's real
+    libraries. Every file buf keeps in the library directory (the chemical and recipe libraries, the database, the results
+    cache, the completion index and the daemon's socket) is moved into the temporary directory. Subclasses can set
+    chemicals and recipes to the initial contents of the chemical and recipe libraries."""
+
+    chemicals = ""
+    recipes = ""
+
+    def setUp(self):
+        self.temp_dir = TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.library_dir = self.temp_dir.name
+
+        self.chemical_library_file = os.path.join(self.library_dir, "chemicals.txt")
+        self.recipe_library_file = os.path.join(self.library_dir, "recipes.txt")
+        with open(self.chemical_library_file, "w") as file:
+            file.write(self.chemicals)
+        with open(self.recipe_library_file, "w") as file:
+            file.write(self.recipes)
+
+        patches = [mock.patch("buf.libraries.library_dir", self.library_dir),
+                   mock.patch("buf.commands.chemical.chemical_library_file", self.chemical_library_file),
+                   mock.patch("buf.commands.recipe.recipe_library_file", self.recipe_library_file),
+                   mock.patch("buf.commands.make.results_cache_file", os.path.join(self.library_dir, "results.cache")),
+                   mock.patch("buf.database.database_file", os.path.join(self.library_dir, "library.db")),
+                   mock.patch("buf.completion.completion_index_file", os.path.join(self.library_dir, "completion.index")),
+                   mock.patch("buf.client.socket_file", os.path.join(self.library_dir, "buf.sock"))]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
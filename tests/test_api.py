@@ -0,0 +1,53 @@
+# File name: test_api.py
+# Author: Jordan Juravsky
+# Date created: 18-10-2026
+
+"""Tests buf.api."""
+
+import unittest
+from buf import api
+from buf.commands import chemical, recipe, make
+from buf.exceptions import BufError, ChemicalNotFoundError, RecipeNotFoundError, InvalidVolumeError
+from helpers import LibraryTestCase
+
+class TestApi(LibraryTestCase):
+    """Tests the functions in buf.api, using temporary chemical and recipe libraries."""
+
+    chemicals = "58.44 NaCl salt\n74.55 KCl\n"
+    recipes = "wash 300mM NaCl 10% glycerol\n"
+
+    def test_load_libraries(self):
+        """Tests that the libraries are returned as dictionaries mapping names to Chemical and Recipe objects."""
+        chemicals = api.load_chemicals()
+        self.assertEqual(set(chemicals), {"NaCl", "salt", "KCl"})
+        self.assertIs(chemicals["NaCl"], chemicals["salt"])
+
+        self.assertEqual(api.load_recipes(), {"wash" : recipe.Recipe("wash", ["300mM", "10%"], ["NaCl", "glycerol"])})
+
+    def test_lookup(self):
+        """Tests that chemicals and recipes are looked up by name, and that missing names raise exceptions rather than exiting."""
+        self.assertEqual(api.get_chemical("salt"), chemical.Chemical(58.44, ["NaCl", "salt"]))
+        self.assertEqual(api.get_recipe("wash").chemical_names, ("NaCl", "glycerol"))
+
+        with self.assertRaises(ChemicalNotFoundError) as context:
+            api.get_chemical("unknown")
+        self.assertIn("'unknown' does not exist", str(context.exception))
+
+        with self.assertRaises(RecipeNotFoundError):
+            api.get_recipe("unknown")
+
+    def test_make(self):
+        """Tests that making a buffer returns its Steps, whether it is a recipe in the library or defined on the spot."""
+        steps = api.make("2L", "wash")
+        self.assertEqual(steps, [make.Step("NaCl", "300mM", "35.06g"), make.Step("glycerol", "10%", "200.0mL")])
+
+        self.assertEqual(api.make("1L", concentrations=["1M"], chemical_names=["KCl"]), [make.Step("KCl", "1M", "74.55g")])
+
+        with self.assertRaises(InvalidVolumeError):
+            api.make("2g", "wash")
+
+        with self.assertRaises(BufError):
+            api.make("2L", concentrations=["1M"], chemical_names=["unknown"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -5,18 +5,27 @@
 import unittest
 from unittest import mock, TestCase
 from io import StringIO
+import json
+import time
 
 from buf.commands import chemical
+from buf.exceptions import BufError
+from buf import libraries
 
 from tempfile import NamedTemporaryFile
+from helpers import LibraryTestCase, make_temp_file
 
-class TestMakeSafeChemical(TestCase):
+def fetch_from(chemical_library: dict):
+    """Returns a stand-in for chemical.fetch_chemicals that looks names up in the given dictionary."""
+    return lambda names: {name : chemical_library[name] for name in names if name in chemical_library}
+
+class TestMakeSafeChemical(LibraryTestCase):
     """Tests chemical.make_safe_chemical"""
 
     def test_spaces_in_name(self):
         """Tests that the function does not allow spaces in a chemical name."""
         with mock.patch("buf.commands.chemical.load_chemicals", return_value = {}):
-            with self.assertRaises(SystemExit):
+            with self.assertRaises(BufError):
                 chemical.make_safe_chemical("58.44", ["NaCl", "table salt with spaces"])
 
             shouldnt_crash = chemical.make_safe_chemical("58.44", ["NaCl", "table_salt_without_spaces"])
@@ -25,7 +34,7 @@ class TestMakeSafeChemical(TestCase):
         """Tests that the function ensures that the molar mass is a positive number."""
         with mock.patch("buf.commands.chemical.print") as mock_print:
             for test_molar_mass in [0, -10, "notanumber"]:
-                with self.assertRaises(SystemExit):
+                with self.assertRaises(BufError):
                     chemical.make_safe_chemical(test_molar_mass, ["validname"],chemical_library={})
                     mock_print.assert_called()
                     mock_print.reset_mock()
@@ -41,7 +50,7 @@ class TestMakeSafeChemical(TestCase):
         """Tests that the function checks for existing chemicals with the same name in the chemical library."""
         with mock.patch("buf.commands.chemical.print") as mock_print:
                 # Ensuring an invalid chemical is not created
-                with self.assertRaises(SystemExit):
+                with self.assertRaises(BufError):
                     chemical.make_safe_chemical(123, ["salt", "pepper"], {"salt": None})
                     mock_print.assert_called()
 
@@ -65,8 +74,19 @@ class TestChemical(TestCase):
         other_chemical = chemical.Chemical(123.4, ["name1", "name2"])
         self.assertEqual(one_chemical, other_chemical)
 
+    def test_immutability(self):
+        """Tests that Chemicals cannot be modified, and that equal Chemicals hash equally."""
+        test_chemical = chemical.Chemical(123.4, ["name1", "name2"])
+
+        with self.assertRaises(AttributeError):
+            test_chemical.molar_mass = 10
+        with self.assertRaises(AttributeError):
+            test_chemical.names.append("name3")
+
+        self.assertEqual(hash(test_chemical), hash(chemical.Chemical(123.4, ["name2", "name1"])))
+
 
-class TestAddChemical(TestCase):
+class TestAddChemical(LibraryTestCase):
     """Tests chemical.add_chemical."""
 
     def test_writing(self):
@@ -79,7 +99,7 @@ class TestAddChemical(TestCase):
                 mock_open.return_value.__enter__.return_value.write.assert_called_with(str(chemical.make_safe_chemical(test_mass, test_names)) + "\n")
 
 
-class TestLoadChemicals(TestCase):
+class TestLoadChemicals(LibraryTestCase):
     """Tests chemical.load_chemicals"""
 
     def test_correct_read(self):
@@ -93,60 +113,51 @@ class TestLoadChemicals(TestCase):
             self.assertEqual(chemical_dict, returned_dict)
 
 
-class TestAddChemicalsFromFile(TestCase):
-    """Tests chemical.add_chemicals_from_file."""
+class TestAddChemicalsFromFiles(LibraryTestCase):
+    """Tests chemical.add_chemicals_from_files."""
 
     def test_invalid_file_name(self):
         """Tests that the function checks to see if the specified file exists."""
 
-        with mock.patch("buf.commands.chemical.open") as mock_open:
-            with mock.patch("buf.commands.chemical.load_chemicals", return_value = {"Arg" : None, "KCl" : None}):
-                with mock.patch("buf.commands.chemical.print") as mock_print:
-                    with mock.patch("buf.commands.chemical.os.path.isfile", return_value = False):
+        with mock.patch("buf.commands.chemical.fetch_chemicals", return_value = {}):
+            with mock.patch("buf.commands.chemical.print") as mock_print:
+                with mock.patch("buf.commands.chemical.os.path.isfile", return_value = False):
 
-                        with self.assertRaises(SystemExit):
-                            chemical.add_chemicals_from_file("invalidfilename")
+                    with self.assertRaises(BufError):
+                        chemical.add_chemicals_from_files(["invalidfilename"])
 
 
     def test_invalid_file_contents(self):
-        """Tests that the function raises SystemExit (i.e. cleanly exits the program opposed to crashing) \
-        when the specified file has invalid contents (see chemical.instructions for more information on what \
-        constitutes a valid file)."""
-
-        with mock.patch("buf.commands.chemical.open") as mock_open:
-            with mock.patch("buf.commands.chemical.load_chemicals", return_value={"Arg": None, "KCl": None}):
-                with mock.patch("buf.commands.chemical.print") as mock_print:
+        """Tests that the function raises a BufError (which is shown to the user as an error message) when the specified \
+        file has invalid contents (see chemical.instructions for more information on what constitutes a valid file), \
+        without adding anything to the library."""
+        temp_library_file = make_temp_file("75.07 Arg\n74.55 KCl\n")
 
-                    # Testing an invalid file name.
-                    with self.assertRaises(SystemExit):
-                        chemical.add_chemicals_from_file("invalidfilename")
+        with mock.patch("buf.commands.chemical.chemical_library_file", temp_library_file.name):
+            # Testing an invalid file name.
+            with self.assertRaises(BufError):
+                chemical.add_chemicals_from_files(["invalidfilename"])
 
-                    with mock.patch("buf.commands.chemical.os.path.isfile", return_value=True):
+            for invalid_file_contents in ["100 salt pepper\n200 salt", "NotANumber salt pepper", "123 KCl pepper",
+                                          "0 validname othervalidname\n100 salt pepper", "-2 salt", "100 salt salt"]:
+                temp_file_to_add = make_temp_file(invalid_file_contents)
 
-                        for invalid_file_contents in ["100 salt pepper\n200 salt", "NotANumber salt pepper", "123 KCl pepper",
-                                              "0 validname othervalidname\n100 salt pepper", "-2 salt"]:
+                with self.assertRaises(BufError) as context:
+                    chemical.add_chemicals_from_files([temp_file_to_add.name])
 
-                            with self.assertRaises(SystemExit):
-                                mock_open.return_value.__enter__.return_value = StringIO(invalid_file_contents)
-                                chemical.add_chemicals_from_file("whatever")
-                                mock_print.assert_called()
-                                mock_open.return_value.__enter__.return_value.write.assert_not_called()
+                self.assertIn("Chemicals specified in file not added to library.", str(context.exception))
 
-                                mock_print.reset_mock()
+            with open(temp_library_file.name, "r") as file:
+                self.assertEqual(file.read(), "75.07 Arg\n74.55 KCl\n")
 
     def test_correct_writing(self):
         """Tests that the function correctly appends the newly created chemicals to the library file."""
-        temp_library_file = NamedTemporaryFile(mode="a+")
-        with open(temp_library_file.name, "a") as file:
-            file.write("100 salt pepper\n154.25 DTT\n")
-
-        temp_file_to_add = NamedTemporaryFile(mode = "a+")
-        with open(temp_file_to_add.name, "a") as other_file:
-            other_file.write("74.55 KCl\n68.08 imidazole imi")
+        temp_library_file = make_temp_file("100 salt pepper\n154.25 DTT\n")
+        temp_file_to_add = make_temp_file("74.55 KCl\n68.08 imidazole imi")
 
         with mock.patch("buf.commands.chemical.chemical_library_file", temp_library_file.name):
             with mock.patch("buf.commands.chemical.print") as mock_print:
-                chemical.add_chemicals_from_file(temp_file_to_add.name)
+                chemical.add_chemicals_from_files([temp_file_to_add.name])
                 mock_print.assert_called()
 
             with open(temp_library_file.name, "r") as file:
@@ -154,8 +165,112 @@ class TestAddChemicalsFromFile(TestCase):
 
             self.assertEqual(contents, "100 salt pepper\n154.25 DTT\n74.55 KCl\n68.08 imidazole imi\n")
 
+    def test_batched_reading(self):
+        """Tests that files spanning several batches are added in full, that duplicate names are caught across batches,
+        and that nothing is added to the library if any line of the file is invalid."""
+        temp_library_file = make_temp_file("100 salt pepper\n")
+        temp_file_to_add = make_temp_file("".join(str(index + 1) + " chemical" + str(index) + "\n" for index in range(7)))
+
+        with mock.patch("buf.commands.chemical.chemical_library_file", temp_library_file.name):
+            with mock.patch("buf.libraries.import_batch_size", 2):
+                with mock.patch("buf.commands.chemical.print") as mock_print:
+                    chemical.add_chemicals_from_files([temp_file_to_add.name])
+                    mock_print.assert_called_with("Added the following chemicals to your library:",
+                                                  *["chemical" + str(index) for index in range(7)])
+
+                    self.assertEqual(chemical.fetch_chemicals(["chemical6"])["chemical6"], chemical.Chemical(7, ["chemical6"]))
+
+                    with open(temp_library_file.name, "r") as file:
+                        contents_before = file.read()
+
+                    with open(temp_file_to_add.name, "w") as other_file:
+                        other_file.write("1 first\n2 second\n3 third\n4 first\n")
+
+                    with self.assertRaises(BufError):
+                        chemical.add_chemicals_from_files([temp_file_to_add.name])
+
+                    with open(temp_library_file.name, "r") as file:
+                        self.assertEqual(file.read(), contents_before)
+
+                with mock.patch("buf.libraries.max_listed_names", 1):
+                    with mock.patch("buf.commands.chemical.print") as mock_print:
+                        with open(temp_file_to_add.name, "w") as other_file:
+                            other_file.write("1 first\n2 second\n3 third\n")
+
+                        chemical.add_chemicals_from_files([temp_file_to_add.name])
+                        mock_print.assert_called_with("Added 3 chemicals (3 names) to your library.")
+
+    def test_multiple_files(self):
+        """Tests that several files are added together in one write, and that names used in more than one file are caught,
+        in which case none of the files are added."""
+        temp_library_file = make_temp_file("100 salt pepper\n")
+        first_file = make_temp_file("74.55 KCl\n68.08 imidazole imi\n")
+        second_file = make_temp_file("154.25 DTT\n")
+        conflicting_file = make_temp_file("20 other\n30 imi\n")
+
+        with mock.patch("buf.commands.chemical.chemical_library_file", temp_library_file.name):
+            with mock.patch("buf.commands.chemical.print") as mock_print:
+                with self.assertRaises(BufError):
+                    chemical.add_chemicals_from_files([first_file.name, second_file.name, conflicting_file.name])
+
+                with self.assertRaises(BufError) as context:
+                    chemical.add_chemicals_from_files([first_file.name, conflicting_file.name])
+                self.assertIn("Duplicate file entry: 'imi' already used in '" + first_file.name + "'.", str(context.exception))
+
+                with open(temp_library_file.name, "r") as file:
+                    self.assertEqual(file.read(), "100 salt pepper\n")
+
+                chemical.add_chemicals_from_files([first_file.name, second_file.name])
+                mock_print.assert_called_with("Added the following chemicals to your library:", "KCl", "imidazole", "imi", "DTT")
+
+            with open(temp_library_file.name, "r") as file:
+                self.assertEqual(file.read(), "100 salt pepper\n74.55 KCl\n68.08 imidazole imi\n154.25 DTT\n")
+
+    def test_invalid_line_in_worker(self):
+        """Tests that an invalid line found while checking files in parallel is reported, along with the file it is in."""
+        temp_library_file = make_temp_file("")
+        valid_file = make_temp_file("74.55 KCl\n")
+        invalid_file = make_temp_file("74.55 NaCl\nNotANumber salt\n")
+
+        with mock.patch("buf.commands.chemical.chemical_library_file", temp_library_file.name):
+            with self.assertRaises(BufError) as context:
+                chemical.add_chemicals_from_files([valid_file.name, invalid_file.name])
+
+            self.assertIn("line 2", str(context.exception))
+
+            with open(temp_library_file.name, "r") as file:
+                self.assertEqual(file.read(), "")
+
+
+    def test_report_all(self):
+        """Tests that with report_all, every error in every file is reported (with its line and column) as a line of JSON,
+        and that nothing is added to the library."""
+        temp_library_file = make_temp_file("74.55 KCl\n")
+        first_file = make_temp_file("100 salt pepper\nNotANumber x\n  5\n7 water KCl\n")
+        second_file = make_temp_file("9 pepper\n3 fine\n")
+
+        with mock.patch("buf.commands.chemical.chemical_library_file", temp_library_file.name):
+            with mock.patch("buf.libraries.sys.stderr"):
+                with self.assertRaises(BufError) as context:
+                    chemical.add_chemicals_from_files([first_file.name, second_file.name], report_all=True)
+
+            reported_errors = [json.loads(line) for line in str(context.exception).splitlines()]
+            self.assertEqual(len(context.exception.errors), len(reported_errors))
+            self.assertEqual([(error["file"], error["line"], error["column"]) for error in reported_errors],
+                             [(first_file.name, 2, 1), (first_file.name, 3, None), (first_file.name, 4, 9), (second_file.name, 1, 3)])
+            self.assertIn("NotANumber", reported_errors[0]["reason"])
+            self.assertIn("already used in", reported_errors[3]["reason"])
+
+            with open(temp_library_file.name, "r") as file:
+                self.assertEqual(file.read(), "74.55 KCl\n")
+
+            # Files without errors are added as normal.
+            with mock.patch("buf.commands.chemical.print") as mock_print:
+                chemical.add_chemicals_from_files([second_file.name], report_all=True)
+                mock_print.assert_called_with("Added the following chemicals to your library:", "pepper", "fine")
+
 
-class TestSaveChemicalLibrary(TestCase):
+class TestSaveChemicalLibrary(LibraryTestCase):
     """Tests chemical.save_chemical_library."""
 
     def test_read_write(self):
@@ -175,16 +290,16 @@ class TestSaveChemicalLibrary(TestCase):
 
             self.assertEqual(read_chemical_dict, read_again)
 
-class TestNickNameChemcial(TestCase):
+class TestNickNameChemcial(LibraryTestCase):
     """Tests chemical.nickname_chemical."""
 
     def test_existing_name_checks(self):
         """Tests that the function checks that the specified existing chemical actually exists in \
         the chemical library, and that the new nicknames do not."""
-        with mock.patch("buf.commands.chemical.load_chemicals", return_value = {"NaCl" : None, "Arg" : None}):
+        with mock.patch("buf.commands.chemical.fetch_chemicals", side_effect = fetch_from({"NaCl" : None, "Arg" : None})):
             with mock.patch("buf.commands.chemical.print") as mock_print:
                 for existing_name, new_name in [("unknown", "nickname"), ("NaCl", "Arg"), ("NaCl", "NaCl")]:
-                    with self.assertRaises(SystemExit):
+                    with self.assertRaises(BufError):
                         chemical.nickname_chemical(existing_name, ["Arg", new_name])
                         mock_print.assert_called()
                     mock_print.reset_mock()
@@ -193,7 +308,7 @@ class TestNickNameChemcial(TestCase):
         """Tests that the function does not allow spaces to be in a chemical name."""
         with mock.patch("buf.commands.chemical.error_messages.spaces_in_chemical_name", side_effect = SystemExit) as mock_error:
             nacl_chemical = chemical.Chemical(58.44, ["NaCl"])
-            with mock.patch("buf.commands.chemical.load_chemicals", return_value = {"NaCl" : nacl_chemical}):
+            with mock.patch("buf.commands.chemical.fetch_chemicals", side_effect = fetch_from({"NaCl" : nacl_chemical})):
                 with self.assertRaises(SystemExit):
                     chemical.nickname_chemical("NaCl", ["new name"])
                 mock_error.assert_called_with("new name")
@@ -210,13 +325,10 @@ class TestNickNameChemcial(TestCase):
         with mock.patch("buf.commands.chemical.chemical_library_file", temp_file.name):
             read_chemical_dict = chemical.load_chemicals()
 
-            chemical_object = read_chemical_dict["salt"]
+            chemical_object = chemical.Chemical(100.0, ["salt", "pepper", "new_name_1", "new_name_2"])
 
-            chemical_object.names.append("new_name_1")
-            chemical_object.names.append("new_name_2")
-
-            read_chemical_dict["new_name_1"] = chemical_object
-            read_chemical_dict["new_name_2"] = chemical_object
+            for name in chemical_object.names:
+                read_chemical_dict[name] = chemical_object
 
             chemical.nickname_chemical("salt", ["new_name_1", "new_name_2"])
 
@@ -224,14 +336,14 @@ class TestNickNameChemcial(TestCase):
 
             self.assertEqual(read_chemical_dict, new_dict)
 
-class TestDeleteChemical(TestCase):
+class TestDeleteChemical(LibraryTestCase):
     """Tests chemical.delete_chemical."""
 
     def test_name_check(self):
         """Tests that the function checks to see if the specified chemical to delete exists in the chemical library."""
-        with mock.patch("buf.commands.chemical.load_chemicals", return_value = {"salt" : None, "pepper" : None}):
+        with mock.patch("buf.commands.chemical.fetch_chemicals", side_effect = fetch_from({"salt" : None, "pepper" : None})):
             with mock.patch("buf.commands.chemical.print") as mock_print:
-                with self.assertRaises(SystemExit):
+                with self.assertRaises(BufError):
                     chemical.delete_chemical("unknown_chemical")
                     mock_print.assert_called()
 
@@ -277,5 +389,125 @@ class TestDeleteChemical(TestCase):
 
             self.assertEqual(after_delete, chemical.load_chemicals())
 
+class TestChemicalJournal(LibraryTestCase):
+    """Tests that nicknames and deletions are journaled rather than rewriting the chemical library file, and \
+    chemical.compact_chemical_library."""
+
+    def test_journaled_changes(self):
+        """Tests that nicknaming and deleting chemicals leaves the library file untouched, and that both load_chemicals \
+        and fetch_chemicals replay the journal."""
+        temp_file = NamedTemporaryFile("w+")
+
+        with open(temp_file.name, "w") as file:
+            file.write("100.0 salt pepper\n54.55 NaCl\n")
+
+        with mock.patch("buf.commands.chemical.chemical_library_file", temp_file.name):
+            chemical.nickname_chemical("NaCl", ["table_salt"])
+            chemical.delete_chemical("salt", prompt_for_confirmation=False)
+            chemical.delete_chemical("NaCl", prompt_for_confirmation=False)
+            chemical.add_single_chemical("10", ["NaCl"])
+
+            with open(temp_file.name, "r") as file:
+                self.assertEqual(file.read(), "100.0 salt pepper\n54.55 NaCl\n")
+
+            pepper = chemical.Chemical(100.0, ["pepper"])
+            table_salt = chemical.Chemical(54.55, ["table_salt"])
+            new_nacl = chemical.Chemical(10.0, ["NaCl"])
+            expected_library = {"pepper" : pepper, "table_salt" : table_salt, "NaCl" : new_nacl}
+
+            self.assertEqual(chemical.load_chemicals(), expected_library)
+            self.assertEqual(chemical.fetch_chemicals(["salt", "table_salt", "NaCl"]), {"table_salt" : table_salt, "NaCl" : new_nacl})
+
+    def test_group_commit(self):
+        """Tests that a batch of nicknames and deletions made in a group commit is applied as a whole, or not at all."""
+        temp_file = NamedTemporaryFile("w+")
+
+        with open(temp_file.name, "w") as file:
+            file.write("100.0 salt pepper\n54.55 NaCl\n")
+
+        with mock.patch("buf.commands.chemical.chemical_library_file", temp_file.name):
+            with mock.patch("buf.commands.chemical.print"):
+                with self.assertRaises(BufError):
+                    with libraries.group_commit(temp_file.name):
+                        chemical.nickname_chemical("NaCl", ["table_salt"])
+                        chemical.delete_chemical("salt", prompt_for_confirmation=False)
+                        chemical.nickname_chemical("salt", ["not_added"])
+
+                self.assertEqual(len(chemical.load_chemicals()), 3)
+
+                with libraries.group_commit(temp_file.name):
+                    chemical.nickname_chemical("NaCl", ["table_salt"])
+                    chemical.delete_chemical("salt", prompt_for_confirmation=False)
+                    chemical.add_single_chemical("74.55", ["KCl"])
+
+            self.assertEqual(chemical.load_chemicals(), {"pepper" : chemical.Chemical(100.0, ["pepper"]),
+                                                         "NaCl" : chemical.Chemical(54.55, ["NaCl", "table_salt"]),
+                                                         "table_salt" : chemical.Chemical(54.55, ["NaCl", "table_salt"]),
+                                                         "KCl" : chemical.Chemical(74.55, ["KCl"])})
+
+    def test_group_commit_with_file(self):
+        """Tests that chemicals added from a file in a group commit are discarded along with the rest of the group if it
+        fails, even when the library has a journal that would otherwise be compacted first."""
+        temp_file = NamedTemporaryFile("w+")
+        chemicals_file = NamedTemporaryFile("w+")
+
+        with open(temp_file.name, "w") as file:
+            file.write("100.0 salt pepper\n54.55 NaCl\n")
+        with open(chemicals_file.name, "w") as file:
+            file.write("74.55 KCl\n")
+
+        with mock.patch("buf.commands.chemical.chemical_library_file", temp_file.name):
+            chemical.nickname_chemical("NaCl", ["table_salt"])
+
+            with self.assertRaises(BufError):
+                with libraries.group_commit(temp_file.name):
+                    chemical.add_chemicals_from_files([chemicals_file.name])
+                    self.assertIn("KCl", chemical.fetch_chemicals(["KCl"]))
+                    chemical.nickname_chemical("unknown", ["not_added"])
+
+            with open(temp_file.name, "r") as file:
+                self.assertEqual(file.read(), "100.0 salt pepper\n54.55 NaCl\n")
+            self.assertNotIn("KCl", chemical.load_chemicals())
+
+            with libraries.group_commit(temp_file.name):
+                chemical.add_chemicals_from_files([chemicals_file.name])
+            self.assertEqual(chemical.fetch_chemicals(["KCl"]), {"KCl" : chemical.Chemical(74.55, ["KCl"])})
+            self.assertIn("table_salt", chemical.load_chemicals())
+
+    def test_automatic_compaction(self):
+        """Tests that the journal is folded into the library file once it grows past the compaction threshold."""
+        temp_file = NamedTemporaryFile("w+")
+
+        with open(temp_file.name, "w") as file:
+            file.write("100.0 salt pepper\n")
+
+        with mock.patch("buf.commands.chemical.chemical_library_file", temp_file.name):
+            with mock.patch("buf.libraries.journal_compaction_threshold", 30):
+                chemical.nickname_chemical("salt", ["a"])
+                self.assertFalse(libraries.journal_is_empty(temp_file.name))
+
+                chemical.nickname_chemical("salt", ["b", "c", "d", "e", "f", "g", "h"])
+                self.assertTrue(libraries.journal_is_empty(temp_file.name))
+
+            with open(temp_file.name, "r") as file:
+                self.assertEqual(file.read(), "100.0 salt pepper a b c d e f g h\n")
+
+    def test_large_compaction(self):
+        """Tests that compacting a library of thousands of chemicals takes a couple of seconds at most."""
+        with open(self.chemical_library_file, "w") as file:
+            file.write("".join(str(index + 1) + " chemical" + str(index) + " other" + str(index) + "\n" for index in range(5000)))
+
+        chemical.nickname_chemical("chemical0", ["first"])
+
+        start_time = time.perf_counter()
+        chemical.compact_chemical_library()
+        self.assertLess(time.perf_counter() - start_time, 2)
+
+        self.assertTrue(libraries.journal_is_empty(self.chemical_library_file))
+        with open(self.chemical_library_file, "r") as file:
+            lines = file.read().splitlines()
+        self.assertEqual(len(lines), 5000)
+        self.assertEqual(lines[0], "1.0 chemical0 other0 first")
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
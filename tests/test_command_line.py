@@ -6,11 +6,13 @@
 
 import unittest
 from unittest import mock, TestCase
+from tempfile import NamedTemporaryFile
 from buf.main import line, reset
 import tabulate
 from buf import error_messages
+from helpers import LibraryTestCase
 
-class ChemicalTests(TestCase):
+class ChemicalTests(LibraryTestCase):
     """Testing using 'buf chemical' from the command line."""
 
     def test_single_chemical_addition(self):
@@ -20,10 +22,20 @@ class ChemicalTests(TestCase):
             mock_add.assert_called_with("58.44", ["NaCl", "salt"])
 
     def test_add_chemicals_from_file(self):
-        with mock.patch("buf.commands.chemical.add_chemicals_from_file") as mock_add:
+        with mock.patch("buf.commands.chemical.add_chemicals_from_files") as mock_add:
             reset()
             line("buf chemical -a file.txt")
-            mock_add.assert_called_with("file.txt")
+            mock_add.assert_called_with(["file.txt"], report_all=False)
+
+            line("buf chemical -a file.txt other_file.txt --report-all")
+            mock_add.assert_called_with(["file.txt", "other_file.txt"], report_all=True)
+
+    def test_add_chemicals_from_multiple_files(self):
+        with mock.patch("buf.commands.chemical.add_chemicals_from_files") as mock_add:
+            with NamedTemporaryFile() as first_file, NamedTemporaryFile() as second_file:
+                reset()
+                line("buf chemical -a " + first_file.name + " " + second_file.name)
+                mock_add.assert_called_with([first_file.name, second_file.name])
 
     def test_nickname_chemical(self):
         with mock.patch("buf.commands.chemical.nickname_chemical") as mock_nickname:
@@ -47,7 +59,10 @@ class ChemicalTests(TestCase):
         with mock.patch("buf.commands.chemical.display_chemical_information") as mock_display:
             reset()
             line("buf chemical NaCl")
-            mock_display.assert_called_with("NaCl")
+            mock_display.assert_called_with("NaCl", mock.ANY, format_name = None)
+
+            line("buf chemical NaCl --format=json")
+            mock_display.assert_called_with("NaCl", mock.ANY, format_name = "json")
 
     def test_display_chemical_library(self):
         with mock.patch("buf.commands.chemical.display_chemical_library") as mock_display:
@@ -55,7 +70,18 @@ class ChemicalTests(TestCase):
             line("buf chemical")
             mock_display.assert_called()
 
-class RecipeTests(TestCase):
+            line("buf chemical --limit=20 --offset=40 --plain")
+            mock_display.assert_called_with(mock.ANY, limit=20, offset=40, plain=True, format_name=None)
+
+            line("buf chemical --limit=20 --format=ndjson")
+            mock_display.assert_called_with(mock.ANY, limit=20, offset=None, plain=False, format_name="ndjson")
+
+            with mock.patch("buf.main.print") as mock_print:
+                with self.assertRaises(SystemExit):
+                    line("buf chemical --limit=-1")
+                self.assertIn("Invalid option: '--limit'", str(mock_print.call_args[0][0]))
+
+class RecipeTests(LibraryTestCase):
     """Testing using 'buf recipe' from the command line."""
 
     def test_single_recipe_addition(self):
@@ -65,10 +91,23 @@ class RecipeTests(TestCase):
             mock_add.assert_called_with("my_recipe", ["300mM", "10%"], ["salt", "glycerol"])
 
     def test_add_recipes_from_file(self):
-        with mock.patch("buf.commands.recipe.add_recipes_from_file") as mock_add:
+        with mock.patch("buf.commands.recipe.add_recipes_from_files") as mock_add:
             reset()
             line("buf recipe -a file.txt")
-            mock_add.assert_called_with("file.txt")
+            mock_add.assert_called_with(["file.txt"], report_all=False)
+
+            line("buf recipe -a file.txt --report-all")
+            mock_add.assert_called_with(["file.txt"], report_all=True)
+
+    def test_add_recipes_from_multiple_files(self):
+        with mock.patch("buf.commands.recipe.add_recipes_from_files") as mock_add:
+            with NamedTemporaryFile() as first_file, NamedTemporaryFile() as second_file, NamedTemporaryFile() as third_file:
+                reset()
+                line("buf recipe -a " + first_file.name + " " + second_file.name)
+                mock_add.assert_called_with([first_file.name, second_file.name], report_all=False)
+
+                line("buf recipe -a " + first_file.name + " " + second_file.name + " " + third_file.name)
+                mock_add.assert_called_with([first_file.name, second_file.name, third_file.name])
 
     def test_recipe_deletion(self):
         with mock.patch("buf.commands.recipe.delete_recipe") as mock_deletion:
@@ -83,7 +122,7 @@ class RecipeTests(TestCase):
         with mock.patch("buf.commands.recipe.display_recipe_information") as mock_display:
             reset()
             line("buf recipe my_recipe")
-            mock_display.assert_called_with("my_recipe")
+            mock_display.assert_called_with("my_recipe", mock.ANY, format_name = None)
 
     def test_display_recipe_library(self):
         with mock.patch("buf.commands.recipe.display_recipe_library") as mock_display:
@@ -91,5 +130,67 @@ class RecipeTests(TestCase):
             line("buf recipe")
             mock_display.assert_called()
 
+            line("buf recipe --limit=5")
+            mock_display.assert_called_with(mock.ANY, limit=5, offset=None, plain=False, format_name=None)
+
+class MakeTests(LibraryTestCase):
+    """Testing using 'buf make' from the command line."""
+
+    def test_make_orders_from_file(self):
+        with mock.patch("buf.commands.make.make_orders_from_file") as mock_make:
+            reset()
+            line("buf make --orders orders.csv")
+            mock_make.assert_called_with("orders.csv", library = mock.ANY, format_name = None)
+
+            line("buf make --orders orders.csv --format=ndjson")
+            mock_make.assert_called_with("orders.csv", library = mock.ANY, format_name = "ndjson")
+
+    def test_make_with_format(self):
+        with mock.patch("buf.commands.make.get_buffer_records", return_value = []) as mock_records:
+            with mock.patch("buf.tables.print_records") as mock_print:
+                reset()
+                line("buf make 2L my_recipe --format=csv")
+                mock_records.assert_called_with("2L", "my_recipe", [], [], mock.ANY)
+                mock_print.assert_called_with([], mock.ANY, "csv")
+
+            with mock.patch("buf.main.print") as mock_print:
+                with self.assertRaises(SystemExit):
+                    line("buf make 2L my_recipe --format=xml")
+                self.assertIn("Invalid format: 'xml'", str(mock_print.call_args[0][0]))
+
+class ServeTests(TestCase):
+    """Testing using 'buf serve' from the command line."""
+
+    def test_serve(self):
+        with mock.patch("buf.commands.serve.run_daemon") as mock_run:
+            line("buf serve")
+            mock_run.assert_called()
+
+class HttpTests(TestCase):
+    """Testing using 'buf http' from the command line."""
+
+    def test_http(self):
+        with mock.patch("buf.commands.http.Service") as mock_service, mock.patch("buf.commands.http.asyncio.run"):
+            line("buf http")
+            mock_service.return_value.serve.assert_called_with("127.0.0.1", 8000)
+
+            line("buf http --host 0.0.0.0 --port 8080")
+            mock_service.return_value.serve.assert_called_with("0.0.0.0", 8080)
+
+            with mock.patch("buf.main.print"):
+                with self.assertRaises(SystemExit):
+                    line("buf http --port 99999")
+
+class ErrorTests(LibraryTestCase):
+    """Testing how errors are shown when using buf from the command line."""
+
+    def test_error_message_and_exit_code(self):
+        with mock.patch("buf.commands.recipe.fetch_recipes", return_value = {}):
+            with mock.patch("buf.main.print") as mock_print:
+                with self.assertRaises(SystemExit) as context:
+                    line("buf make 2L unknown_recipe")
+                self.assertEqual(context.exception.code, 1)
+                self.assertIn("Recipe not found: 'unknown_recipe'", str(mock_print.call_args[0][0]))
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
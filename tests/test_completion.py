@@ -0,0 +1,120 @@
+# File name: test_completion.py
+# Author: Jordan Juravsky
+# Date created: 18-10-2026
+
+"""Tests buf.completion and buf.commands.completion."""
+
+from unittest import mock, TestCase
+import unittest
+import os
+import shlex
+import shutil
+import subprocess
+from tempfile import TemporaryDirectory
+from buf import completion, commands
+from buf.commands import chemical, recipe
+from buf.session import Library
+from helpers import LibraryTestCase
+
+subcommand_names = ["chemical", "recipe", "make", "help"]
+chemical_names = ["NaCl", "KCl", "glycerol", "Tris$HCl"]
+recipe_names = ["wash", "elution"]
+unit_symbols = ["L", "mL", "M", "mM", "%"]
+volume_unit_symbols = ["L", "mL"]
+
+# Pairs of the line typed so far (ending with the start of the word being completed) and the expected completions.
+completion_cases = [("", subcommand_names), ("ma", ["make"]), ("help re", ["recipe"]), ("chemical N", ["NaCl"]),
+                    ("chemical -d NaCl --", ["--complete", "--confirm"]), ("chemical -a 58.44 ", ["--report-all"]),
+                    ("chemical -n T", ["Tris$HCl"]), ("recipe -d ", ["elution", "wash"]), ("recipe -a new_recipe ", []),
+                    ("recipe -a new_recipe 300m", ["300mL", "300mM"]), ("recipe -a new_recipe 300mM g", ["glycerol"]),
+                    ("make ", ["--orders"]), ("make 2", ["2L", "2mL"]), ("make 2L w", ["wash"]), ("make 2L 1", ["1%", "1L", "1M", "1mL", "1mM"]),
+                    ("make 2L 300mM ", ["KCl", "NaCl", "Tris$HCl", "glycerol"]), ("make 2L 300mM NaCl ", []),
+                    ("make --orders ", []), ("unknown ", [])]
+
+class TestComplete(TestCase):
+    """Tests completion.complete."""
+
+    def test_candidates(self):
+        """Tests that subcommands, names and units are completed where the usage of each subcommand allows them."""
+        for line, expected_completions in completion_cases:
+            words = line.split(" ")
+            completions = completion.complete(words[:-1] if line != "" else [], words[-1], subcommand_names, chemical_names,
+                                              recipe_names, unit_symbols, volume_unit_symbols)
+            self.assertEqual(completions, sorted(expected_completions), line)
+
+class TestCompletionIndex(LibraryTestCase):
+    """Tests that the completion index is kept up to date as the libraries change, using temporary libraries."""
+
+    chemicals = "58.44 NaCl salt\n"
+    recipes = "wash 300mM NaCl 10% glycerol\n"
+
+    def setUp(self):
+        super().setUp()
+        self.index_file = os.path.join(self.library_dir, "completion.index")
+
+        patches = [mock.patch("buf.commands.chemical.print"), mock.patch("buf.commands.recipe.print")]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_no_index_kept_until_set_up(self):
+        """Tests that no index is written until completion is set up."""
+        chemical.chemical({"-a" : True, "<file_names>" : [], "<molar_mass>" : "74.55", "<chemical_names>" : ["KCl"]})
+        self.assertFalse(os.path.exists(self.index_file))
+
+    def test_index_updated(self):
+        """Tests that the names changed by each command are updated in the index, and that the index is rebuilt if the
+        libraries were changed by something else."""
+        with mock.patch("buf.commands.completion.print"):
+            commands.completion.completion({"bash" : True, "zsh" : False})
+
+        self.assertEqual(completion.read_index()[:2], ({"NaCl", "salt"}, {"wash"}))
+
+        chemical.chemical({"-a" : True, "<file_names>" : [], "<molar_mass>" : "74.55", "<chemical_names>" : ["KCl", "Tris$HCl"]})
+        chemical.chemical({"-a" : False, "-d" : False, "-n" : True, "<existing_chemical_name>" : "NaCl", "<nicknames>" : ["table_salt"]})
+        chemical.chemical({"-a" : False, "-d" : True, "<chemical_name>" : "NaCl", "--complete" : True, "--confirm" : True})
+        recipe.recipe({"-a" : True, "<file_names>" : [], "<recipe_name>" : "elution", "<concentrations>" : ["1M"], "<chemical_names>" : ["KCl"]})
+
+        self.assertEqual(completion.read_index()[:2], ({"KCl", "Tris$HCl"}, {"wash", "elution"}))
+
+        with open(self.recipe_library_file, "a") as file:
+            file.write("lysis 50mM KCl\n")
+
+        recipe.recipe({"-a" : False, "-d" : True, "<recipe_name>" : "wash", "--confirm" : True})
+        self.assertEqual(completion.read_index()[:2], ({"KCl", "Tris$HCl"}, {"elution", "lysis"}))
+
+    def test_script(self):
+        """Tests that the scripts name the index file, and list the subcommands."""
+        for shell_name in ["bash", "zsh"]:
+            script = completion.get_script(shell_name, commands.subcommand_names)
+            self.assertIn(shlex.quote(self.index_file), script)
+            self.assertIn("completion", script)
+            self.assertNotIn("SUBCOMMAND_NAMES", script)
+
+@unittest.skipIf(shutil.which("bash") == None, "bash is not installed.")
+class TestBashScript(TestCase):
+    """Tests that the bash completion script completes the same words as completion.complete."""
+
+    def test_same_completions(self):
+        with TemporaryDirectory() as directory:
+            index_file = os.path.join(directory, "completion.index")
+            script_file = os.path.join(directory, "buf.bash")
+
+            with mock.patch("buf.completion.completion_index_file", index_file), \
+                 mock.patch("buf.unit.valid_units", unit_symbols), \
+                 mock.patch("buf.unit.volume_units.get_symbols", return_value = volume_unit_symbols):
+                completion.write_index(chemical_names, recipe_names, None)
+
+                with open(script_file, "w") as file:
+                    file.write(completion.get_script("bash", subcommand_names))
+
+            for line, expected_completions in completion_cases:
+                words = ["buf"] + line.split(" ")
+                command = "source " + shlex.quote(script_file) + "; COMP_WORDS=(" + " ".join(shlex.quote(word) for word in words) \
+                          + "); COMP_CWORD=" + str(len(words) - 1) + "; _buf; printf '%s\\n' \"${COMPREPLY[@]}\""
+                output = subprocess.run(["bash", "--norc", "-c", command], stdout=subprocess.PIPE, check=True).stdout.decode("utf-8")
+
+                self.assertEqual(sorted(word for word in output.split("\n") if word != ""), sorted(expected_completions), line)
+
+if __name__ == '__main__':
+    unittest.main()
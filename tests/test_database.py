@@ -0,0 +1,127 @@
+# File name: test_database.py
+# Author: Jordan Juravsky
+# Date created: 18-10-2026
+
+"""Tests buf.database, as well as the chemical and recipe subcommands when the libraries are stored in a database."""
+
+from unittest import mock
+import unittest
+from buf import database
+from buf.exceptions import BufError
+from buf.commands import chemical, recipe, make, migrate
+from helpers import LibraryTestCase
+
+class DatabaseTestCase(LibraryTestCase):
+    """Base class that points buf.database at a fresh database in a temporary library directory for each test."""
+
+    def setUp(self):
+        super().setUp()
+        database.create_database([(58.44, ["NaCl", "salt"]), (74.55, ["KCl"])],
+                                 [("wash", "300mM NaCl 10% glycerol"), ("elution", "4g KCl")])
+
+class TestDatabase(DatabaseTestCase):
+    """Tests the functions in buf.database."""
+
+    def test_is_active(self):
+        """Tests that the database is only used once it has been created."""
+        self.assertTrue(database.is_active())
+        database.reset()
+        self.assertFalse(database.is_active())
+
+    def test_fetch_chemicals(self):
+        """Tests that fetching a chemical by any of its names returns its molar mass and all its names, and that \
+        unknown names are left out."""
+        fetched = database.fetch_chemicals(["salt", "unknown"])
+        self.assertEqual(fetched, {"salt" : (58.44, ["NaCl", "salt"])})
+
+    def test_fetch_in_chunks(self):
+        """Tests that long lists of names are looked up in several queries, each within SQLite's parameter limit."""
+        names = ["unknown_" + str(index) for index in range(40000)] + ["salt", "KCl", "NaCl"]
+        self.assertEqual(database.fetch_chemicals(names), {"salt" : (58.44, ["NaCl", "salt"]), "KCl" : (74.55, ["KCl"]),
+                                                            "NaCl" : (58.44, ["NaCl", "salt"])})
+        self.assertEqual(database.fetch_recipes(names[:-3] + ["wash"]), {"wash" : "300mM NaCl 10% glycerol"})
+
+        with mock.patch("buf.database.max_query_names", 2):
+            self.assertEqual(database.fetch_chemicals(["salt", "KCl", "NaCl"])["NaCl"], (58.44, ["NaCl", "salt"]))
+            self.assertEqual(set(database.fetch_recipes(["elution", "x", "wash"])), {"elution", "wash"})
+
+    def test_nickname_and_delete_chemical(self):
+        """Tests nicknaming a chemical, and that a chemical is removed once all of its names are deleted."""
+        database.nickname_chemical("KCl", ["potassium_chloride"])
+        self.assertEqual(database.fetch_chemicals(["KCl"]), {"KCl" : (74.55, ["KCl", "potassium_chloride"])})
+
+        database.delete_chemical_names(["KCl", "potassium_chloride"])
+        self.assertEqual(database.load_chemicals(), [(58.44, ["NaCl", "salt"])])
+
+    def test_transactional_add(self):
+        """Tests that a failed addition (here, due to a name that is already in use) leaves the database unchanged."""
+        with self.assertRaises(Exception):
+            database.add_chemicals([(1.0, ["new_chemical"]), (2.0, ["NaCl"])])
+        self.assertEqual(database.fetch_chemicals(["new_chemical"]), {})
+
+    def test_recipes(self):
+        """Tests fetching, adding and deleting recipes."""
+        self.assertEqual(database.fetch_recipes(["wash", "unknown"]), {"wash" : "300mM NaCl 10% glycerol"})
+
+        database.add_recipes([("refold", "500mM Arg")])
+        database.delete_recipe("wash")
+        self.assertEqual(database.load_recipes(), [("elution", "4g KCl"), ("refold", "500mM Arg")])
+
+class TestCommandsWithDatabase(DatabaseTestCase):
+    """Tests that the chemical, recipe and make subcommands use the database once it exists."""
+
+    def test_chemical_commands(self):
+        """Tests adding, nicknaming and deleting chemicals."""
+        chemical.add_single_chemical("68.08", ["imidazole"])
+        chemical.nickname_chemical("imidazole", ["imi"])
+        chemical.delete_chemical("NaCl", prompt_for_confirmation=False)
+
+        with mock.patch("buf.commands.chemical.print"):
+            with self.assertRaises(BufError):
+                chemical.add_single_chemical("10", ["imi"])
+
+        self.assertEqual(chemical.load_chemicals(), {"salt" : chemical.Chemical(58.44, ["salt"]), "KCl" : chemical.Chemical(74.55, ["KCl"]),
+                                                     "imidazole" : chemical.Chemical(68.08, ["imidazole", "imi"]),
+                                                     "imi" : chemical.Chemical(68.08, ["imidazole", "imi"])})
+
+    def test_recipe_commands(self):
+        """Tests adding and deleting recipes."""
+        recipe.add_single_recipe("refold", ["1M"], ["salt"])
+        recipe.delete_recipe("wash", prompt_for_confirmation=False)
+
+        self.assertEqual(recipe.load_recipes(), {"elution" : recipe.Recipe("elution", ["4g"], ["KCl"]),
+                                                 "refold" : recipe.Recipe("refold", ["1M"], ["salt"])})
+
+    def test_make(self):
+        """Tests that making a recipe only reads the recipe and chemicals involved from the database."""
+        with mock.patch("buf.commands.recipe.load_recipes", side_effect=AssertionError):
+            with mock.patch("buf.commands.chemical.load_chemicals", side_effect=AssertionError):
+                test_buffer_instructions = make.BufferInstructions(2, make.get_recipe("wash"))
+
+        self.assertEqual(test_buffer_instructions.steps, [make.Step("NaCl", "300mM", "35.06g"), make.Step("glycerol", "10%", "200.0mL")])
+
+class TestMigrate(LibraryTestCase):
+    """Tests migrate.migrate_libraries."""
+
+    chemicals = "58.44 NaCl salt\n74.55 KCl\n"
+    recipes = "wash 300mM NaCl 10% glycerol\n"
+
+    def test_migration(self):
+        """Tests that the contents of the library files are copied into the database."""
+        with mock.patch("buf.commands.migrate.print"):
+            text_chemicals = chemical.load_chemicals()
+            text_recipes = recipe.load_recipes()
+
+            migrate.migrate_libraries()
+
+            self.assertTrue(database.is_active())
+            self.assertEqual(text_chemicals, chemical.load_chemicals())
+            self.assertEqual(text_recipes, recipe.load_recipes())
+
+            # Migration is one-shot.
+            with mock.patch("buf.error_messages.print"):
+                with self.assertRaises(BufError):
+                    migrate.migrate_libraries()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -5,32 +5,41 @@
 """Tests buf.error_messages."""
 
 from buf import error_messages
+from buf.exceptions import BufError
 from inspect import getmembers, isfunction, signature
-from unittest import TestCase, mock
+from unittest import TestCase
 import unittest
 
 class TestErrorMessages(TestCase):
     """Wrapper class that tests the error_messages module as a whole."""
 
-    def test_each_method_prints_and_exits(self):
-        """Verifies that each method in the module prints out an error messages to the user and raises SysExit (exits the program)."""
-        with mock.patch("buf.error_messages.print") as mock_print:
-            function_tuples = getmembers(error_messages, isfunction)
+    def test_each_method_raises(self):
+        """Verifies that each method in the module raises a BufError, whose message describes the error to the user."""
+        function_tuples = getmembers(error_messages, isfunction)
 
-            for function_name, function_object in function_tuples:
+        for function_name, function_object in function_tuples:
 
-                num_parameters = len(signature(function_object).parameters)
+            num_parameters = len(signature(function_object).parameters)
 
-                # Since all the functions are doing with their arguments is printing them out (and sometimes, in the case
-                # of arguments that are line numbers, incrementing the argument by one before printing it out),
-                # simply replacing each argument with an integer should work fine.
-                dummy_parameters = [1 for _ in range(num_parameters)]
+            # Since all the functions are doing with their arguments is putting them in the error message (and sometimes, in the case
+            # of arguments that are line numbers, incrementing the argument by one first), simply replacing each argument with an
+            # integer should work fine.
+            dummy_parameters = [1 for _ in range(num_parameters)]
 
-                with self.assertRaises(SystemExit):
-                    function_object(*dummy_parameters)
+            with self.assertRaises(BufError) as context:
+                function_object(*dummy_parameters)
 
-                mock_print.assert_called()
-                mock_print.reset_mock()
+            self.assertNotEqual(str(context.exception), "")
+
+    def test_termination_cause(self):
+        """Tests that the error that caused a line of a file to be rejected is shown before the line itself."""
+        cause = BufError("Invalid molar mass: 'x' is not a number.")
+
+        with self.assertRaises(BufError) as context:
+            error_messages.add_from_file_termination(0, "x salt", "Chemicals", cause=cause)
+
+        self.assertEqual(str(context.exception), "Invalid molar mass: 'x' is not a number.\n"
+                                                 "Error encountered on line 1: 'x salt'. Chemicals specified in file not added to library.")
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -7,7 +7,6 @@
 from unittest import mock, TestCase
 import unittest
 from buf import commands
-from inspect import getmembers, ismodule
 from buf.commands import help
 
 class TestHelp(TestCase):
@@ -24,7 +23,8 @@ class TestHelp(TestCase):
 
     def test_module_instructions_print(self):
         """Tests that a module's 'instructions' docstring is printed when the modules name is called with help."""
-        module_tuples = getmembers(commands, ismodule)
+        # Subcommand modules are imported lazily, so they are listed by name rather than found among commands' members.
+        module_tuples = [(module_name, getattr(commands, module_name)) for module_name in commands.subcommand_names]
 
         with mock.patch("buf.commands.help.print") as mock_print:
             for module_name, module in module_tuples:
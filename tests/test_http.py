@@ -0,0 +1,175 @@
+# File name: test_http.py
+# Author: Jordan Juravsky
+# Date created: 18-10-2026
+
+"""Tests buf.commands.http."""
+
+from unittest import mock
+import unittest
+import json
+import asyncio
+from buf.commands import http, make
+from helpers import LibraryTestCase
+
+async def send_request(port: int, method: str, target: str, body: bytes = b""):
+    """Sends an HTTP request to the service listening on the given port, returning the response's status code and JSON."""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write((method + " " + target + " HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n"
+                  + "Content-Length: " + str(len(body)) + "\r\n\r\n").encode("latin-1") + body)
+    await writer.drain()
+
+    response = await reader.read()
+    writer.close()
+
+    head, separator, content = response.partition(b"\r\n\r\n")
+    return int(head.split()[1]), json.loads(content.decode("utf-8"))
+
+class TestService(LibraryTestCase):
+    """Tests http.Service, by sending requests to a service listening on a free port, using temporary libraries."""
+
+    chemicals = "58.44 NaCl salt\n74.55 KCl\n"
+    recipes = "wash 300mM NaCl 10% glycerol\nelution 150mM KCl 500mM NaCl\n"
+
+    def setUp(self):
+        super().setUp()
+        self.service = http.Service()
+
+    def run_requests(self, *requests):
+        """Starts the service, sends the given (method, target, body) requests to it all at once, and returns their responses."""
+        async def run():
+            server = await asyncio.start_server(self.service.handle_connection, "127.0.0.1", 0)
+            port = server.sockets[0].getsockname()[1]
+            async with server:
+                return await asyncio.gather(*[send_request(port, *request) for request in requests])
+
+        return asyncio.run(run())
+
+    def test_lookup(self):
+        """Tests looking up chemicals and recipes, and that names that don't exist are answered with a 404."""
+        responses = self.run_requests(("GET", "/chemicals/salt"), ("GET", "/recipes/wash"), ("GET", "/chemicals/unknown"),
+                                      ("GET", "/recipes/unknown"), ("GET", "/unknown"))
+
+        self.assertEqual(responses[0], (200, {"names" : ["NaCl", "salt"], "molar_mass" : 58.44}))
+        self.assertEqual(responses[1], (200, {"name" : "wash", "concentrations" : ["300mM", "10%"], "chemical_names" : ["NaCl", "glycerol"]}))
+        self.assertEqual(responses[2][0], 404)
+        self.assertIn("'unknown' does not exist", responses[2][1]["error"])
+        self.assertEqual(responses[3][0], 404)
+        self.assertEqual(responses[4][0], 400)
+
+    def test_make(self):
+        """Tests making recipes and buffers defined on the spot, with GET and POST requests, and that invalid orders are
+        answered with a 400 without affecting the other orders made with them."""
+        responses = self.run_requests(("GET", "/make?volume=2L&recipe=wash"),
+                                      ("POST", "/make", json.dumps({"volume" : "1L", "concentrations" : ["1M"], "chemical_names" : ["KCl"]}).encode()),
+                                      ("GET", "/make?volume=2g&recipe=wash"),
+                                      ("POST", "/make", b"not json"),
+                                      ("GET", "/make?volume=1L&recipe=unknown"))
+
+        self.assertEqual(responses[0], (200, [{"name" : "NaCl", "concentration" : "300mM", "amount_to_add" : "35.06g"},
+                                              {"name" : "glycerol", "concentration" : "10%", "amount_to_add" : "200.0mL"}]))
+        self.assertEqual(responses[1], (200, [{"name" : "KCl", "concentration" : "1M", "amount_to_add" : "74.55g"}]))
+        self.assertEqual(responses[2][0], 400)
+        self.assertIn("Invalid volume unit", responses[2][1]["error"])
+        self.assertEqual(responses[3][0], 400)
+        self.assertEqual(responses[4][0], 404)
+
+    def test_orders_made_together(self):
+        """Tests that orders arriving together are made in one batch, with the same results as making each on its own."""
+        volumes = ["1L", "250mL", "2L", "5L", "750mL", "10mL"]
+        responses = self.run_requests(*[("GET", "/make?volume=" + volume + "&recipe=" + recipe_name)
+                                        for volume in volumes for recipe_name in ["wash", "elution"]])
+
+        self.assertLess(self.service.batch_count, len(responses))
+        self.assertGreater(self.service.largest_batch, 1)
+
+        for (status, steps), (volume, recipe_name) in zip(responses, [(volume, recipe_name) for volume in volumes
+                                                                      for recipe_name in ["wash", "elution"]]):
+            expected_steps = make.BufferInstructions(make.get_buffer_litres(volume), make.get_recipe(recipe_name, self.service.library),
+                                                     self.service.library).steps
+            self.assertEqual(status, 200)
+            self.assertEqual(steps, [{"name" : step.name, "concentration" : step.concentration, "amount_to_add" : step.amount_to_add}
+                                     for step in expected_steps])
+
+    def test_cancelled_order(self):
+        """Tests that an invalid order whose request was cancelled doesn't stop the rest of its batch being made."""
+        async def run():
+            loop = asyncio.get_running_loop()
+            cancelled_future, future = loop.create_future(), loop.create_future()
+            cancelled_future.cancel()
+
+            self.service.pending_orders = [(http.get_order_from_query({"volume" : ["2g"], "recipe" : ["wash"]}), cancelled_future),
+                                           (http.get_order_from_query({"volume" : ["2L"], "recipe" : ["wash"]}), future)]
+            self.service.make_pending_orders()
+            return await future
+
+        self.assertEqual(asyncio.run(run())[0], make.Step("NaCl", "300mM", "35.06g"))
+
+    def test_body_too_large(self):
+        """Tests that requests with a body larger than http.max_body_size are refused, over HTTP and ASGI."""
+        with mock.patch("buf.commands.http.max_body_size", 10):
+            responses = self.run_requests(("POST", "/make", json.dumps({"volume" : "1L", "recipe" : "wash"}).encode()))
+            self.assertEqual(responses[0][0], 400)
+            self.assertIn("larger than 10 bytes", responses[0][1]["error"])
+
+            messages = [{"type" : "http.request", "body" : b"{\"volume\" : ", "more_body" : True},
+                        {"type" : "http.request", "body" : b"\"1L\", \"recipe\" : \"wash\"}", "more_body" : False}]
+            sent = []
+
+            async def receive():
+                return messages.pop(0)
+
+            async def send(message):
+                sent.append(message)
+
+            asyncio.run(self.service({"type" : "http", "method" : "POST", "path" : "/make", "query_string" : b""}, receive, send))
+            self.assertEqual(sent[0]["status"], 400)
+
+    def test_make_without_numpy(self):
+        """Tests that orders are made one at a time when NumPy isn't installed."""
+        with mock.patch.dict("sys.modules", {"numpy" : None}):
+            responses = self.run_requests(("GET", "/make?volume=2L&recipe=wash"), ("GET", "/make?volume=1L&recipe=elution"))
+
+        self.assertEqual(responses[0][1][0]["amount_to_add"], "35.06g")
+        self.assertEqual(responses[1][1], [{"name" : "KCl", "concentration" : "150mM", "amount_to_add" : "11.18g"},
+                                           {"name" : "NaCl", "concentration" : "500mM", "amount_to_add" : "29.22g"}])
+
+    def test_reload_and_health(self):
+        """Tests that changes to the libraries are only seen after reloading, and that the health check counts requests."""
+        with open(self.chemical_library_file, "a") as file:
+            file.write("154.25 DTT\n")
+
+        responses = self.run_requests(("GET", "/chemicals/DTT"))
+        self.assertEqual(responses[0][0], 404)
+
+        responses = self.run_requests(("POST", "/reload"))
+        self.assertEqual(responses[0], (200, {"chemicals" : 4, "recipes" : 2}))
+
+        responses = self.run_requests(("GET", "/chemicals/DTT"), ("GET", "/reload"))
+        self.assertEqual(responses[0][0], 200)
+        self.assertEqual(responses[1][0], 400)
+
+        status, health = self.run_requests(("GET", "/health"))[0]
+        self.assertEqual(status, 200)
+        self.assertEqual(health["status"], "ok")
+        self.assertEqual(health["requests"], 5)
+        self.assertGreaterEqual(health["latency_ms"]["max"], health["latency_ms"]["p50"])
+
+    def test_asgi(self):
+        """Tests answering a request as an ASGI application."""
+        messages = [{"type" : "http.request", "body" : b"", "more_body" : False}]
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {"type" : "http", "method" : "GET", "path" : "/make", "query_string" : b"volume=1L&recipe=elution"}
+        asyncio.run(self.service(scope, receive, send))
+
+        self.assertEqual(sent[0]["status"], 200)
+        self.assertEqual(json.loads(sent[1]["body"])[1], {"name" : "NaCl", "concentration" : "500mM", "amount_to_add" : "29.22g"})
+
+if __name__ == '__main__':
+    unittest.main()
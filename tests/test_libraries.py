@@ -7,9 +7,12 @@
 from unittest import TestCase, mock
 import unittest
 from buf import libraries
+from buf.exceptions import BufError, LibraryError
 import os
 import sys
 import tempfile
+import subprocess
+import pickle
 
 class TestMakeDir(TestCase):
     """Tests buf.libraries.make_library."""
@@ -72,6 +75,328 @@ class TestAddLibraryFile(TestCase):
                     libraries.add_library_file(test_file_name)
                     mock_open.assert_called_with(test_file_path, "w")
 
+class TestLibraryCache(TestCase):
+    """Tests buf.libraries.load_cached_library and buf.libraries.cache_library."""
+
+    def test_cache_round_trip(self):
+        """Tests that a cached library is returned as long as the library file is unchanged, and that the library file is
+        only read when its size or modification time has changed."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            file_path = os.path.join(temp_dir, "chemicals.txt")
+            with open(file_path, "w") as file:
+                file.write("58.44 NaCl\n")
+
+            self.assertIsNone(libraries.load_cached_library(file_path, dict))
+
+            libraries.cache_library(file_path, libraries.get_file_signature(file_path), "58.44 NaCl\n", [["NaCl", 58.44]])
+            with mock.patch("buf.libraries.hash_file_contents", side_effect = AssertionError):
+                self.assertEqual(libraries.load_cached_library(file_path, dict), {"NaCl" : 58.44})
+
+            # Rewriting the file with the same contents changes its modification time, but not its hash.
+            os.utime(file_path, ns=(0, 0))
+            self.assertEqual(libraries.load_cached_library(file_path, dict), {"NaCl" : 58.44})
+
+            with open(file_path, "a") as file:
+                file.write("74.55 KCl\n")
+            self.assertIsNone(libraries.load_cached_library(file_path, dict))
+
+    def test_corrupt_cache(self):
+        """Tests that a corrupt cache file, or one holding anything but plain entries, is ignored rather than crashing the
+        program (or being run)."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            file_path = os.path.join(temp_dir, "chemicals.txt")
+            with open(file_path, "w") as file:
+                file.write("58.44 NaCl\n")
+
+            for cache_contents in [b"not a cache", pickle.dumps(("hash", {"NaCl" : 58.44}))]:
+                with open(libraries.fetch_cache_file_path(file_path), "wb") as file:
+                    file.write(cache_contents)
+
+                self.assertIsNone(libraries.load_cached_library(file_path, dict))
+
+            libraries.cache_library(file_path, libraries.get_file_signature(file_path), "58.44 NaCl\n", [["NaCl"]])
+            self.assertIsNone(libraries.load_cached_library(file_path, dict))
+
+    def test_loading_skips_validation(self):
+        """Tests that loading an unchanged chemical library uses the cache instead of re-validating each chemical."""
+        from buf.commands import chemical
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            file_path = os.path.join(temp_dir, "chemicals.txt")
+            with open(file_path, "w") as file:
+                file.write("58.44 NaCl salt\n")
+
+            with mock.patch("buf.commands.chemical.chemical_library_file", file_path):
+                first_load = chemical.load_chemicals()
+
+                with mock.patch("buf.commands.chemical.make_safe_chemical", side_effect = AssertionError):
+                    self.assertEqual(first_load, chemical.load_chemicals())
+
+                with open(file_path, "a") as file:
+                    file.write("74.55 KCl\n")
+
+                self.assertIn("KCl", chemical.load_chemicals())
+
+class TestLibraryIndex(TestCase):
+    """Tests buf.libraries.find_indexed_line and buf.libraries.index_appended_lines."""
+
+    @staticmethod
+    def line_names(words):
+        return words[1:]
+
+    def test_lookup(self):
+        """Tests that each name in a library file is found on the line that defines it, and that unknown names are not found."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            file_path = os.path.join(temp_dir, "chemicals.txt")
+            with open(file_path, "w") as file:
+                for number in range(1000):
+                    file.write(str(number + 1) + " name" + str(number) + " nickname" + str(number) + "\n")
+
+            self.assertEqual(libraries.find_indexed_line(file_path, "name500", self.line_names), "501 name500 nickname500\n")
+            self.assertEqual(libraries.find_indexed_line(file_path, "nickname999", self.line_names), "1000 name999 nickname999\n")
+            self.assertIsNone(libraries.find_indexed_line(file_path, "unknown", self.line_names))
+
+    def test_appending_and_rewriting(self):
+        """Tests that the index picks up lines appended to the library file, as well as a library file that was rewritten."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            file_path = os.path.join(temp_dir, "chemicals.txt")
+            with open(file_path, "w") as file:
+                file.write("58.44 NaCl salt\n")
+
+            self.assertIsNone(libraries.find_indexed_line(file_path, "KCl", self.line_names))
+
+            signature = libraries.get_file_signature(file_path)
+            with open(file_path, "a") as file:
+                file.write("74.55 KCl\n")
+            libraries.index_appended_lines(file_path, signature, self.line_names)
+
+            with mock.patch("buf.libraries.build_index", side_effect = AssertionError):
+                self.assertEqual(libraries.find_indexed_line(file_path, "KCl", self.line_names), "74.55 KCl\n")
+
+            with open(file_path, "w") as file:
+                file.write("74.55 KCl potassium_chloride\n")
+
+            self.assertIsNone(libraries.find_indexed_line(file_path, "salt", self.line_names))
+            self.assertEqual(libraries.find_indexed_line(file_path, "potassium_chloride", self.line_names), "74.55 KCl potassium_chloride\n")
+
+@unittest.skipIf(libraries.fcntl == None, "Library locking requires fcntl.")
+class TestLockLibrary(TestCase):
+    """Tests buf.libraries.lock_library."""
+
+    def lock_from_elsewhere(self, file_path, operation):
+        """Locks a library file through a separate open file description, as another buf process would."""
+        file_descriptor = os.open(libraries.fetch_lock_file_path(file_path), os.O_RDWR | os.O_CREAT)
+        libraries.fcntl.flock(file_descriptor, operation)
+        return file_descriptor
+
+    def test_shared_locks(self):
+        """Tests that any number of readers can hold a shared lock at once."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            file_path = os.path.join(temp_dir, "chemicals.txt")
+            other_reader = self.lock_from_elsewhere(file_path, libraries.fcntl.LOCK_SH)
+
+            with libraries.lock_library(file_path):
+                self.assertIn(file_path, libraries.held_locks)
+
+            self.assertNotIn(file_path, libraries.held_locks)
+            os.close(other_reader)
+
+    def test_bounded_wait(self):
+        """Tests that waiting for a lock held by another process gives up (raising a BufError) after lock_timeout seconds."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            file_path = os.path.join(temp_dir, "chemicals.txt")
+            other_writer = self.lock_from_elsewhere(file_path, libraries.fcntl.LOCK_EX)
+
+            with mock.patch("buf.libraries.lock_timeout", 0.1):
+                with self.assertRaises(BufError) as context:
+                    with libraries.lock_library(file_path):
+                        pass
+                self.assertIn("Library busy", str(context.exception))
+
+            os.close(other_writer)
+
+            with libraries.lock_library(file_path, exclusive=True):
+                pass
+
+    def test_nested_locks(self):
+        """Tests that a function holding a lock can call another function that takes the same lock."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            file_path = os.path.join(temp_dir, "chemicals.txt")
+
+            with libraries.lock_library(file_path, exclusive=True):
+                with libraries.lock_library(file_path):
+                    pass
+                self.assertEqual(libraries.held_locks[file_path][2], 1)
+
+    def test_lock_file_shared(self):
+        """Tests that new lock files can be opened by every user, and that a lock file that can't be opened raises a
+        LibraryError."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            file_path = os.path.join(temp_dir, "chemicals.txt")
+
+            with libraries.lock_library(file_path):
+                pass
+            self.assertEqual(os.stat(libraries.fetch_lock_file_path(file_path)).st_mode & 0o777, 0o666)
+
+            with mock.patch("buf.libraries.os.open", side_effect = PermissionError(13, "Permission denied")):
+                with self.assertRaises(LibraryError) as context:
+                    with libraries.lock_library(file_path):
+                        pass
+                self.assertIn("Permission denied", str(context.exception))
+
+class TestWriteFileAtomically(TestCase):
+    """Tests buf.libraries.write_file_atomically."""
+
+    def test_replacement(self):
+        """Tests that the file's contents are replaced, its permissions are kept, and no temporary files are left behind."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            file_path = os.path.join(temp_dir, "chemicals.txt")
+            with open(file_path, "w") as file:
+                file.write("58.44 NaCl\n")
+            os.chmod(file_path, 0o644)
+
+            with mock.patch("buf.libraries.os.fsync") as mock_fsync:
+                libraries.write_file_atomically(file_path, b"74.55 KCl\n", durable=True)
+                mock_fsync.assert_called()
+
+            with open(file_path, "r") as file:
+                self.assertEqual(file.read(), "74.55 KCl\n")
+            self.assertEqual(os.stat(file_path).st_mode & 0o777, 0o644)
+            self.assertEqual(os.listdir(temp_dir), ["chemicals.txt"])
+
+    def test_new_file_permissions(self):
+        """Tests that new files are given the permissions open() would give them, rather than being readable only by their owner."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            file_path = os.path.join(temp_dir, "chemicals.txt.cache")
+
+            with mock.patch("buf.libraries.umask", 0o022):
+                libraries.write_file_atomically(file_path, b"contents")
+            self.assertEqual(os.stat(file_path).st_mode & 0o777, 0o644)
+
+    def test_failed_write(self):
+        """Tests that the original file is left untouched if writing the new contents fails."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            file_path = os.path.join(temp_dir, "chemicals.txt")
+            with open(file_path, "w") as file:
+                file.write("58.44 NaCl\n")
+
+            with mock.patch("buf.libraries.os.replace", side_effect = OSError):
+                with self.assertRaises(OSError):
+                    libraries.write_file_atomically(file_path, b"74.55 KCl\n", durable=True)
+
+            with open(file_path, "r") as file:
+                self.assertEqual(file.read(), "58.44 NaCl\n")
+            self.assertEqual(os.listdir(temp_dir), ["chemicals.txt"])
+
+class TestGroupCommit(TestCase):
+    """Tests buf.libraries.group_commit."""
+
+    def test_single_write(self):
+        """Tests that journal records written during a group commit are visible straight away, but only written to \
+        disk (in one go) once the group commit ends."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            file_path = os.path.join(temp_dir, "chemicals.txt")
+
+            with mock.patch("buf.libraries.flush_journal_records", wraps = libraries.flush_journal_records) as mock_flush:
+                with libraries.group_commit(file_path):
+                    libraries.append_journal_records(file_path, ["delete a"])
+                    libraries.append_journal_records(file_path, ["delete b", "delete c"])
+
+                    self.assertEqual(libraries.read_journal(file_path), [["delete", "a"], ["delete", "b"], ["delete", "c"]])
+                    self.assertFalse(os.path.exists(libraries.fetch_journal_file_path(file_path)))
+
+                mock_flush.assert_called_once_with(file_path, ["delete a", "delete b", "delete c"])
+
+            self.assertEqual(libraries.read_journal(file_path), [["delete", "a"], ["delete", "b"], ["delete", "c"]])
+
+    def test_failed_group(self):
+        """Tests that none of the changes made in a group commit are written if an error occurs partway through."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            file_path = os.path.join(temp_dir, "chemicals.txt")
+
+            with self.assertRaises(BufError):
+                with libraries.group_commit(file_path):
+                    libraries.append_journal_records(file_path, ["delete a"])
+                    raise BufError("Invalid input.")
+
+            self.assertEqual(libraries.read_journal(file_path), [])
+            self.assertEqual(libraries.pending_journal_records, {})
+
+
+class TestResidentLibraries(TestCase):
+    """Tests buf.libraries.load_resident_library."""
+
+    def test_reloading(self):
+        """Tests that a library kept in memory is only read again once one of its files changes."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            file_path = os.path.join(temp_dir, "chemicals.txt")
+            journal_file_path = libraries.fetch_journal_file_path(file_path)
+            with open(file_path, "w") as file:
+                file.write("58.44 NaCl\n")
+
+            read_library = mock.Mock(side_effect = lambda: {"read" : read_library.call_count})
+
+            with mock.patch("buf.libraries.resident_libraries", None):
+                # Without keeping libraries in memory, the library is read every time.
+                libraries.load_resident_library([file_path, journal_file_path], read_library)
+                libraries.load_resident_library([file_path, journal_file_path], read_library)
+                self.assertEqual(read_library.call_count, 2)
+
+                libraries.keep_libraries_in_memory()
+
+                first_library = libraries.load_resident_library([file_path, journal_file_path], read_library)
+                self.assertIs(libraries.load_resident_library([file_path, journal_file_path], read_library), first_library)
+                self.assertEqual(read_library.call_count, 3)
+
+                # Creating the journal changes the library's signature.
+                with open(journal_file_path, "w") as file:
+                    file.write("delete NaCl\n")
+
+                self.assertIsNot(libraries.load_resident_library([file_path, journal_file_path], read_library), first_library)
+                self.assertEqual(read_library.call_count, 4)
+
+class TestBulkImports(TestCase):
+    """Tests the helpers used to add chemicals and recipes from files."""
+
+    def test_expand_file_names(self):
+        """Tests that glob patterns are expanded in sorted order, and that other file names are kept as they are."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            for file_name in ["b.txt", "a.txt", "c.csv"]:
+                with open(os.path.join(temp_dir, file_name), "w"):
+                    pass
+
+            pattern = os.path.join(temp_dir, "*.txt")
+            missing_file = os.path.join(temp_dir, "missing.txt")
+
+            self.assertEqual(libraries.expand_file_names([pattern, missing_file]),
+                             [os.path.join(temp_dir, "a.txt"), os.path.join(temp_dir, "b.txt"), missing_file])
+            self.assertTrue(libraries.is_file_name(pattern))
+            self.assertFalse(libraries.is_file_name(missing_file))
+
+    def test_staged_lines(self):
+        """Tests that staged lines keep the line number and contents of the line they were made from."""
+        staged_line = libraries.stage_line(4, "58.44 NaCl  salt\n")
+        self.assertEqual(staged_line, "4 58.44 NaCl  salt\n")
+        self.assertEqual(libraries.unstage_line(staged_line), (4, "58.44 NaCl  salt"))
+
+class TestImportSideEffects(TestCase):
+    """Tests that importing buf doesn't touch one's library."""
+
+    def test_no_files_created(self):
+        """Tests that importing every module in buf, in a fresh process, doesn't create the library directory or any
+        library files, and that tabulate and docopt are not imported until they are needed."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            code = "; ".join(["import sys",
+                              "sys.prefix = " + repr(temp_dir),
+                              "import buf.main, buf.client, buf.database",
+                              "import buf.commands.chemical, buf.commands.recipe, buf.commands.make, buf.commands.serve",
+                              "print('tabulate' in sys.modules, 'docopt' in sys.modules)"])
+            repository_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+            output = subprocess.run([sys.executable, "-c", code], cwd=repository_dir, capture_output=True, text=True, check=True).stdout
+
+            self.assertEqual(os.listdir(temp_dir), [])
+            self.assertEqual(output.strip(), "False False")
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -6,18 +6,29 @@
 
 from unittest import mock, TestCase
 import unittest
+import csv
+import io
+import json
+import pickle
 from buf.commands import make, recipe, chemical
 from buf import unit
+from buf.exceptions import BufError
+from helpers import LibraryTestCase
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 class TestGetBufferLitres(TestCase):
     """Tests make.get_buffer_litres."""
 
     def test_invalid_inputs(self):
-        """Tests that the function properly handles (i.e. raise SystemExit) for inputs that have either non-positive \
+        """Tests that the function properly handles (i.e. raises a BufError) for inputs that have either non-positive \
         magnitudes or a unit that is not one of volume."""
         with mock.patch("buf.commands.make.print") as mock_print:
             for invalid_volume in ["10", "0L", "L", "45g", "-12L"]:
-                with self.assertRaises(SystemExit):
+                with self.assertRaises(BufError):
                     make.get_buffer_litres(invalid_volume)
                     mock_print.assert_called()
                     mock_print.reset_mock()
@@ -71,6 +82,20 @@ class TestCalculateAmountToAdd(TestCase):
                                  make.calculate_amount_to_add(buffer_volume, str(input)+"M", "NaCl", chemical_library))
 
 
+    def test_compound_units(self):
+        """Tests the amounts calculated for concentrations given in moles and mass per volume."""
+        chemical_library = {"NaCl" : chemical.Chemical(58.44, ["NaCl"])}
+
+        for buffer_volume in range(1, 10):
+            self.assertEqual(unit.scale_and_round_physical_quantity(0.002 * 58.44, "g"),
+                             make.calculate_amount_to_add(buffer_volume, "2mmol", "NaCl", chemical_library))
+            self.assertEqual(unit.scale_and_round_physical_quantity(5.0 * buffer_volume, "g"),
+                             make.calculate_amount_to_add(buffer_volume, "5mg/mL", "chemical_name", chemical_library))
+            self.assertEqual(unit.scale_and_round_physical_quantity(10.0 * buffer_volume, "g"),
+                             make.calculate_amount_to_add(buffer_volume, "1%w/v", "chemical_name", chemical_library))
+            self.assertEqual(unit.scale_and_round_physical_quantity(0.05 * buffer_volume, "L"),
+                             make.calculate_amount_to_add(buffer_volume, "5%v/v", "chemical_name", chemical_library))
+
 class TestBufferInstructions(TestCase):
     """Tests the make.BufferInstructions class."""
 
@@ -81,7 +106,7 @@ class TestBufferInstructions(TestCase):
 
         test_recipe = recipe.Recipe("my_recipe", ["300mM", "4g"], ["NaCl", "KCl"])
 
-        with mock.patch("buf.commands.make.chemical.load_chemicals", return_value = {"NaCl" : nacl, "KCl" : kcl}):
+        with mock.patch("buf.commands.chemical.fetch_chemicals", return_value = {"NaCl" : nacl, "KCl" : kcl}):
             test_buffer_instructions = make.BufferInstructions(2, test_recipe)
 
             correct_steps = [make.Step("NaCl", "300mM", unit.scale_and_round_physical_quantity(58.44 * 0.3 * 2, "g")),
@@ -89,19 +114,214 @@ class TestBufferInstructions(TestCase):
 
             self.assertEqual(test_buffer_instructions.steps, correct_steps)
 
+class TestCompiledRecipe(TestCase):
+    """Tests make.CompiledRecipe and make.compile_recipe."""
+
+    def test_amounts(self):
+        """Tests that a compiled recipe gives the same amounts as calculating each amount separately."""
+        chemical_library = {"NaCl" : chemical.Chemical(58.44, ["NaCl"])}
+        test_recipe = recipe.Recipe("my_recipe", ["300mM", "4mg", "10%", "250uL"], ["NaCl", "KCl", "glycerol", "water"])
+
+        compiled_recipe = make.CompiledRecipe(test_recipe, chemical_library)
+
+        for buffer_volume in [0.001, 0.25, 1, 2.5, 40]:
+            correct_steps = [make.Step(chemical_name, concentration,
+                                       make.calculate_amount_to_add(buffer_volume, concentration, chemical_name, chemical_library))
+                             for concentration, chemical_name in test_recipe.get_contents()]
+            self.assertEqual(compiled_recipe.get_steps(buffer_volume), correct_steps)
+
+        # The coefficients and constants are in grams or litres.
+        self.assertEqual(compiled_recipe.coefficients, [0.3 * 58.44, 0, 0.1, 0])
+        self.assertEqual(compiled_recipe.constants, [0, 4e-3, 0, 250e-6])
+
+    def test_memoization(self):
+        """Tests that a recipe is only recompiled if its contents or the molar masses of its chemicals change."""
+        test_recipe = recipe.Recipe("my_recipe", ["300mM"], ["NaCl"])
+
+        with mock.patch("buf.commands.make.compiled_recipes", {}):
+            first = make.compile_recipe(test_recipe, {"NaCl" : chemical.Chemical(58.44, ["NaCl"])})
+            self.assertIs(make.compile_recipe(test_recipe, {"NaCl" : chemical.Chemical(58.44, ["NaCl", "salt"])}), first)
+
+            self.assertIsNot(make.compile_recipe(test_recipe, {"NaCl" : chemical.Chemical(60, ["NaCl"])}), first)
+            self.assertIsNot(make.compile_recipe(recipe.Recipe("my_recipe", ["1M"], ["NaCl"]),
+                                                 {"NaCl" : chemical.Chemical(58.44, ["NaCl"])}), first)
+
 class TestGetRecipe(TestCase):
     """Tests make.get_recipe."""
 
     def test_name_check(self):
         """Tests that the function checks that the specified recipe exists in the library."""
-        with mock.patch("buf.commands.make.recipe.load_recipes", return_value = {"my_recipe" : None}):
+        recipe_library = {"my_recipe" : None}
+        with mock.patch("buf.commands.make.recipe.fetch_recipes",
+                        side_effect = lambda names: {name : recipe_library[name] for name in names if name in recipe_library}):
 
             # Testing an invalid recipe name.
-            with self.assertRaises(SystemExit):
+            with self.assertRaises(BufError):
                 should_crash = make.get_recipe("not_in_library")
 
             # Testing a valid recipe name.
             shouldnt_crash = make.get_recipe("my_recipe")
 
+class TestResultsCache(LibraryTestCase):
+    """Tests make.get_buffer_steps and the results cache."""
+
+    chemicals = "58.44 NaCl\n"
+    recipes = "wash 1M NaCl 10% glycerol\n"
+
+    def setUp(self):
+        super().setUp()
+        patch = mock.patch("buf.commands.make.used_results", {})
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def test_cached_results(self):
+        """Tests that a buffer made before (in any volume unit, or from the same contents under another name) is taken from
+        the cache, without reading its chemicals or calculating its Steps again."""
+        steps = make.get_buffer_steps("1L", "wash")
+        self.assertEqual(steps, [make.Step("NaCl", "1M", "58.44g"), make.Step("glycerol", "10%", "100.0mL")])
+
+        with mock.patch("buf.commands.chemical.fetch_chemicals") as mock_fetch, \
+             mock.patch("buf.commands.make.compile_recipe") as mock_compile:
+            self.assertEqual(make.get_buffer_steps("1L", "wash"), steps)
+            self.assertEqual(make.get_buffer_steps("1000mL", "wash"), steps)
+            self.assertEqual(make.get_buffer_steps("1L", concentrations=["1M", "10%"], chemical_names=["NaCl", "glycerol"]), steps)
+
+            mock_fetch.assert_not_called()
+            mock_compile.assert_not_called()
+
+    def test_invalidation(self):
+        """Tests that changing the chemical library means buffers are made afresh."""
+        make.get_buffer_steps("1L", "wash")
+
+        with open(self.chemical_library_file, "w") as file:
+            file.write("60.0 NaCl\n")
+
+        self.assertEqual(make.get_buffer_steps("1L", "wash")[0], make.Step("NaCl", "1M", "60.0g"))
+
+        # Invalid buffers are never cached.
+        with open(self.chemical_library_file, "w") as file:
+            file.write("")
+
+        with self.assertRaises(BufError):
+            make.get_buffer_steps("1L", "wash")
+
+    def test_eviction(self):
+        """Tests that the least recently used buffers are evicted once the cache is full."""
+        with mock.patch("buf.commands.make.max_cached_results", 2):
+            make.get_buffer_steps("1L", "wash")
+            make.get_buffer_steps("2L", "wash")
+            make.get_buffer_steps("1L", "wash")
+            make.get_buffer_steps("3L", "wash")
+
+            self.assertEqual([json.loads(key)[1] for key in make.load_results_cache()], [1, 3])
+
+    def test_hits_not_written(self):
+        """Tests that taking a buffer from the cache doesn't rewrite the cache file."""
+        make.get_buffer_steps("1L", "wash")
+
+        with mock.patch("buf.commands.make.save_results_cache") as mock_save:
+            make.get_buffer_steps("1L", "wash")
+            make.get_buffer_steps("1000mL", "wash")
+            mock_save.assert_not_called()
+
+    def test_corrupt_cache(self):
+        """Tests that an unreadable cache file (including a pickled one, which is never unpickled) is simply started again."""
+        for cache_contents in [b"not a cache", pickle.dumps({"key" : [make.Step("NaCl", "1M", "1g")]}), b'{"key" : [["NaCl"]]}']:
+            with open(make.results_cache_file, "wb") as file:
+                file.write(cache_contents)
+
+            self.assertEqual(make.load_results_cache(), {})
+
+        self.assertEqual(make.get_buffer_steps("2L", "wash")[0], make.Step("NaCl", "1M", "116.88g"))
+        self.assertEqual(len(make.load_results_cache()), 1)
+
+class TestGetBufferRecords(TestCase):
+    """Tests make.get_buffer_records."""
+
+    def test_records(self):
+        """Tests that each record gives the same amount as the Steps, along with the amount in grams or litres."""
+        chemical_library = {"NaCl" : chemical.Chemical(58.44, ["NaCl"])}
+        recipe_library = {"wash" : recipe.Recipe("wash", ["300mM", "10%", "5mL", "2mg"], ["NaCl", "glycerol", "Tween", "DTT"])}
+
+        with mock.patch("buf.commands.make.recipe.fetch_recipes",
+                        side_effect = lambda names: {name : recipe_library[name] for name in names if name in recipe_library}), \
+             mock.patch("buf.commands.chemical.fetch_chemicals",
+                        side_effect = lambda names: {name : chemical_library[name] for name in names if name in chemical_library}):
+            records = make.get_buffer_records("2L", "wash")
+            steps = make.BufferInstructions(2, recipe_library["wash"]).steps
+
+        self.assertEqual([record["amount_to_add"] for record in records], [step.amount_to_add for step in steps])
+        self.assertEqual([(record["amount"], record["unit"]) for record in records], [(35.064, "g"), (0.2, "L"), (0.005, "L"), (0.002, "g")])
+        self.assertEqual(list(records[0]), make.step_record_fields)
+
+@unittest.skipIf(numpy == None, "NumPy is not installed.")
+class TestMakeOrdersFromFile(TestCase):
+    """Tests make.make_orders_from_file."""
+
+    def setUp(self):
+        self.chemical_library = {"NaCl" : chemical.Chemical(58.44, ["NaCl"]), "KCl" : chemical.Chemical(74.55, ["KCl"])}
+        self.recipe_library = {"wash" : recipe.Recipe("wash", ["300mM", "4g"], ["NaCl", "KCl"]),
+                               "elution" : recipe.Recipe("elution", ["10%", "1M"], ["glycerol", "KCl"])}
+
+    def make_orders(self, file_contents: str, format_name: str = None):
+        """Runs make_orders_from_file on an orders file with the given contents, returning the rows of its CSV output."""
+        return list(csv.reader(io.StringIO(self.get_output(file_contents, format_name))))
+
+    def get_output(self, file_contents: str, format_name: str = None):
+        """Runs make_orders_from_file on an orders file with the given contents, returning its output."""
+        output = io.StringIO()
+        with mock.patch("buf.commands.make.os.path.isfile", return_value = True), \
+             mock.patch("buf.commands.make.open", mock.mock_open(read_data = file_contents)), \
+             mock.patch("buf.commands.make.recipe.fetch_recipes",
+                        side_effect = lambda names: {name : self.recipe_library[name] for name in names if name in self.recipe_library}), \
+             mock.patch("buf.commands.chemical.fetch_chemicals",
+                        side_effect = lambda names: {name : self.chemical_library[name] for name in names if name in self.chemical_library}):
+            make.make_orders_from_file("orders.csv", output, format_name = format_name)
+        return output.getvalue()
+
+    def test_amounts(self):
+        """Tests that the amounts calculated for each order match those calculated when making a single buffer."""
+        rows = self.make_orders("volume,recipe\n2L,wash\n\n500mL,elution\n1.5L,wash\n")
+
+        self.assertEqual(rows[0], ["Order", "Volume", "Recipe", "Chemical Name", "Concentration", "Amount to Add"])
+        self.assertEqual(len(rows), 7)
+
+        for order_number, volume, recipe_name, chemical_name, concentration, amount in rows[1:]:
+            expected_amount = make.calculate_amount_to_add(make.get_buffer_litres(volume), concentration, chemical_name,
+                                                           self.chemical_library)
+            self.assertEqual(amount, expected_amount)
+
+        self.assertEqual([row[0] for row in rows[1:]], ["1", "1", "2", "2", "3", "3"])
+        self.assertEqual([row[3] for row in rows[1:]], ["NaCl", "KCl", "glycerol", "KCl", "NaCl", "KCl"])
+
+    def test_records(self):
+        """Tests that orders printed as records give the same amounts as the CSV output, along with each amount in grams or litres."""
+        rows = self.make_orders("2L,wash\n500mL,elution\n", format_name = "csv")
+
+        self.assertEqual(rows[0], ["order", "volume", "recipe", "chemical_name", "concentration", "amount_to_add", "amount", "unit"])
+        self.assertEqual([row[:6] for row in rows[1:]], [row for row in self.make_orders("2L,wash\n500mL,elution\n")[1:]])
+        self.assertEqual([row[6:] for row in rows[1:]], [["35.064", "g"], ["4.0", "g"], ["0.05", "L"], ["37.275", "g"]])
+
+    def test_chunks(self):
+        """Tests that orders handled a chunk at a time give the same output as orders handled all at once, in every format."""
+        file_contents = "volume,recipe\n2L,wash\n500mL,elution\n1.5L,wash\n1L,elution\n3L,wash\n"
+
+        for format_name in [None, "csv", "json", "ndjson"]:
+            whole_output = self.get_output(file_contents, format_name)
+            with mock.patch("buf.commands.make.orders_chunk_size", 2):
+                self.assertEqual(self.get_output(file_contents, format_name), whole_output)
+
+        records = json.loads(self.get_output(file_contents, "json"))
+        self.assertEqual([record["order"] for record in records], [1, 1, 2, 2, 3, 3, 4, 4, 5, 5])
+        self.assertEqual(records[0], {"order" : 1, "volume" : "2L", "recipe" : "wash", "chemical_name" : "NaCl",
+                                      "concentration" : "300mM", "amount_to_add" : "35.06g", "amount" : 35.064, "unit" : "g"})
+        self.assertEqual(json.loads(self.get_output("", "json")), [])
+
+    def test_invalid_orders(self):
+        """Tests that the function exits on invalid lines, volumes and recipe names."""
+        for file_contents in ["2L\n", "2L,wash,extra\n", "2kg,wash\n", "2L,not_a_recipe\n"]:
+            with self.assertRaises(BufError):
+                self.make_orders(file_contents)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -7,18 +7,25 @@
 from unittest import mock, TestCase
 import unittest
 from tempfile import NamedTemporaryFile
+from helpers import LibraryTestCase, make_temp_file
 from io import StringIO
+import json
 from buf.commands import recipe
+from buf import libraries
+from buf.exceptions import BufError
 
+def fetch_from(library: dict):
+    """Returns a stand-in for a fetch function (such as chemical.fetch_chemicals) that looks names up in the given dictionary."""
+    return lambda names: {name : library[name] for name in names if name in library}
 
-class TestMakeSafeRecipe(TestCase):
+class TestMakeSafeRecipe(LibraryTestCase):
     """Tests recipe.make_safe_recipe (and recipe.assert_recipe_validity by proxy, since the former is simply \
     a wrapper for the latter, as make_safe_recipe simply returns the Recipe type-checked by assert_recipe_validity)."""
 
     def test_spaces_in_name(self):
         """Tests that the function checks that the recipe name does not contain spaces."""
         with mock.patch("buf.commands.recipe.load_recipes", return_value = {}):
-            with self.assertRaises(SystemExit):
+            with self.assertRaises(BufError):
                  recipe.make_safe_recipe("contains spaces", ["10%"], ["glycerol"])
 
 
@@ -29,7 +36,7 @@ class TestMakeSafeRecipe(TestCase):
         with mock.patch("buf.commands.recipe.print") as mock_print:
             # Testing the code stops if a chemical's concentration is specified in molar, but the chemical name cannot be found
             # in the chemical library.
-            with self.assertRaises(SystemExit):
+            with self.assertRaises(BufError):
                 recipe.make_safe_recipe("boop", ["300mM"], ["Salt"], chemical_library= {}, recipe_library={})
                 mock_print.assert_called()
 
@@ -54,7 +61,7 @@ class TestMakeSafeRecipe(TestCase):
             # Testing invalid units.
             for unit in ["", "invalid", "inval1d_w1th_numb3rs"]:
 
-                with self.assertRaises(SystemExit):
+                with self.assertRaises(BufError):
                     recipe.make_safe_recipe("name", ["123" + unit], ["salt"], chemical_library={"salt" : None}, recipe_library={})
                     mock_print.assert_called()
                     mock_print.reset_mock()
@@ -71,7 +78,7 @@ class TestMakeSafeRecipe(TestCase):
 
             # Testing invalid quantities.
             for quantity in ["", "-1", "0"]:
-                with self.assertRaises(SystemExit):
+                with self.assertRaises(BufError):
                     recipe.make_safe_recipe("name", [quantity + "L"], ["salt"], chemical_library={"salt" : None}, recipe_library={})
                     mock_print.assert_called()
                     mock_print.reset_mock()
@@ -111,67 +118,73 @@ class TestRecipe(TestCase):
 
             self.assertEqual(forwards_recipe, backwards_recipe)
 
+    def test_immutability(self):
+        """Tests that Recipes cannot be modified, and that equal Recipes hash equally."""
+        test_recipe = recipe.Recipe("name", ["300mM", "4L"], ["salt", "pepper"])
 
-class TestAddRecipesFromFile(TestCase):
-    """Tests recipe.add_recipe_from_file."""
+        with self.assertRaises(AttributeError):
+            test_recipe.name = "other_name"
+        with self.assertRaises(AttributeError):
+            test_recipe.concentrations.append("10%")
+
+        self.assertEqual(hash(test_recipe), hash(recipe.Recipe("name", ["4L", "300mM"], ["pepper", "salt"])))
+
+
+class TestAddRecipesFromFiles(LibraryTestCase):
+    """Tests recipe.add_recipes_from_files."""
 
     def test_invalid_file_name(self):
-        """Tests that the function checks whether """
-        with mock.patch("buf.commands.recipe.open") as mock_open:
-            with mock.patch("buf.commands.recipe.chemical.load_chemicals", return_value = {"Arg" : None, "KCl" : None,  "salt" : None, "pepper" : None}):
-                with mock.patch("buf.commands.recipe.load_recipes", return_value = {"wash" : None, "elution" : None}):
-                    with mock.patch("buf.commands.recipe.print") as mock_print:
-                        with mock.patch("buf.commands.recipe.os.path.isfile", return_value = False):
+        """Tests that the function checks whether the specified file exists."""
+        with mock.patch("buf.commands.recipe.print") as mock_print:
+            with mock.patch("buf.commands.recipe.os.path.isfile", return_value = False):
 
-                            # Testing an invalid file name.
-                            with self.assertRaises(SystemExit):
-                                recipe.add_recipes_from_file("invalidfile")
+                # Testing an invalid file name.
+                with self.assertRaises(BufError):
+                    recipe.add_recipes_from_files(["invalidfile"])
 
     def test_invalid_file_contents(self):
-        """Tests that the function raises SystemExit (i.e. cleanly exits the program opposed to crashing) \
+        """Tests that the function raises a BufError (which is shown to the user as an error message) \
             when the specified file has invalid contents (see recipe.instructions for more information on what \
             constitutes a valid file)."""
+        temp_library_file = make_temp_file("wash 3M salt\nelution 4g Arg\n")
+        chemical_library = {"Arg" : None, "KCl" : None,  "salt" : None, "pepper" : None}
 
-        with mock.patch("buf.commands.recipe.open") as mock_open:
-            with mock.patch("buf.commands.recipe.chemical.load_chemicals", return_value = {"Arg" : None, "KCl" : None,  "salt" : None, "pepper" : None}):
-                with mock.patch("buf.commands.recipe.load_recipes", return_value = {"wash" : None, "elution" : None}):
-                    with mock.patch("buf.commands.recipe.print") as mock_print:
-                        with mock.patch("buf.commands.recipe.os.path.isfile", return_value = True):
+        with mock.patch("buf.commands.recipe.recipe_library_file", temp_library_file.name):
+            with mock.patch("buf.commands.recipe.chemical.fetch_chemicals", side_effect = fetch_from(chemical_library)):
+                with mock.patch("buf.commands.recipe.print") as mock_print:
 
-                            # Invalid file contents
-                            for file_contents in ["refold 500mM unknownchemical 5g Arg", "wash 300mM salt", "name 300weirdunit pepper",
-                                                  "refold 300mM salt\nrefold 4M pepper", "name 300mM"]:
-                                with self.assertRaises(SystemExit):
+                    # Invalid file contents
+                    for file_contents in ["refold 500mM unknownchemical 5g Arg", "wash 300mM salt", "name 300weirdunit pepper",
+                                          "refold 300mM salt\nrefold 4M pepper", "name 300mM"]:
+                        temp_file_to_add = make_temp_file(file_contents)
 
-                                    mock_open.return_value.__enter__.return_value = StringIO(file_contents)
-                                    recipe.add_recipes_from_file("whatever")
-                                    mock_print.assert_called()
-                                    mock_open.return_value.__enter__.return_value.write.assert_not_called()
+                        with self.assertRaises(BufError) as context:
+                            recipe.add_recipes_from_files([temp_file_to_add.name])
 
-                                    mock_print.reset_mock()
+                        self.assertIn("Recipes specified in file not added to library.", str(context.exception))
 
-                            # Valid file contents
-                            for file_contents in ["refold 300mM Arg", "refold 4mL pepper 10% salt", "refold 3M salt\nother 4% pepper"]:
-                                mock_open.return_value.__enter__.return_value = StringIO(file_contents)
-                                recipe.add_recipes_from_file("whatever")
+                    with open(temp_library_file.name, "r") as file:
+                        self.assertEqual(file.read(), "wash 3M salt\nelution 4g Arg\n")
 
+                    # Valid file contents
+                    for file_contents in ["refold 300mM Arg", "other 4mL pepper 10% salt", "third 3M salt\nfourth 4% pepper"]:
+                        temp_file_to_add = make_temp_file(file_contents)
+                        recipe.add_recipes_from_files([temp_file_to_add.name])
 
+                    with open(temp_library_file.name, "r") as file:
+                        self.assertEqual(file.read(), "wash 3M salt\nelution 4g Arg\nrefold 300mM Arg\nother 4mL pepper 10% salt\n"
+                                                      "third 3M salt\nfourth 4% pepper\n")
 
     def test_correct_writing(self):
         """Tests that the function correctly appends the newly created recipes to the library file."""
         with mock.patch("buf.commands.recipe.print") as mock_print:
-            with mock.patch("buf.commands.recipe.chemical.load_chemicals", return_value = {"Arg" : None, "KCl" : None,
-                                                                                            "salt" : None, "pepper" : None}):
-                temp_library_file = NamedTemporaryFile(mode="a+")
-                with open(temp_library_file.name, "a") as file:
-                    file.write("wash 3M salt 10% pepper\nelution 4g Arg\n")
-
-                temp_file_to_add = NamedTemporaryFile(mode = "a+")
-                with open(temp_file_to_add.name, "a") as file:
-                    file.write("refold 4% KCl 3M salt\nother 4M Arg 10.5L pepper")
+            with mock.patch("buf.commands.recipe.chemical.fetch_chemicals",
+                            side_effect = fetch_from({"Arg" : None, "KCl" : None, "salt" : None, "pepper" : None})):
+                temp_library_file = make_temp_file("wash 3M salt 10% pepper\nelution 4g Arg\n")
+                temp_file_to_add = make_temp_file("refold 4% KCl 3M salt\nother 4M Arg 10.5L pepper")
 
                 with mock.patch("buf.commands.recipe.recipe_library_file", temp_library_file.name):
-                    recipe.add_recipes_from_file(temp_file_to_add.name)
+                    recipe.add_recipes_from_files([temp_file_to_add.name])
 
                     with open(temp_library_file.name, "r") as file:
                         contents = file.read()
@@ -179,7 +192,49 @@ class TestAddRecipesFromFile(TestCase):
                     self.assertEqual(contents, "wash 3M salt 10% pepper\nelution 4g Arg\nrefold 4% KCl 3M salt\nother 4M Arg 10.5L pepper\n")
                     mock_print.assert_called()
 
-class TestSaveRecipeLibrary(TestCase):
+    def test_multiple_files(self):
+        """Tests that several files are added together in one write, and that recipe names used in more than one file are
+        caught, in which case none of the files are added."""
+        temp_library_file = make_temp_file("wash 3M salt\n")
+        first_file = make_temp_file("refold 4% KCl\n")
+        second_file = make_temp_file("elution 4g Arg\n")
+        conflicting_file = make_temp_file("refold 10% glycerol\n")
+
+        with mock.patch("buf.commands.recipe.recipe_library_file", temp_library_file.name):
+            with mock.patch("buf.commands.recipe.print") as mock_print:
+                with self.assertRaises(BufError) as context:
+                    recipe.add_recipes_from_files([first_file.name, second_file.name, conflicting_file.name])
+                self.assertIn("Duplicate file entry: 'refold' already used in '" + first_file.name + "'.", str(context.exception))
+
+                with open(temp_library_file.name, "r") as file:
+                    self.assertEqual(file.read(), "wash 3M salt\n")
+
+                recipe.add_recipes_from_files([first_file.name, second_file.name])
+                mock_print.assert_called_with("Added the following recipes to your library:", "refold", "elution")
+
+            with open(temp_library_file.name, "r") as file:
+                self.assertEqual(file.read(), "wash 3M salt\nrefold 4% KCl\nelution 4g Arg\n")
+
+    def test_report_all(self):
+        """Tests that with report_all, every error in the file is reported (with its line and column) as a line of JSON,
+        and that nothing is added to the library."""
+        temp_library_file = make_temp_file("wash 3M salt\n")
+        temp_file_to_add = make_temp_file("refold 5Q salt 10% glycerol 1x Arg\nshort 1M\nwash 4% KCl\nelution 1M unknownchemical\n")
+
+        with mock.patch("buf.commands.recipe.recipe_library_file", temp_library_file.name):
+            with mock.patch("buf.commands.recipe.chemical.fetch_chemicals", side_effect = fetch_from({"salt" : None})):
+                with mock.patch("buf.libraries.sys.stderr"):
+                    with self.assertRaises(BufError) as context:
+                        recipe.add_recipes_from_files([temp_file_to_add.name], report_all=True)
+
+                reported_errors = [json.loads(line) for line in str(context.exception).splitlines()]
+                self.assertEqual([(error["line"], error["column"]) for error in reported_errors],
+                                 [(1, 8), (1, 29), (2, None), (3, 1), (4, 12)])
+
+            with open(temp_library_file.name, "r") as file:
+                self.assertEqual(file.read(), "wash 3M salt\n")
+
+class TestSaveRecipeLibrary(LibraryTestCase):
     """Tests recipe.save_recipe_library."""
 
     def test_read_write(self):
@@ -202,14 +257,14 @@ class TestSaveRecipeLibrary(TestCase):
 
                 self.assertEqual(read_recipe_dict, read_again)
 
-class TestDeleteRecipe(TestCase):
+class TestDeleteRecipe(LibraryTestCase):
     """Tests recipe.delete_recipe."""
 
     def test_name_check(self):
         """Tests that the function checks that the specified recipe to delete exists in the library."""
-        with mock.patch("buf.commands.recipe.load_recipes", return_value = {}):
+        with mock.patch("buf.commands.recipe.fetch_recipes", return_value = {}):
             with mock.patch("buf.commands.recipe.print") as mock_print:
-                with self.assertRaises(SystemExit):
+                with self.assertRaises(BufError):
                     recipe.delete_recipe("unknown_recipe")
                     mock_print.assert_called()
 
@@ -233,13 +288,56 @@ class TestDeleteRecipe(TestCase):
 
                 self.assertEqual(after_delete, recipe.load_recipes())
 
-class TestDisplayRecipeInformation(TestCase):
+class TestRecipeJournal(LibraryTestCase):
+    """Tests that deletions are journaled rather than rewriting the recipe library file, and recipe.compact_recipe_library."""
+
+    def test_journaled_delete_and_compaction(self):
+        """Tests that deleting a recipe leaves the library file untouched until the library is compacted, and that \
+        recipes added while the journal has records in it are added to the journal."""
+        temp_file = NamedTemporaryFile("w+")
+
+        with open(temp_file.name, "w") as file:
+            file.write("wash 300mM salt\nelution 4g Arg\n")
+
+        with mock.patch("buf.commands.recipe.recipe_library_file", temp_file.name):
+            with mock.patch("buf.commands.recipe.chemical.fetch_chemicals", return_value = {"salt" : None}):
+                recipe.delete_recipe("wash", prompt_for_confirmation=False)
+                recipe.add_single_recipe("wash", ["1M"], ["salt"])
+
+            with open(temp_file.name, "r") as file:
+                self.assertEqual(file.read(), "wash 300mM salt\nelution 4g Arg\n")
+
+            expected_library = {"elution" : recipe.Recipe("elution", ["4g"], ["Arg"]), "wash" : recipe.Recipe("wash", ["1M"], ["salt"])}
+            self.assertEqual(recipe.load_recipes(), expected_library)
+            self.assertEqual(recipe.fetch_recipes(["wash"]), {"wash" : expected_library["wash"]})
+
+            recipe.compact_recipe_library()
+
+            with open(temp_file.name, "r") as file:
+                self.assertEqual(file.read(), "elution 4g Arg\nwash 1M salt\n")
+            self.assertEqual(recipe.load_recipes(), expected_library)
+
+class TestFetchRecipes(LibraryTestCase):
+    """Tests recipe.fetch_recipes."""
+
+    recipes = "wash 300mM NaCl 10% glycerol\nelution 1M KCl\nlysis 50mM Tris\n"
+
+    def test_batched_lookup(self):
+        """Tests that every name is looked up in a single pass over the index."""
+        with mock.patch("buf.libraries.find_indexed_lines", side_effect = libraries.find_indexed_lines) as mock_find:
+            fetched = recipe.fetch_recipes(["wash", "lysis", "unknown"])
+            mock_find.assert_called_once()
+
+        self.assertEqual(fetched, {"wash" : recipe.Recipe("wash", ["300mM", "10%"], ["NaCl", "glycerol"]),
+                                   "lysis" : recipe.Recipe("lysis", ["50mM"], ["Tris"])})
+
+class TestDisplayRecipeInformation(LibraryTestCase):
     """Tests recipe.display_recipe_information"""
 
     def test_name_check(self):
         """Tests that the function checks that the recipe to display exists."""
         with mock.patch("buf.commands.recipe.load_recipes", return_value = {}):
-            with self.assertRaises(SystemExit):
+            with self.assertRaises(BufError):
                 recipe.display_recipe_information("unknown_recipe")
 
 if __name__ == '__main__':
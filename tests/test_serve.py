@@ -0,0 +1,120 @@
+# File name: test_serve.py
+# Author: Jordan Juravsky
+# Date created: 18-10-2026
+
+"""Tests buf.commands.serve and buf.client."""
+
+from unittest import mock, TestCase
+import unittest
+import os
+import json
+import socket
+import socketserver
+import threading
+from io import StringIO
+from buf import client
+from buf.commands import serve
+from buf.exceptions import BufError
+from helpers import LibraryTestCase
+
+class TestIsForwardable(TestCase):
+    """Tests client.is_forwardable."""
+
+    def test_forwardable_commands(self):
+        """Tests that only commands that don't modify one's libraries are forwarded to the daemon."""
+        for arguments in [["make", "2L", "wash"], ["make", "--orders", "orders.csv"], ["chemical", "NaCl"], ["chemical"],
+                          ["recipe", "wash"], ["recipe"], ["chemical", "--limit=20", "--offset", "40", "--plain"],
+                          ["recipe", "--format=csv"], ["make", "2L", "wash", "--format", "json"],
+                          ["make", "--orders", "orders.csv", "--format=ndjson"]]:
+            self.assertTrue(client.is_forwardable(arguments))
+
+        for arguments in [[], ["chemical", "-a", "58.44", "NaCl"], ["chemical", "-d", "NaCl", "--confirm"], ["recipe", "-d", "wash"],
+                          ["help"], ["serve"], ["compact"], ["--version"],
+                          ["chemical", "-a", "chemicals.txt", "--report-all"]]:
+            self.assertFalse(client.is_forwardable(arguments))
+
+class TestAnswerRequest(TestCase):
+    """Tests serve.answer_request."""
+
+    def test_output_capture(self):
+        """Tests that the output of a command is returned, along with the code it exited with."""
+        with mock.patch("buf.commands.make.make", side_effect = lambda options, library: print("made", options["<volume>"])):
+            response = serve.answer_request({"arguments" : ["make", "2L", "wash"]})
+            self.assertEqual(response, {"handled" : True, "output" : "made 2L\n", "exit_code" : None})
+
+        with mock.patch("buf.commands.make.make", side_effect = lambda options, library: exit()):
+            response = serve.answer_request({"arguments" : ["make", "2L", "wash"]})
+            self.assertEqual(response, {"handled" : True, "output" : "", "exit_code" : None})
+
+        with mock.patch("buf.commands.make.make", side_effect = SystemExit(2)):
+            self.assertEqual(serve.answer_request({"arguments" : ["make", "2L", "wash"]})["exit_code"], 2)
+
+        with mock.patch("buf.commands.make.make", side_effect = BufError("Recipe not found.")):
+            response = serve.answer_request({"arguments" : ["make", "2L", "wash"]})
+            self.assertEqual(response, {"handled" : True, "output" : "Recipe not found.\n", "exit_code" : 1})
+
+    def test_unforwardable_command(self):
+        """Tests that the daemon refuses to run commands that modify one's libraries."""
+        with mock.patch("buf.commands.chemical.add_single_chemical") as mock_add:
+            response = serve.answer_request({"arguments" : ["chemical", "-a", "58.44", "NaCl"]})
+            self.assertEqual(response["handled"], False)
+            mock_add.assert_not_called()
+
+class TestForwardCommand(TestCase):
+    """Tests client.forward_command."""
+
+    def test_forwarding(self):
+        """Tests that commands are only forwarded when the daemon is running, and that their output is written."""
+        with mock.patch("buf.client.send_request", return_value = None):
+            self.assertFalse(client.forward_command(["make", "2L", "wash"]))
+
+        response = {"handled" : True, "output" : "made\n", "exit_code" : None}
+        with mock.patch("buf.client.send_request", return_value = response) as mock_send, \
+             mock.patch("sys.stdout", new_callable = StringIO) as mock_stdout:
+            self.assertTrue(client.forward_command(["make", "--orders", "orders.csv"]))
+            self.assertEqual(mock_stdout.getvalue(), "made\n")
+
+            # File names are made absolute, since the daemon may be running in another directory.
+            forwarded_arguments = mock_send.call_args[0][0]["arguments"]
+            self.assertEqual(forwarded_arguments[:2], ["make", "--orders"])
+            self.assertTrue(os.path.isabs(forwarded_arguments[2]))
+
+        with mock.patch("buf.client.send_request") as mock_send:
+            self.assertFalse(client.forward_command(["chemical", "-d", "NaCl"]))
+            mock_send.assert_not_called()
+
+@unittest.skipIf(hasattr(socket, "AF_UNIX") == False, "Unix domain sockets are not available.")
+class TestDaemon(LibraryTestCase):
+    """Tests forwarding commands to a daemon listening on a socket, using temporary libraries."""
+
+    chemicals = "58.44 NaCl salt\n74.55 KCl\n"
+    recipes = "wash 300mM NaCl 10% glycerol\n"
+
+    def setUp(self):
+        super().setUp()
+
+        server = socketserver.UnixStreamServer(client.socket_file, serve.RequestHandler)
+        threading.Thread(target = server.serve_forever, daemon = True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+    def forward(self, arguments):
+        """Forwards a command to the daemon, returning its output (or None, if the daemon didn't answer it)."""
+        with mock.patch("sys.stdout", new_callable = StringIO) as mock_stdout:
+            if client.forward_command(arguments) == False:
+                return None
+        return mock_stdout.getvalue()
+
+    def test_options_forwarded(self):
+        """Tests that listing and format options are answered by the daemon."""
+        self.assertEqual(json.loads(self.forward(["chemical", "NaCl", "--format=json"])),
+                         {"name" : "NaCl", "other_names" : ["salt"], "molar_mass" : 58.44})
+        self.assertEqual(self.forward(["chemical", "--limit", "1", "--offset=1", "--plain"]),
+                         "The chemicals in your library are:\nChemical Name  Molar Mass (g/mol)\nNaCl           58.44\n")
+        self.assertEqual(self.forward(["recipe", "--format=csv"]).splitlines()[1], "wash,300mM NaCl 10% glycerol,300mM 10%,NaCl glycerol")
+        self.assertEqual(json.loads(self.forward(["make", "2L", "wash", "--format=ndjson"]).splitlines()[0])["amount"], 35.064)
+
+        self.assertEqual(self.forward(["chemical", "-d", "NaCl"]), None)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+# File name: test_session.py
+# Author: Jordan Juravsky
+# Date created: 18-10-2026
+
+"""Tests buf.session."""
+
+from unittest import mock
+import unittest
+from buf.session import Library
+from buf.commands import chemical, recipe, make
+from helpers import LibraryTestCase
+
+class TestLibrary(LibraryTestCase):
+    """Tests session.Library, using temporary chemical and recipe libraries."""
+
+    chemicals = "58.44 NaCl salt\n74.55 KCl\n"
+    recipes = "wash 300mM NaCl 10% glycerol\n"
+
+    def test_names_read_once(self):
+        """Tests that each name (including names that aren't in the library) is only looked up the first time it is asked for."""
+        library = Library()
+
+        with mock.patch("buf.commands.chemical.fetch_chemicals", side_effect = chemical.fetch_chemicals) as mock_fetch:
+            self.assertEqual(library.fetch_chemicals(["NaCl", "unknown"]), {"NaCl" : chemical.Chemical(58.44, ["NaCl", "salt"])})
+            self.assertEqual(library.fetch_chemicals(["unknown", "NaCl", "KCl"]).keys(), {"NaCl", "KCl"})
+
+            self.assertEqual([call[0][0] for call in mock_fetch.call_args_list], [["NaCl", "unknown"], ["KCl"]])
+
+        with mock.patch("buf.commands.recipe.fetch_recipes", side_effect = recipe.fetch_recipes) as mock_fetch:
+            self.assertEqual(list(library.fetch_recipes(["wash"])), ["wash"])
+            self.assertEqual(library.fetch_recipes(["wash"])["wash"].chemical_names, ("NaCl", "glycerol"))
+            mock_fetch.assert_called_once_with(["wash"])
+
+    def test_whole_library_loaded_once(self):
+        """Tests that once the whole library has been loaded, nothing more is read from it."""
+        library = Library()
+
+        with mock.patch("buf.commands.chemical.load_chemicals", side_effect = chemical.load_chemicals) as mock_load, \
+             mock.patch("buf.commands.chemical.fetch_chemicals") as mock_fetch:
+            self.assertEqual(set(library.load_chemicals()), {"NaCl", "salt", "KCl"})
+            self.assertEqual(library.fetch_chemicals(["KCl", "unknown"]), {"KCl" : chemical.Chemical(74.55, ["KCl"])})
+            library.load_chemicals()
+
+            mock_load.assert_called_once()
+            mock_fetch.assert_not_called()
+
+    def test_version(self):
+        """Tests that the version stamp changes when the library files do, and that refreshing then forgets what was read."""
+        library = Library()
+        library.fetch_chemicals(["NaCl"])
+        self.assertTrue(library.is_current())
+
+        library.refresh()
+        self.assertIn("NaCl", library.chemicals)
+
+        with open(self.chemical_library_file, "a") as file:
+            file.write("154.25 DTT\n")
+
+        self.assertFalse(library.is_current())
+        library.refresh()
+        self.assertEqual(library.chemicals, {})
+        self.assertTrue(library.is_current())
+        self.assertIn("DTT", library.fetch_chemicals(["DTT"]))
+
+    def test_shared_across_commands(self):
+        """Tests that making a recipe reads its recipe and chemicals once, and that a Library shared between commands only
+        reads again what a command changes."""
+        library = Library()
+        options = {"--orders" : False, "--format" : None, "<recipe_name>" : "wash", "<volume>" : "2L", "<concentrations>" : [], "<chemical_names>" : []}
+
+        with mock.patch("buf.commands.chemical.fetch_chemicals", side_effect = chemical.fetch_chemicals) as mock_fetch_chemicals, \
+             mock.patch("buf.commands.recipe.fetch_recipes", side_effect = recipe.fetch_recipes) as mock_fetch_recipes, \
+             mock.patch("buf.commands.make.print"):
+            make.make(options, library)
+            make.make(options, library)
+
+            mock_fetch_chemicals.assert_called_once()
+            mock_fetch_recipes.assert_called_once()
+
+        with mock.patch("buf.commands.chemical.print"):
+            chemical.chemical({"-a" : True, "<file_names>" : [], "<molar_mass>" : "154.25", "<chemical_names>" : ["DTT"]}, library)
+
+        self.assertIn("DTT", library.chemicals)
+        self.assertIn("wash", library.recipes)
+        self.assertTrue(library.is_current())
+
+    def test_changes_read_again(self):
+        """Tests that nicknaming and deleting chemicals, and adding and deleting recipes, update what the Library has read
+        (including the other names of a changed chemical), and that changes made by others beforehand clear it."""
+        library = Library()
+        library.load_chemicals()
+        library.load_recipes()
+
+        with library.changing_chemicals(["NaCl", "table_salt"]):
+            chemical.nickname_chemical("NaCl", ["table_salt"])
+
+        self.assertEqual(library.chemicals["salt"].names, ("NaCl", "salt", "table_salt"))
+        self.assertIs(library.chemicals["salt"], library.chemicals["table_salt"])
+
+        with library.changing_chemicals(["salt"]), mock.patch("buf.commands.chemical.print"):
+            chemical.delete_chemical("salt", prompt_for_confirmation=False)
+
+        self.assertNotIn("salt", library.fetch_chemicals(["salt"]))
+        self.assertEqual(library.chemicals["NaCl"].names, ("NaCl", "table_salt"))
+
+        with library.changing_recipes(["elution"]):
+            recipe.add_single_recipe("elution", ["500mM"], ["NaCl"])
+
+        self.assertEqual(set(library.load_recipes()), {"wash", "elution"})
+        self.assertTrue(library.is_current())
+
+        with open(self.chemical_library_file, "a") as file:
+            file.write("154.25 DTT\n")
+
+        with library.changing_recipes(["wash"]), mock.patch("buf.commands.recipe.print"):
+            recipe.delete_recipe("wash", prompt_for_confirmation=False)
+
+        self.assertEqual(library.recipes, {})
+        self.assertEqual(set(library.load_recipes()), {"elution"})
+
+if __name__ == '__main__':
+    unittest.main()
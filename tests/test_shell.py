@@ -0,0 +1,68 @@
+# File name: test_shell.py
+# Author: Jordan Juravsky
+# Date created: 18-10-2026
+
+"""Tests buf.commands.shell."""
+
+from unittest import mock
+import unittest
+from buf.commands import shell, chemical, recipe
+from buf.session import Library
+from helpers import LibraryTestCase
+
+class TestShell(LibraryTestCase):
+    """Tests shell.run_line and shell.get_completions, using temporary libraries."""
+
+    chemicals = "58.44 NaCl salt\n"
+    recipes = "wash 300mM NaCl 10% glycerol\n"
+
+    def setUp(self):
+        super().setUp()
+        self.library = Library()
+
+    def test_commands_share_library(self):
+        """Tests that commands run in the shell share one Library, which is kept loaded as commands change the libraries,
+        and that changes are written to the libraries straight away."""
+        with mock.patch("buf.commands.chemical.load_chemicals", side_effect = chemical.load_chemicals) as mock_load, \
+             mock.patch("buf.commands.chemical.print"):
+            self.assertTrue(shell.run_line("chemical", self.library))
+            self.assertTrue(shell.run_line("buf chemical -a 74.55 KCl", self.library))
+            self.assertTrue(shell.run_line("chemical -n NaCl table_salt", self.library))
+            self.assertTrue(shell.run_line("chemical", self.library))
+
+            mock_load.assert_called_once()
+
+        self.assertIs(self.library.chemicals["salt"], self.library.chemicals["table_salt"])
+        self.assertEqual(set(self.library.chemicals), {"NaCl", "salt", "table_salt", "KCl"})
+        self.assertEqual(set(chemical.load_chemicals()), {"NaCl", "salt", "table_salt", "KCl"})
+
+        with mock.patch("buf.commands.recipe.print"):
+            shell.run_line("recipe -a 'elution' 1M KCl", self.library)
+        self.assertIn("elution", recipe.load_recipes())
+
+    def test_errors_and_exit(self):
+        """Tests that errors are shown without leaving the shell, and that 'exit' and 'quit' leave it."""
+        with mock.patch("buf.main.print") as mock_print:
+            self.assertTrue(shell.run_line("make 2L unknown", self.library))
+            self.assertIn("Recipe not found", str(mock_print.call_args[0][0]))
+
+        with mock.patch("buf.commands.shell.print") as mock_print:
+            self.assertTrue(shell.run_line("make", self.library))
+            self.assertIn("Usage:", str(mock_print.call_args[0][0]))
+
+            self.assertTrue(shell.run_line("make 'unterminated", self.library))
+            self.assertTrue(shell.run_line("shell", self.library))
+
+        self.assertTrue(shell.run_line("   ", self.library))
+        self.assertFalse(shell.run_line("exit", self.library))
+        self.assertFalse(shell.run_line("buf quit", self.library))
+
+    def test_completions(self):
+        """Tests that completions use the names in the shell's library."""
+        self.assertEqual(shell.get_completions("make 2L ", "w", self.library), ["wash"])
+        self.assertEqual(shell.get_completions("buf chemical ", "s", self.library), ["salt"])
+        self.assertEqual(shell.get_completions("", "sh", self.library), ["shell"])
+        self.assertEqual(shell.get_completions("", "ex", self.library), ["exit"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+# File name: test_tables.py
+# Author: Jordan Juravsky
+# Date created: 18-10-2026
+
+"""Tests buf.tables, and the library listings and records that use it."""
+
+from unittest import mock, TestCase
+import unittest
+import json
+from io import StringIO
+import tabulate
+from buf import tables, exceptions
+from buf.commands import chemical, recipe
+from helpers import LibraryTestCase
+
+headers = ["Chemical Name", "Molar Mass (g/mol)"]
+rows = [("NaCl", 58.44), ("KCl", 74.55), ("glycerol", 92.09), ("Tris", 121.14)]
+
+class TestTables(TestCase):
+    """Tests printing tables with buf.tables."""
+
+    def test_grid_matches_tabulate(self):
+        """Tests that grids are printed in the same layout as tabulate's 'fancy_grid' format."""
+        for table_rows in [rows, rows[:1], [("wash", "300mM NaCl 10% glycerol")], [],
+                           [("NaCl", 5.0), ("KCl", 1234.567), ("glycerol", 1e-07), ("Tris", 100)]]:
+            with mock.patch("sys.stdout", new_callable = StringIO) as output:
+                tables.print_table(table_rows, headers)
+            self.assertEqual(output.getvalue(), tabulate.tabulate(table_rows, headers=headers, tablefmt="fancy_grid") + "\n")
+
+    def test_plain(self):
+        """Tests that plain tables are aligned using the rows measured, and that later rows are printed as they are."""
+        with mock.patch("sys.stdout", new_callable = StringIO) as output:
+            tables.print_table(iter(rows), headers, plain=True)
+        self.assertEqual(output.getvalue().split("\n")[:3], ["Chemical Name  Molar Mass (g/mol)", "NaCl           58.44", "KCl            74.55"])
+
+        with mock.patch("buf.tables.max_rows_measured", 1), mock.patch("sys.stdout", new_callable = StringIO) as output:
+            tables.print_table([("KCl", 1), ("a_long_chemical_name", 2)], ["Name", "Mass"], plain=True)
+        self.assertEqual(output.getvalue(), "Name  Mass\nKCl   1\na_long_chemical_name  2\n")
+
+    def test_get_page(self):
+        """Tests that names are sorted case insensitively, and paged with limit and offset."""
+        names = ["b", "C", "a", "D", "e"]
+        self.assertEqual(tables.get_page(names), ["a", "b", "C", "D", "e"])
+        self.assertEqual(tables.get_page(names, limit=2), ["a", "b"])
+        self.assertEqual(tables.get_page(names, limit=2, offset=2), ["C", "D"])
+        self.assertEqual(tables.get_page(names, offset=3), ["D", "e"])
+        self.assertEqual(tables.get_page(names, limit=10, offset=4), ["e"])
+
+    def test_get_page_option(self):
+        self.assertEqual(tables.get_page_option("--limit", None), None)
+        self.assertEqual(tables.get_page_option("--limit", "0"), 0)
+        self.assertEqual(tables.get_page_option("--offset", "40"), 40)
+
+        for value in ["-1", "ten", "2.5"]:
+            with self.assertRaises(exceptions.InvalidOptionError):
+                tables.get_page_option("--limit", value)
+
+class TestRecords(TestCase):
+    """Tests printing records with tables.print_records and tables.print_record."""
+
+    def print_records(self, records, format_name):
+        """Returns the output of printing the given records."""
+        output = StringIO()
+        tables.print_records(records, ["name", "names", "molar_mass"], format_name, output)
+        return output.getvalue()
+
+    def test_formats(self):
+        records = [{"name": "NaCl", "names": ["NaCl", "salt"], "molar_mass": 58.44}, {"name": "KCl", "names": ["KCl"], "molar_mass": 74.55}]
+
+        self.assertEqual(json.loads(self.print_records(iter(records), "json")), records)
+        self.assertEqual(json.loads(self.print_records([], "json")), [])
+        self.assertEqual([json.loads(line) for line in self.print_records(records, "ndjson").splitlines()], records)
+        self.assertEqual(self.print_records(records, "csv"), "name,names,molar_mass\nNaCl,NaCl salt,58.44\nKCl,KCl,74.55\n")
+
+        with mock.patch("sys.stdout", new_callable = StringIO) as output:
+            tables.print_record(records[0], ["name", "names", "molar_mass"], "json")
+        self.assertEqual(json.loads(output.getvalue()), records[0])
+
+    def test_get_format_option(self):
+        self.assertEqual(tables.get_format_option(None), None)
+        self.assertEqual(tables.get_format_option("ndjson"), "ndjson")
+
+        with self.assertRaises(exceptions.InvalidOptionError):
+            tables.get_format_option("xml")
+
+class TestLibraryListings(LibraryTestCase):
+    """Tests listing the chemical and recipe libraries a page at a time, using temporary libraries."""
+
+    chemicals = "58.44 NaCl salt\n74.55 KCl\n92.09 glycerol\n"
+    recipes = "wash 300mM NaCl 10% glycerol\nelution 1M KCl\n"
+
+    def test_chemical_pages(self):
+        with mock.patch("sys.stdout", new_callable = StringIO) as output:
+            chemical.display_chemical_library(limit=2, offset=1, plain=True)
+        self.assertEqual(output.getvalue(), "The chemicals in your library are:\nChemical Name  Molar Mass (g/mol)\n"
+                                            "KCl            74.55\nNaCl           58.44\n")
+
+    def test_chemical_records(self):
+        with mock.patch("sys.stdout", new_callable = StringIO) as output:
+            chemical.display_chemical_library(offset=2, format_name="ndjson")
+        self.assertEqual(output.getvalue(), '{"name": "NaCl", "molar_mass": 58.44}\n{"name": "salt", "molar_mass": 58.44}\n')
+
+        with mock.patch("sys.stdout", new_callable = StringIO) as output:
+            chemical.display_chemical_information("salt", format_name="json")
+        self.assertEqual(json.loads(output.getvalue()), {"name": "salt", "other_names": ["NaCl"], "molar_mass": 58.44})
+
+    def test_recipe_records(self):
+        with mock.patch("sys.stdout", new_callable = StringIO) as output:
+            recipe.display_recipe_information("wash", format_name="csv")
+        self.assertEqual(output.getvalue(), "name,contents,concentrations,chemical_names\n"
+                                            "wash,300mM NaCl 10% glycerol,300mM 10%,NaCl glycerol\n")
+
+    def test_recipe_pages(self):
+        with mock.patch("sys.stdout", new_callable = StringIO) as output:
+            recipe.display_recipe_library(limit=1)
+        self.assertEqual(output.getvalue(), "The recipes in your library are:\n" +
+                         tabulate.tabulate([("elution", "1M KCl")], headers=["Recipe Name", "Contents"], tablefmt="fancy_grid") + "\n")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -7,6 +7,12 @@
 from unittest import mock, TestCase
 import unittest
 from buf import unit
+from buf.exceptions import BufError
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 class TestSplitUnitQuantity(TestCase):
     """Tests unit.split_unit_quantity."""
@@ -20,6 +26,53 @@ class TestSplitUnitQuantity(TestCase):
                 self.assertEqual(quantity, returned_magnitude)
                 self.assertEqual(symbol, returned_symbol)
 
+class TestParseQuantity(TestCase):
+    """Tests unit.parse_quantity."""
+
+    def test_valid_quantities(self):
+        """Tests that the function parses quantities of each dimension into their canonical values."""
+        self.assertEqual(unit.parse_quantity("250mL"), unit.Quantity(250, "mL", "volume", 250 * 1e-3))
+        self.assertEqual(unit.parse_quantity("4kg"), unit.Quantity(4, "kg", "mass", 4000))
+        self.assertEqual(unit.parse_quantity("300mM"), unit.Quantity(300, "mM", "concentration", 300 * 1e-3))
+        self.assertEqual(unit.parse_quantity("10%"), unit.Quantity(10, "%", "percent", 0.1))
+
+    def test_invalid_quantities(self):
+        """Tests that invalid magnitudes and units are recorded as None rather than causing errors."""
+        self.assertEqual(unit.parse_quantity("1.2.3L"), unit.Quantity(None, "L", "volume", None))
+        self.assertEqual(unit.parse_quantity("5lb"), unit.Quantity(5, "lb", None, None))
+        self.assertEqual(unit.parse_quantity(""), unit.Quantity(None, "", None, None))
+
+    def test_memoization(self):
+        """Tests that parsing the same string twice returns the same Quantity."""
+        self.assertIs(unit.parse_quantity("2L"), unit.parse_quantity("2L"))
+
+class TestUnitRegistry(TestCase):
+    """Tests the unit.UnitRegistry class."""
+
+    def test_compound_units(self):
+        """Tests that compound units are given the difference of their parts' dimensions and the ratio of their scale factors."""
+        test_registry = unit.UnitRegistry()
+        test_registry.define_prefixed_units("g", ["", "m"], 1, (1, 0, 0))
+        test_registry.define_prefixed_units("L", ["", "m"], 1, (0, 1, 0))
+        test_registry.define_compound_units(["mg"], ["mL", "L"])
+        test_registry.compile()
+
+        self.assertEqual(test_registry.dimensions[test_registry.get_id("mg/mL")], (1, -1, 0))
+        self.assertEqual(test_registry.convert(5, "mg/mL", "mg/L"), 5000)
+        self.assertEqual(test_registry.convert(2, "g", "mg"), 2000)
+
+    def test_conversions(self):
+        """Tests converting between units of buf's registry, and that converting between dimensions fails."""
+        self.assertAlmostEqual(unit.units.convert(250, "nL", "µL"), 0.25)
+        self.assertAlmostEqual(unit.units.convert(1, "%w/v", "g/L"), 10)
+        self.assertAlmostEqual(unit.units.convert(50, "ppm", "mg/L"), 50)
+        self.assertAlmostEqual(unit.units.convert(3, "mmol", "µmol"), 3000)
+
+        with self.assertRaises(BufError):
+            unit.units.convert(1, "mg/mL", "M")
+        with self.assertRaises(BufError):
+            unit.units.convert(1, "furlongs", "L")
+
 class TestUnitLadder(TestCase):
     """Tests the make.UnitLadder class."""
 
@@ -66,7 +119,7 @@ class TestUnitLadder(TestCase):
         self.assertEqual(test_ladder.scale_down_unit("L"), ("mL", 1 / 1e-3 ))
 
         with mock.patch("buf.unit.print") as mock_print:
-            with self.assertRaises(SystemExit):
+            with self.assertRaises(BufError):
                 test_ladder.scale_down_unit("µL")
                 mock_print.assert_called()
 
@@ -103,5 +156,30 @@ class TestScaleAndRoundUnitQuantity(TestCase):
         self.assertEqual(unit.scale_and_round_physical_quantity(0.123456, "L"), "123.46mL")
         self.assertEqual(unit.scale_and_round_physical_quantity(10089, "µL"), "10.09mL")
 
+@unittest.skipIf(numpy == None, "NumPy is not installed.")
+class TestScaleAndRoundPhysicalQuantities(TestCase):
+    """Tests unit.scale_and_round_physical_quantities."""
+
+    def test_matches_scalar_version(self):
+        """Tests that formatting an array of magnitudes gives the same results as formatting each one separately."""
+        magnitudes = [0.0, -2.5, 1e-12, 0.000999, 0.001, 0.5, 1.0, 12.345, 999.999, 1000.0, 123456.789, 1e12, float("inf")]
+        magnitudes += [magnitude * 10.0 ** exponent for magnitude in [1, 1.5, 9.995] for exponent in range(-9, 9)]
+
+        for symbol in ["µL", "uL", "mL", "L", "mg", "g", "kg", "µM", "mM", "M"]:
+            correct_strings = [unit.scale_and_round_physical_quantity(magnitude, symbol) for magnitude in magnitudes]
+            self.assertEqual(unit.scale_and_round_physical_quantities(numpy.array(magnitudes), symbol), correct_strings)
+
+class TestFindUnitInRange(TestCase):
+    """Tests UnitLadder.find_unit_in_range."""
+
+    def test_unit_selection(self):
+        """Tests that the unit chosen is the one reached by repeatedly scaling up or down one unit at a time."""
+        ladder = unit.volume_units
+
+        for magnitude, symbol, correct_symbol in [(5e-9, "L", "nL"), (0.5, "mL", "µL"), (999, "µL", "µL"), (1000, "µL", "mL"),
+                                                  (1e6, "µL", "L"), (1e9, "mL", "L"), (0.0, "L", "pL")]:
+            new_index = ladder.find_unit_in_range(magnitude, symbol)
+            self.assertIn(correct_symbol, ladder.unit_info_list[new_index].symbols)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file